@@ -1,7 +1,4 @@
-import pandas as pd
-import pyodbc
 import os
-import xml.etree.ElementTree as ET
 import logging
 from glob import glob  # Find files 
 
@@ -34,6 +31,8 @@ def connect_to_sql(config):
     conn_str = f"DRIVER={{SQL Server}};SERVER={config['server']},{config['port']};DATABASE={config['database']};"
     if config["trusted_connection"]:
         conn_str += "Trusted_Connection=yes;"
+    # Imported here so the ODBC driver is only loaded when a connection is opened
+    import pyodbc
     return pyodbc.connect(conn_str)
 
 # Create the table if it doesn't exist
@@ -52,6 +51,7 @@ def create_table_if_not_exists(config, conn):
 
 # Load the configuration file
 def load_config(file_path):
+    import xml.etree.ElementTree as ET
     tree = ET.parse(file_path)
     root = tree.getroot()
 
@@ -110,6 +110,8 @@ def validate_headers(df, config):
 
 # Check if the Excel file exists
 def read_excel_with_fallback(config):
+    # pandas is imported by the functions that use it, so importing Main stays fast
+    import pandas as pd
     if not os.path.exists(config['excel_file']):
         raise FileNotFoundError(f"File not found: {config['excel_file']}")
      
@@ -145,6 +147,8 @@ def read_excel_with_fallback(config):
 
 # Read the XML file
 def parse_xml_to_dataframe(config):
+    import xml.etree.ElementTree as ET
+    import pandas as pd
     tree = ET.parse(config["file_path"])
     root = tree.getroot()
     namespace = {"ns": config["namespace"]}
@@ -168,6 +172,7 @@ def parse_xml_to_dataframe(config):
 
 # Prepare the data for insertion into the database
 def clean_and_cast_dataframe(df, config):
+    import pandas as pd
     for col in config["columns"]:
         col_name = col["name"]
         default_value = col.get("default")
@@ -0,0 +1,813 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+# Benchmarks for the import pipeline. Each measurement runs in its own process so
+# peak memory (ru_maxrss) belongs to that measurement only.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+XML_DIR = os.path.join(HERE, "..", "XML")
+CONFIG_XML_DIR = os.path.join(HERE, "..", "Scripts", "config", "config_xml")
+
+# Build a pain.001 file with n_records CdtTrfTxInf, copying a sample record
+def make_synthetic_pain001(path, n_records, sample=os.path.join(XML_DIR, "P1_DataSol_Sal_anon.XML")):
+    with open(sample, "r", encoding="utf-8") as f:
+        text = f.read()
+    first = text.index("<CdtTrfTxInf>")
+    last = text.index("</CdtTrfTxInf>") + len("</CdtTrfTxInf>")
+    tail = text.index("</PmtInf>")
+    record = text[first:last]
+    with open(path, "w", encoding="utf-8") as out:
+        out.write(text[:first])
+        for i in range(n_records):
+            out.write(record.replace("24.30", f"{(i % 100000) / 100:.2f}"))
+            out.write("\n      ")
+        out.write(text[tail:])
+    return path
+
+# Peak resident memory of this process in MB
+def peak_rss_mb():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+# Previous reader: same streaming pass, but one dict per record + pd.DataFrame(list)
+def dict_rows_parse_xml(config):
+    import pandas as pd
+    import novo
+    finders = novo.compile_xml_columns(config, novo.ElementTreeBackend())
+    record_tag = novo.qualify_tag(config["root_path"].split("/")[-1], config["namespace"])
+    columns = [col for col in config["columns"] if col.get("xpath")]
+    data = []
+    stack = []
+    for event, elem in ET.iterparse(config["file_path"], events=("start", "end")):
+        if event == "start":
+            stack.append(elem)
+            continue
+        stack.pop()
+        if elem.tag == record_tag:
+            data.append({col["name"]: novo.extract_value(elem, col, finders[col["name"]]) for col in columns})
+            stack[-1].remove(elem)
+    return pd.DataFrame(data)
+
+# Runs one XML reader variant and prints its time and peak memory as JSON
+def run_xml_variant(variant, config_file, xml_file):
+    import novo
+    config = novo.load_config(config_file)
+    config["file_path"] = xml_file
+    start = time.perf_counter()
+    if variant == "dict-rows":
+        df = dict_rows_parse_xml(config)
+    elif variant in ("etree", "lxml"):
+        config["xml_backend"] = variant
+        df = novo.parse_xml_to_dataframe(config)
+    elif variant.startswith("parallel-"):
+        from xml_parallel import parse_xml_parallel
+        df = parse_xml_parallel(config, int(variant.split("-")[1]))
+    else:
+        df = novo.parse_xml_to_dataframe(config)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        "variant": variant,
+        "rows": len(df),
+        "seconds": round(elapsed, 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "frame_mb": round(df.memory_usage(deep=True).sum() / (1024 * 1024), 1),
+    }))
+
+def run_in_subprocess(*args):
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), *args], capture_output=True, text=True, cwd=HERE)
+    if result.returncode != 0:
+        raise RuntimeError(f"{args[:2]} exited with code {result.returncode}: {result.stderr.strip()}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+# Compare the list-of-dicts reader with the columnar reader on a synthetic file
+def bench_xml_memory(args):
+    config_file = os.path.join(CONFIG_XML_DIR, "P1_DataSol_SalEspecificacoes.xml")
+    xml_file = args.xml_file or os.path.join(HERE, "synthetic_pain001.xml")
+    if not os.path.exists(xml_file):
+        print(f"Generating {args.records} records into {xml_file}...")
+        make_synthetic_pain001(xml_file, args.records)
+    results = [run_in_subprocess("_xml", variant, config_file, xml_file) for variant in ("dict-rows", "columnar")]
+    for result in results:
+        print(f"{result['variant']:>10}: {result['rows']} rows, {result['seconds']}s, peak RSS {result['peak_rss_mb']} MB, DataFrame {result['frame_mb']} MB")
+    print(f"Peak memory saved: {results[0]['peak_rss_mb'] - results[1]['peak_rss_mb']:.1f} MB")
+    if not args.keep and not args.xml_file:
+        os.remove(xml_file)
+
+# Sequential reader vs parallel reader with 2..N worker processes
+def bench_xml_parallel(args):
+    config_file = os.path.join(CONFIG_XML_DIR, "P1_DataSol_SalEspecificacoes.xml")
+    xml_file = args.xml_file or os.path.join(HERE, "synthetic_pain001.xml")
+    if not os.path.exists(xml_file):
+        print(f"Generating {args.records} records into {xml_file}...")
+        make_synthetic_pain001(xml_file, args.records)
+    print(f"CPU cores: {os.cpu_count()}")
+    variants = ["columnar"] + [f"parallel-{n}" for n in range(2, args.workers + 1)]
+    base = None
+    for variant in variants:
+        result = run_in_subprocess("_xml", variant, config_file, xml_file)
+        base = base or result["seconds"]
+        print(f"{variant:>12}: {result['rows']} rows, {result['seconds']}s ({base / result['seconds']:.2f}x)")
+    if not args.keep and not args.xml_file:
+        os.remove(xml_file)
+
+# ElementTree vs lxml on every XML/*_anon.XML sample, scaled up to --records transactions
+def bench_xml_backends(args):
+    import glob
+    for sample in sorted(glob.glob(os.path.join(XML_DIR, "*_anon.XML"))):
+        name = os.path.basename(sample).replace("_anon.XML", "")
+        config_file = os.path.join(CONFIG_XML_DIR, f"{name}Especificacoes.xml")
+        if not os.path.exists(config_file):
+            continue
+        xml_file = os.path.join(HERE, f"synthetic_{name}.xml")
+        make_synthetic_pain001(xml_file, args.records, sample=sample)
+        try:
+            times = {variant: run_in_subprocess("_xml", variant, config_file, xml_file)["seconds"] for variant in ("etree", "lxml")}
+        finally:
+            os.remove(xml_file)
+        print(f"{name:>16}: etree {times['etree']}s, lxml {times['lxml']}s ({times['etree'] / times['lxml']:.2f}x)")
+
+# Cast stage before the factorize-once engine: every cell cleaned and converted on its own
+def per_cell_clean_and_cast(df, config):
+    import pandas as pd
+    for col in config["columns"]:
+        col_name = col["name"]
+        default_value = col.get("default")
+        if col_name in df.columns and df[col_name].dtype == object:
+            df[col_name] = df[col_name].astype(str).apply(lambda x: ' '.join(x.split()))
+        if "DECIMAL" in col["type"].upper():
+            df[col_name] = pd.to_numeric(df[col_name], errors="coerce")
+            df[col_name] = df[col_name].fillna(float(default_value) if default_value is not None else 0.00)
+        elif "INT" in col["type"].upper():
+            df[col_name] = pd.to_numeric(df[col_name], errors="coerce", downcast="integer")
+            df[col_name] = df[col_name].fillna(int(default_value) if default_value is not None else 0)
+        elif "DATE" in col["type"].upper():
+            df[col_name] = pd.to_datetime(df[col_name], errors="coerce")
+            df[col_name] = df[col_name].fillna(pd.Timestamp.now())
+        else:
+            df[col_name] = df[col_name].fillna(str(default_value) if default_value is not None else "N/A").astype(str)
+    return df
+
+# Per-cell vs factorize-once cast on the License and Devices sheets (also tiled to --rows)
+def bench_cast(args):
+    import pandas as pd
+    import novo
+    sheets = [
+        ("genericoLicense.xml", "2025-3-ReportLicence.xlsx"),
+        ("devices.xml", "2024-12 - BringDevices.xlsx"),
+    ]
+    for config_file, excel_file in sheets:
+        config = novo.load_config(os.path.join(HERE, config_file))
+        config["excel_file"] = os.path.join(HERE, excel_file)
+        mapped = novo.read_excel_mapped(config)
+        mapped["Data_Hora"] = "2025-01-01 00:00:00"
+        for rows in (len(mapped), args.rows):
+            df = pd.concat([mapped] * max(1, rows // len(mapped)), ignore_index=True)
+            times = {}
+            for name, cast in (("per-cell", per_cell_clean_and_cast), ("factorize", novo.clean_and_cast_dataframe)):
+                best = None
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    cast(df.copy(), config)
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                times[name] = best
+            print(f"{excel_file} ({len(df)} rows): per-cell {times['per-cell'] * 1000:.1f} ms, "
+                  f"factorize {times['factorize'] * 1000:.1f} ms ({times['per-cell'] / times['factorize']:.1f}x)")
+
+# to_numeric on plain "1234.56" strings vs the locale parser on "€ 1.234,56" strings
+def bench_numbers(args):
+    import numpy as np
+    import pandas as pd
+    import novo
+    rng = np.random.default_rng(0)
+    cents = rng.integers(0, 10_000_000, args.rows)
+    plain = pd.Series([f"{c / 100:.2f}" for c in cents], dtype=object)
+    localized = pd.Series([f"€ {c // 100:,}".replace(",", ".") + f",{c % 100:02d}" for c in cents], dtype=object)
+    col = {"name": "Valor", "type": "DECIMAL(18,2)", "default": "0.00", **novo.number_separators({"locale": "pt_PT"})}
+
+    def best(func):
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = func()
+            times.append(time.perf_counter() - start)
+        return min(times), result
+
+    base, expected = best(lambda: pd.to_numeric(plain, errors="coerce"))
+    vectorized, parsed = best(lambda: novo.parse_localized_numbers(localized, ",", "."))
+    assert np.allclose(expected, parsed)
+    print(f"{args.rows} distinct amounts: to_numeric {base * 1000:.0f} ms, locale parser {vectorized * 1000:.0f} ms ({vectorized / base:.1f}x)")
+
+    repeated = pd.DataFrame({"Valor": localized.sample(args.rows, replace=True, random_state=0).iloc[:args.rows // 100].tolist() * 100})
+    cast, _ = best(lambda: novo.clean_and_cast_dataframe(repeated.copy(), {"columns": [col]}))
+    print(f"{len(repeated)} amounts, {args.rows // 100} distinct, full cast stage: {cast * 1000:.0f} ms")
+
+# Parallel writer against the in-memory stand-in database, with a simulated round trip per batch
+def bench_writer(args):
+    import numpy as np
+    import pandas as pd
+    import sql_writer
+    from tests.memory_database import MemoryDatabase
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"Id": np.arange(args.rows), "Valor": rng.random(args.rows).round(2),
+                       "Nome": [f"Nome {i % 1000}" for i in range(args.rows)]})
+    single = None
+    for writers in [1, 2, 4, 8]:
+        db = MemoryDatabase(latency=args.latency_ms / 1000)
+        start = time.perf_counter()
+        committed, _ = sql_writer.parallel_insert(df, "Tabela", db.connect, writers, atomic=True)
+        elapsed = time.perf_counter() - start
+        assert committed == len(db.rows("Tabela")) == args.rows
+        single = single or elapsed
+        print(f"{writers} connections: {elapsed:.2f}s ({single / elapsed:.1f}x)")
+
+# Fixed batch sizes vs the adaptive controller, single connection, with a simulated cost
+# per call and per row
+def bench_batching(args):
+    import numpy as np
+    import pandas as pd
+    import sql_writer
+    from tests.memory_database import MemoryDatabase
+    df = pd.DataFrame({"Id": np.arange(args.rows), "Nome": [f"Nome {i % 1000}" for i in range(args.rows)]})
+    fixed = [(f"fixed {rows}", {"start_rows": rows, "min_rows": rows, "max_rows": rows}) for rows in (100, 1000, 10000)]
+    for label, batching in fixed + [("adaptive", {})]:
+        db = MemoryDatabase(latency=args.latency_ms / 1000, row_latency=args.row_us / 1e6)
+        controller = sql_writer.BatchController(**batching)
+        start = time.perf_counter()
+        inserted = sql_writer.sequential_insert(db.connect(), df, "Tabela", controller)
+        elapsed = time.perf_counter() - start
+        assert inserted == len(db.rows("Tabela")) == args.rows
+        m = controller.metrics()
+        print(f"{label}: {elapsed:.2f}s, {m['batches']} batches (last size {m['batch_rows_last']}), "
+              f"{m['commits']} commits every {m['commit_rows']} rows")
+
+# pain.001 export of synthetic transactions: time, peak memory and the totals it wrote
+def bench_export(args):
+    import numpy as np
+    import pandas as pd
+    import novo
+    import pain001_export
+    config = novo.load_config(os.path.join(CONFIG_XML_DIR, "P1_Portugal_SalEspecificacoes.xml"))
+    config["export_values"] = {"PmtInf/Dbtr/Nm": "Empresa", "PmtInf/DbtrAcct/Id/IBAN": "PT50000000000000000000001",
+                               "PmtInf/DbtrAgt/FinInstnId/BIC": "BCOMPTPL"}
+    rng = np.random.default_rng(0)
+
+    def chunks():
+        for start in range(0, args.rows, pain001_export.EXPORT_CHUNK_ROWS):
+            n = min(pain001_export.EXPORT_CHUNK_ROWS, args.rows - start)
+            yield pd.DataFrame({"Valor_moeda": rng.integers(1, 10**7, n) / 100, "Tipo_moeda": "EUR",
+                                "Nome_pessoa": [f"Pessoa {i}" for i in range(start, start + n)],
+                                "Pais": "PT", "Numero_NIF": [f"PT50{i:021d}" for i in range(start, start + n)]})
+
+    output = os.path.join(HERE, "synthetic_export.xml")
+    start = time.perf_counter()
+    with open(output, "wb") as out:
+        writer = pain001_export.Pain001Writer(out, config)
+        for chunk in chunks():
+            writer.write_chunk(chunk)
+        writer.close()
+    elapsed = time.perf_counter() - start
+    size = os.path.getsize(output) / (1024 * 1024)
+    os.remove(output)
+    print(f"{args.rows} transactions: {elapsed:.1f}s, {size:.0f} MB written, peak memory {peak_rss_mb():.0f} MB, "
+          f"CtrlSum {writer.format_units(writer.total_units)}")
+
+# Month-over-month reload: inserting every row vs delta import, on a simulated database
+def bench_delta(args):
+    import shutil
+    import tempfile
+    import numpy as np
+    import pandas as pd
+    import novo
+    import sql_writer
+    from tests.memory_database import MemoryDatabase
+    rng = np.random.default_rng(0)
+    n = args.rows
+    month1 = pd.DataFrame({"Id": np.arange(n), "Nome": [f"Nome {i}" for i in range(n)],
+                           "Valor": rng.integers(1, 10**6, n) / 100, "Data_Hora": "2025-01-01 00:00:00"})
+    # Next month: 1% of the values change, 0.5% of the rows leave and 0.5% arrive
+    month2 = month1.copy()
+    changed = rng.choice(n, n // 100, replace=False)
+    month2.loc[changed, "Valor"] += 1
+    month2 = month2.drop(index=rng.choice(n, n // 200, replace=False))
+    month2 = pd.concat([month2, pd.DataFrame({"Id": np.arange(n, n + n // 200), "Nome": "Novo", "Valor": 1.0,
+                                              "Data_Hora": "2025-02-01 00:00:00"})], ignore_index=True)
+    snapshot_dir = tempfile.mkdtemp()
+    config = {"table_name": "Tabela", "config_file": "bench_delta.xml", "snapshot_dir": snapshot_dir,
+              "columns": [{"name": "Id", "type": "INT", "key": True}, {"name": "Nome", "type": "NVARCHAR(50)"},
+                          {"name": "Valor", "type": "DECIMAL(18,2)"}, {"name": "Data_Hora", "type": "DATETIME"}]}
+    try:
+        db = MemoryDatabase(latency=args.latency_ms / 1000, row_latency=args.row_us / 1e6)
+        novo.import_delta(month1, config, connect=db.connect)
+
+        full_db = MemoryDatabase(latency=args.latency_ms / 1000, row_latency=args.row_us / 1e6)
+        start = time.perf_counter()
+        sql_writer.sequential_insert(full_db.connect(), month2, "Tabela", sql_writer.BatchController())
+        full = time.perf_counter() - start
+
+        start = time.perf_counter()
+        metrics = novo.import_delta(month2, config, connect=db.connect)
+        delta = time.perf_counter() - start
+        assert sorted(db.rows("Tabela")) == sorted(sql_writer.dataframe_rows(month2))
+        size = sum(os.path.getsize(os.path.join(snapshot_dir, name)) for name in os.listdir(snapshot_dir)) / (1024 * 1024)
+        print(f"full reload of {len(month2)} rows: {full:.2f}s")
+        print(f"delta: {delta:.2f}s ({metrics['inserted']} inserted, {metrics['updated']} updated, "
+              f"{metrics['deleted']} deleted, {metrics['unchanged']} unchanged), snapshot {size:.1f} MB")
+    finally:
+        shutil.rmtree(snapshot_dir)
+
+# Connection that accepts every statement and keeps nothing, so only the pipeline uses memory
+class DiscardingConnection:
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params=()):
+        pass
+
+    def executemany(self, sql, seq_of_params):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+# Build an .xlsx with n_rows data rows, repeating the rows under the header of a sample sheet
+def make_synthetic_sheet(path, n_rows, sample, sheet_name, header_row):
+    import openpyxl
+    source = openpyxl.load_workbook(sample, read_only=True, data_only=True)
+    rows = list(source[sheet_name].iter_rows(min_row=header_row, values_only=True))
+    source.close()
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_name)
+    sheet.append(rows[0])
+    data = [row for row in rows[1:] if any(value is not None for value in row)]
+    for i in range(n_rows):
+        sheet.append(data[i % len(data)])
+    workbook.save(path)
+    return path
+
+# One import of the memory benchmark, whole or with --max-memory, printed as JSON
+def run_memory_variant(config_file, data_file, max_memory):
+    import novo
+    config = novo.load_config(config_file)
+    config["excel_file" if config["type"] == "excel" else "file_path"] = data_file
+    config["checkpoint_file"] = os.path.join(HERE, "bench_memory_checkpoints.jsonl")
+    if max_memory != "none":
+        config["max_memory"] = max_memory
+    start = time.perf_counter()
+    try:
+        metrics = novo.process_config(config, connect=DiscardingConnection)
+    finally:
+        os.remove(config["checkpoint_file"])
+    print(json.dumps({"rows": metrics["rows"], "seconds": round(time.perf_counter() - start, 2),
+                      "peak_rss_mb": round(peak_rss_mb(), 1), "memory": metrics.get("memory")}))
+
+# Peak memory of a big Excel sheet and a big XML file, read whole vs with --max-memory budgets
+def bench_memory(args):
+    sheet = os.path.join(HERE, "synthetic_sheet.xlsx")
+    xml_file = os.path.join(HERE, "synthetic_pain001.xml")
+    print(f"Generating {args.rows} Excel rows and {args.rows} XML records...")
+    make_synthetic_sheet(sheet, args.rows, os.path.join(HERE, "2025-3-ReportLicence.xlsx"), "MS 365", 1)
+    make_synthetic_pain001(xml_file, args.rows)
+    cases = [("Excel", os.path.join(HERE, "genericoLicense.xml"), sheet),
+             ("XML", os.path.join(CONFIG_XML_DIR, "P1_DataSol_SalEspecificacoes.xml"), xml_file)]
+    try:
+        for label, config_file, data_file in cases:
+            for max_memory in ["none", *args.budgets]:
+                result = run_in_subprocess("_memory", config_file, data_file, max_memory)
+                line = f"{label} {'whole' if max_memory == 'none' else max_memory:>6}: {result['rows']} rows, {result['seconds']}s, peak RSS {result['peak_rss_mb']} MB"
+                memory = result["memory"]
+                if memory:
+                    line += (f", {memory['chunks']} chunks of {memory['chunk_rows_min']}-{memory['chunk_rows_max']} rows, "
+                             f"~{memory['row_bytes']} bytes/row, {memory['shrinks']} shrinks")
+                print(line)
+    finally:
+        os.remove(sheet)
+        os.remove(xml_file)
+
+# A ;-separated CSV with n_rows data rows, repeating the rows of a sample sheet, and a copy
+# of the sheet's config that reads it through <csv>
+def make_synthetic_csv(path, config_path, n_rows, sample, sheet_name, sample_config):
+    import csv
+    import re
+    import openpyxl
+    source = openpyxl.load_workbook(sample, read_only=True, data_only=True)
+    rows = [["" if value is None else str(value) for value in row] for row in source[sheet_name].iter_rows(values_only=True)]
+    source.close()
+    data = [row for row in rows[1:] if any(row)]
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(rows[0])
+        for start in range(0, n_rows, len(data)):
+            writer.writerows(data[:n_rows - start])
+    with open(sample_config, "r", encoding="utf-8") as f:
+        text = f.read()
+    with open(config_path, "w", encoding="utf-8") as f:
+        f.write(re.sub(r"<excel>.*</excel>", f"<csv><file_path>{path}</file_path><delimiter>;</delimiter></csv>", text, flags=re.S))
+
+# One CSV import: read_csv of the whole file (the way to get a CSV in before <csv>) or the
+# chunked reader with the pandas or pyarrow engine. Printed as JSON.
+def run_csv_variant(config_file, variant):
+    import novo
+    config = novo.load_config(config_file)
+    config["checkpoint_file"] = os.path.join(HERE, "bench_csv_checkpoints.jsonl")
+    start = time.perf_counter()
+    try:
+        if variant == "whole":
+            import pandas as pd
+            df = novo.map_columns(pd.read_csv(config["file_path"], sep=config["delimiter"], dtype=str), config)
+            df["Data_Hora"] = time.strftime("%Y-%m-%d %H:%M:%S")
+            metrics = novo.import_to_sql(novo.clean_and_cast_dataframe(df, config), config, connect=DiscardingConnection)
+        else:
+            config["csv_engine"] = variant
+            metrics = novo.process_config(config, connect=DiscardingConnection)
+    finally:
+        if os.path.exists(config["checkpoint_file"]):
+            os.remove(config["checkpoint_file"])
+    print(json.dumps({"rows": metrics["rows"], "seconds": round(time.perf_counter() - start, 2), "peak_rss_mb": round(peak_rss_mb(), 1)}))
+
+# Big CSV export: whole read_csv vs the chunked <csv> reader (pandas and pyarrow engines)
+def bench_csv(args):
+    data_file = os.path.join(HERE, "synthetic.csv")
+    config_file = os.path.join(HERE, "synthetic_csv.xml")
+    print(f"Generating {args.rows} CSV rows...")
+    make_synthetic_csv(data_file, config_file, args.rows, os.path.join(HERE, "2025-3-ReportLicence.xlsx"), "MS 365",
+                       os.path.join(HERE, "genericoLicense.xml"))
+    print(f"{os.path.getsize(data_file) / (1024 * 1024):.0f} MB")
+    try:
+        for variant in ("whole", "pandas", "pyarrow"):
+            result = run_in_subprocess("_csv", config_file, variant)
+            print(f"{variant:>8}: {result['rows']} rows, {result['seconds']}s, peak RSS {result['peak_rss_mb']} MB")
+    finally:
+        os.remove(data_file)
+        os.remove(config_file)
+
+# JSON path of each column of P1_DataSol_SalEspecificacoes.xml in the records written by
+# make_synthetic_json (the XML element names, attributes as keys, text under "value")
+JSON_PATHS = {"Valor_moeda": "Amt.InstdAmt.value", "Tipo_moeda": "Amt.InstdAmt.Ccy", "Nome_pessoa": "Cdtr.Nm",
+              "Pais": "Cdtr.PstlAdr.Ctry", "Numero_NIF": "CdtrAcct.Id.IBAN"}
+
+def element_to_json(elem):
+    children = list(elem)
+    if not children and not elem.attrib:
+        return (elem.text or "").strip()
+    value = {child.tag.split("}")[-1]: element_to_json(child) for child in children}
+    value.update(elem.attrib)
+    if not children:
+        value["value"] = (elem.text or "").strip()
+    return value
+
+# The records of make_synthetic_pain001 as NDJSON (layout "ndjson") or inside a JSON
+# document ({"GrpHdr": ..., "transfers": [...]}), with the amount as a number; and a copy
+# of the XML config that reads them through <json>
+def make_synthetic_json(path, config_path, n_records, layout, sample=os.path.join(XML_DIR, "P1_DataSol_Sal_anon.XML"),
+                        sample_config=os.path.join(CONFIG_XML_DIR, "P1_DataSol_SalEspecificacoes.xml")):
+    namespace = {"ns": "urn:iso:std:iso:20022:tech:xsd:pain.001.001.03"}
+    root = ET.parse(sample).getroot()
+    record = element_to_json(root.find(".//ns:CdtTrfTxInf", namespace))
+    record["Amt"]["InstdAmt"]["value"] = "__AMOUNT__"
+    template = json.dumps(record, ensure_ascii=False)
+    with open(path, "w", encoding="utf-8") as out:
+        if layout != "ndjson":
+            out.write('{"GrpHdr": ' + json.dumps(element_to_json(root.find(".//ns:GrpHdr", namespace))) + ', "transfers": [\n')
+        for i in range(n_records):
+            if i and layout != "ndjson":
+                out.write(",\n")
+            out.write(template.replace('"__AMOUNT__"', f"{(i % 100000) / 100:.2f}"))
+            if layout == "ndjson":
+                out.write("\n")
+        if layout != "ndjson":
+            out.write("\n]}\n")
+
+    config = ET.parse(sample_config).getroot()
+    for col in config.iter("column"):
+        if col.get("name") in JSON_PATHS:
+            col.attrib.pop("xpath", None)
+            col.attrib.pop("attribute", None)
+            col.set("path", JSON_PATHS[col.get("name")])
+    config.remove(config.find("./xml"))
+    source = ET.SubElement(config, "json")
+    ET.SubElement(source, "file_path").text = path
+    if layout != "ndjson":
+        ET.SubElement(source, "records_path").text = "transfers"
+    ET.ElementTree(config).write(config_path, encoding="utf-8")
+    return path
+
+# One reader of the JSON benchmark: every chunk read and cast, printed as JSON
+def run_json_variant(config_file, data_file):
+    import novo
+    config = novo.load_config(config_file)
+    config["file_path"] = data_file
+    start = time.perf_counter()
+    rows, total = 0, 0.0
+    chunks = novo.iter_json_chunks(config) if config["type"] == "json" else novo.iter_xml_chunks(config)
+    for chunk in chunks:
+        chunk = novo.clean_and_cast_dataframe(chunk, config)
+        rows += len(chunk)
+        total += chunk["Valor_moeda"].sum()
+    print(json.dumps({"rows": rows, "amount_total": round(total, 2), "seconds": round(time.perf_counter() - start, 2),
+                      "peak_rss_mb": round(peak_rss_mb(), 1)}))
+
+# The same transfers as pain.001 XML, NDJSON and one JSON document: read and cast throughput
+def bench_json(args):
+    config_file = os.path.join(CONFIG_XML_DIR, "P1_DataSol_SalEspecificacoes.xml")
+    xml_file = os.path.join(HERE, "synthetic_pain001.xml")
+    print(f"Generating {args.records} transfers as XML, NDJSON and a JSON document...")
+    make_synthetic_pain001(xml_file, args.records)
+    cases = [("XML", config_file, xml_file)]
+    for layout, suffix in (("ndjson", ".ndjson"), ("document", ".json")):
+        data_file = os.path.join(HERE, f"synthetic_transfers{suffix}")
+        json_config = os.path.join(HERE, f"synthetic_{layout}.xml")
+        make_synthetic_json(data_file, json_config, args.records, layout)
+        cases.append((layout, json_config, data_file))
+    try:
+        for label, config, data_file in cases:
+            result = run_in_subprocess("_json", config, data_file)
+            size = os.path.getsize(data_file) / (1024 * 1024)
+            print(f"{label:>9}: {result['rows']} rows (amounts {result['amount_total']}), {result['seconds']}s, "
+                  f"{result['rows'] / result['seconds']:,.0f} rows/s, {size / result['seconds']:.0f} MB/s of {size:.0f} MB, "
+                  f"peak RSS {result['peak_rss_mb']} MB")
+    finally:
+        for _, config, data_file in cases:
+            os.remove(data_file)
+            if config != config_file:
+                os.remove(config)
+
+# Lookup columns: a reference table of --keys NIFs read from the in-memory database, then a
+# column of --rows NIFs (some not in the table) resolved row by row with a dict vs with the
+# hash index (distinct values only), and the same table asked again from the cache
+def bench_lookup(args):
+    import numpy as np
+    import pandas as pd
+    import lookups
+    from tests.memory_database import MemoryDatabase
+    database = MemoryDatabase()
+    conn = database.connect()
+    conn.cursor().executemany("INSERT INTO Colaboradores (NIF, ID) VALUES (?, ?)",
+                              [(200000000 + i, i) for i in range(args.keys)])
+    conn.commit()
+    col = {"name": "ID_Colaborador", "lookup": "Colaboradores", "lookup_key": "NIF", "lookup_value": "ID"}
+    config = {"server": None, "port": None, "database": None}
+    rng = np.random.default_rng(0)
+    series = pd.Series((200000000 + rng.integers(0, int(args.keys * 1.01), args.rows)).astype(str), dtype=object)
+
+    cache = lookups.LookupCache(ttl=60)
+    start = time.perf_counter()
+    index = cache.get(config, col, database.connect)
+    load = time.perf_counter() - start
+    start = time.perf_counter()
+    cache.get(config, col, database.connect)
+    hit = time.perf_counter() - start
+
+    start = time.perf_counter()
+    table = dict(zip(index.index, index.values[:-1]))
+    values = series.map(lambda value: table.get(lookups.normalize_keys([value])[0]))
+    per_row = time.perf_counter() - start
+    start = time.perf_counter()
+    resolved, unmatched = index.resolve(series)
+    vectorized = time.perf_counter() - start
+    assert (resolved.isna() == values.isna()).all() and (resolved.dropna() == values.dropna()).all()
+
+    print(f"Reference table: {len(index)} keys loaded in {load:.2f}s, cached in {hit * 1000:.3f} ms")
+    print(f"{args.rows} rows, {int(unmatched.sum())} without a match:")
+    print(f"  dict per row: {per_row:.2f}s")
+    print(f"  hash index:   {vectorized:.2f}s ({per_row / vectorized:.1f}x)")
+
+# Dedupe of --rows rows in chunks of --chunk-rows (keep="first", --distinct different keys): a Python
+# set of row tuples, filled row by row, vs the 64-bit hashes of dedupe.Deduplicator. The memory
+# is the peak traced by tracemalloc in a second run (tracing slows down the first one).
+def bench_dedupe(args):
+    import tracemalloc
+    import numpy as np
+    import pandas as pd
+    import dedupe
+    rng = np.random.default_rng(0)
+    ids = rng.integers(0, args.distinct, args.rows)
+    frame = pd.DataFrame({"NIF": (200000000 + ids).astype(str), "Projeto": ("P" + pd.Series(ids % 97).astype(str)).to_numpy(),
+                          "Valor": (ids % 1000) / 4})
+    chunks = [frame.iloc[start:start + args.chunk_rows] for start in range(0, args.rows, args.chunk_rows)]
+    config = {"dedupe": "first", "dedupe_columns": None,
+              "columns": [{"name": "NIF"}, {"name": "Projeto"}, {"name": "Valor"}]}
+
+    def per_row():
+        seen, kept = set(), 0
+        for chunk in chunks:
+            for row in chunk.itertuples(index=False, name=None):
+                if row not in seen:
+                    seen.add(row)
+                    kept += 1
+        return kept
+
+    def vectorized():
+        deduplicator = dedupe.Deduplicator(config)
+        return sum(len(deduplicator.filter(chunk, start, None)) for start, chunk in zip(range(0, args.rows, args.chunk_rows), chunks))
+
+    results = {}
+    for name, run in (("set of tuples", per_row), ("64-bit hashes", vectorized)):
+        start = time.perf_counter()
+        kept = run()
+        seconds = time.perf_counter() - start
+        tracemalloc.start()
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results[name] = (kept, seconds, peak)
+    assert len({kept for kept, _, _ in results.values()}) == 1, results
+    print(f"{args.rows} rows in chunks of {args.chunk_rows}, {kept} distinct:")
+    base = results["set of tuples"][1]
+    for name, (_, seconds, peak) in results.items():
+        print(f"  {name}: {seconds:.2f}s ({base / seconds:.1f}x), peak {peak / (1 << 20):.0f} MB")
+
+# Small-file latency: a new process per file (like the CLI) vs jobs sent to the resident service.
+# Both write to the in-memory database; opening a connection costs --connect-ms.
+def bench_service(args):
+    import statistics
+    import threading
+    import service
+    from tests.memory_database import MemoryDatabase
+    config_file = os.path.join(HERE, args.config)
+    data_file = os.path.join(HERE, args.data_file)
+    cold_code = (f"import time, novo; from tests.memory_database import MemoryDatabase; db = MemoryDatabase(); "
+                 f"config = novo.load_config({config_file!r}); config['excel_file'] = {data_file!r}; "
+                 f"novo.process_config(config, connect=lambda: (time.sleep({args.connect_ms / 1000}), db.connect())[1])")
+    cold = []
+    for _ in range(args.jobs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", cold_code], cwd=HERE, check=True, capture_output=True)
+        cold.append(time.perf_counter() - start)
+
+    db = MemoryDatabase()
+    import_service = service.ImportService(connect_factory=lambda config: (time.sleep(args.connect_ms / 1000), db.connect())[1])
+    handler = type("Handler", (service.JobHandler,), {"service": import_service})
+    server = service.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    warm = []
+    try:
+        for _ in range(args.jobs + 1):
+            start = time.perf_counter()
+            status, job = service.call_service("POST", "/jobs", {"config": config_file, "file": data_file}, port=server.server_address[1])
+            assert status == 200 and job["status"] == "done", job
+            warm.append(time.perf_counter() - start)
+    finally:
+        server.shutdown()
+        import_service.close()
+    print(f"new process per file: median {statistics.median(cold) * 1000:.0f} ms")
+    print(f"service, first job: {warm[0] * 1000:.0f} ms; next jobs: median {statistics.median(warm[1:]) * 1000:.0f} ms "
+          f"({import_service.health()['connections']})")
+
+# Top-level imports of a command, from `python -X importtime`: [(cumulative ms, module)]
+def import_breakdown(command):
+    stderr = subprocess.run([sys.executable, "-X", "importtime", *command], cwd=HERE, capture_output=True, text=True).stderr
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit() and not name.startswith("  "):
+            modules.append((int(cumulative) / 1000, name.strip()))
+    return sorted(modules, reverse=True)
+
+# Startup time of the light CLI commands, against importing pandas
+def bench_startup(args):
+    import statistics
+    config = os.path.join(HERE, args.config)
+    commands = {
+        "novo.py --help": ["novo.py", "--help"],
+        "novo.py --validate": ["novo.py", config, "--validate"],
+        "novo.py --list-columns": ["novo.py", config, "--list-columns"],
+        "import pandas (reference)": ["-c", "import pandas"],
+    }
+    for label, command in commands.items():
+        times = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, *command], cwd=HERE, capture_output=True, check=True)
+            times.append(time.perf_counter() - start)
+        top = ", ".join(f"{name} {ms:.0f} ms" for ms, name in import_breakdown(command)[:args.top])
+        print(f"{label}: median {statistics.median(times) * 1000:.0f} ms; slowest imports: {top}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks do pipeline de importação.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    xml_memory = sub.add_parser("xml-memory", help="Memória do leitor XML (lista de dicts vs colunas)")
+    xml_memory.add_argument("--records", type=int, default=1_000_000, help="Número de transações do ficheiro sintético")
+    xml_memory.add_argument("--xml-file", help="Usar um ficheiro XML existente")
+    xml_memory.add_argument("--keep", action="store_true", help="Não apagar o ficheiro sintético")
+    xml_memory.set_defaults(func=bench_xml_memory)
+
+    xml_parallel = sub.add_parser("xml-parallel", help="Leitor XML sequencial vs paralelo")
+    xml_parallel.add_argument("--records", type=int, default=1_000_000, help="Número de transações do ficheiro sintético")
+    xml_parallel.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Número máximo de processos")
+    xml_parallel.add_argument("--xml-file", help="Usar um ficheiro XML existente")
+    xml_parallel.add_argument("--keep", action="store_true", help="Não apagar o ficheiro sintético")
+    xml_parallel.set_defaults(func=bench_xml_parallel)
+
+    xml_backends = sub.add_parser("xml-backends", help="Backend ElementTree vs lxml nos ficheiros XML/*_anon.XML")
+    xml_backends.add_argument("--records", type=int, default=200_000, help="Número de transações por ficheiro sintético")
+    xml_backends.set_defaults(func=bench_xml_backends)
+
+    cast = sub.add_parser("cast", help="Conversão célula a célula vs por valores distintos")
+    cast.add_argument("--rows", type=int, default=500_000, help="Linhas da versão repetida de cada folha")
+    cast.add_argument("--repeat", type=int, default=3, help="Repetições (conta a melhor)")
+    cast.set_defaults(func=bench_cast)
+
+    numbers = sub.add_parser("numbers", help="Conversão de montantes com formato português")
+    numbers.add_argument("--rows", type=int, default=1_000_000, help="Número de montantes")
+    numbers.add_argument("--repeat", type=int, default=3, help="Repetições (conta a melhor)")
+    numbers.set_defaults(func=bench_numbers)
+
+    writer = sub.add_parser("writer", help="Inserção com uma vs várias ligações (base de dados simulada)")
+    writer.add_argument("--rows", type=int, default=200_000, help="Número de linhas")
+    writer.add_argument("--latency-ms", type=float, default=20.0, help="Latência simulada por lote de inserção")
+    writer.set_defaults(func=bench_writer)
+
+    batching = sub.add_parser("batching", help="Lotes de tamanho fixo vs adaptativo (base de dados simulada)")
+    batching.add_argument("--rows", type=int, default=500_000, help="Número de linhas")
+    batching.add_argument("--latency-ms", type=float, default=5.0, help="Latência simulada por chamada")
+    batching.add_argument("--row-us", type=float, default=5.0, help="Custo simulado por linha (microsegundos)")
+    batching.set_defaults(func=bench_batching)
+
+    export = sub.add_parser("export", help="Exportação pain.001 (tempo e memória)")
+    export.add_argument("--rows", type=int, default=1_000_000, help="Número de transações")
+    export.set_defaults(func=bench_export)
+
+    delta = sub.add_parser("delta", help="Recarga completa vs importação delta (base de dados simulada)")
+    delta.add_argument("--rows", type=int, default=1_000_000, help="Número de linhas por mês")
+    delta.add_argument("--latency-ms", type=float, default=5.0, help="Latência simulada por chamada")
+    delta.add_argument("--row-us", type=float, default=5.0, help="Custo simulado por linha (microsegundos)")
+    delta.set_defaults(func=bench_delta)
+
+    service_bench = sub.add_parser("service", help="Latência de ficheiros pequenos: processo novo vs serviço residente")
+    service_bench.add_argument("--config", default="devices.xml", help="Config (relativa a esta pasta)")
+    service_bench.add_argument("--data-file", default="2025-02 - BringDevices.xlsx", help="Ficheiro pequeno a importar")
+    service_bench.add_argument("--jobs", type=int, default=10, help="Número de importações")
+    service_bench.add_argument("--connect-ms", type=float, default=100.0, help="Tempo simulado para abrir uma ligação")
+    service_bench.set_defaults(func=bench_service)
+
+    startup = sub.add_parser("startup", help="Tempo de arranque dos comandos leves (com -X importtime)")
+    startup.add_argument("--config", default="genericoLicense.xml", help="Config usada em --validate/--list-columns")
+    startup.add_argument("--runs", type=int, default=5, help="Execuções por comando")
+    startup.add_argument("--top", type=int, default=4, help="Número de imports mais lentos a mostrar")
+    startup.set_defaults(func=bench_startup)
+
+    memory = sub.add_parser("memory", help="Memória máxima a ler um Excel e um XML grandes, inteiros vs com --max-memory")
+    memory.add_argument("--rows", type=int, default=300_000, help="Linhas do Excel e transações do XML sintéticos")
+    memory.add_argument("--budgets", nargs="+", default=["600MB", "300MB", "200MB"], help="Limites de memória a comparar")
+    memory.set_defaults(func=bench_memory)
+
+    csv_bench = sub.add_parser("csv", help="CSV grande: read_csv inteiro vs leitura por blocos (pandas e pyarrow)")
+    csv_bench.add_argument("--rows", type=int, default=2_000_000, help="Linhas do CSV sintético")
+    csv_bench.set_defaults(func=bench_csv)
+
+    json_bench = sub.add_parser("json", help="Leitura de JSON e NDJSON vs o mesmo conteúdo em XML")
+    json_bench.add_argument("--records", type=int, default=1_000_000, help="Número de transações dos ficheiros sintéticos")
+    json_bench.set_defaults(func=bench_json)
+
+    lookup_bench = sub.add_parser("lookup", help="Colunas lookup: dicionário linha a linha vs índice por valores distintos")
+    lookup_bench.add_argument("--rows", type=int, default=1_000_000, help="Linhas da coluna a resolver")
+    lookup_bench.add_argument("--keys", type=int, default=100_000, help="Linhas da tabela de referência")
+    lookup_bench.set_defaults(func=bench_lookup)
+
+    dedupe_bench = sub.add_parser("dedupe", help="Linhas repetidas: set de tuplos linha a linha vs hashes de 64 bits")
+    dedupe_bench.add_argument("--rows", type=int, default=2_000_000, help="Linhas sintéticas")
+    dedupe_bench.add_argument("--distinct", type=int, default=1_000_000, help="Número de linhas diferentes")
+    dedupe_bench.add_argument("--chunk-rows", type=int, default=100_000, help="Linhas por chunk")
+    dedupe_bench.set_defaults(func=bench_dedupe)
+
+    # Internal: one measurement inside a fresh process
+    xml_variant = sub.add_parser("_xml")
+    xml_variant.add_argument("variant")
+    xml_variant.add_argument("config_file")
+    xml_variant.add_argument("xml_file")
+    xml_variant.set_defaults(func=lambda a: run_xml_variant(a.variant, a.config_file, a.xml_file))
+
+    csv_variant = sub.add_parser("_csv")
+    csv_variant.add_argument("config_file")
+    csv_variant.add_argument("variant")
+    csv_variant.set_defaults(func=lambda a: run_csv_variant(a.config_file, a.variant))
+
+    json_variant = sub.add_parser("_json")
+    json_variant.add_argument("config_file")
+    json_variant.add_argument("data_file")
+    json_variant.set_defaults(func=lambda a: run_json_variant(a.config_file, a.data_file))
+
+    memory_variant = sub.add_parser("_memory")
+    memory_variant.add_argument("config_file")
+    memory_variant.add_argument("data_file")
+    memory_variant.add_argument("max_memory")
+    memory_variant.set_defaults(func=lambda a: run_memory_variant(a.config_file, a.data_file, a.max_memory))
+
+    args = parser.parse_args()
+    args.func(args)
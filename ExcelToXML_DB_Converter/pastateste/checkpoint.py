@@ -0,0 +1,75 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+
+# Checkpoint log for resumable imports. After every commit the writer appends one JSON line
+# with the config + table key, the fingerprint of the source file and the number of source
+# rows already committed. With --resume, the last line of the key tells where to restart,
+# as long as the source file is still the same.
+
+CHECKPOINT_FILE = "import_checkpoints.jsonl"
+
+# Bytes hashed at the start and at the end of the source file
+FINGERPRINT_BYTES = 1 << 20
+
+# Size + hash of the first and last MB: cheap even for big files, and changes when rows
+# are added, removed or edited in any realistic export
+def source_fingerprint(path):
+    size = os.path.getsize(path)
+    digest = hashlib.sha256(str(size).encode())
+    with open(path, "rb") as f:
+        digest.update(f.read(FINGERPRINT_BYTES))
+        if size > FINGERPRINT_BYTES:
+            f.seek(max(FINGERPRINT_BYTES, size - FINGERPRINT_BYTES))
+            digest.update(f.read())
+    return f"{size}:{digest.hexdigest()[:32]}"
+
+# member: data file inside a zip/gz source, which has its own checkpoint
+def checkpoint_key(config, member=None):
+    key = f"{os.path.abspath(config.get('config_file') or '')}::{config['table_name']}"
+    return f"{key}::{member}" if member else key
+
+class CheckpointLog:
+    def __init__(self, path=CHECKPOINT_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+
+    # Last entry written for the key, or None
+    def last(self, key):
+        if not os.path.exists(self.path):
+            return None
+        entry = None
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # line cut by a crash
+                if record.get("key") == key:
+                    entry = record
+        return entry
+
+    def record(self, key, fingerprint, committed_rows, total_rows=None):
+        line = json.dumps({
+            "key": key, "fingerprint": fingerprint, "committed_rows": committed_rows,
+            "total_rows": total_rows, "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        })
+        with self.lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    # Source rows to skip when resuming: the committed rows of the last run on the same file
+    def resume_offset(self, key, fingerprint):
+        entry = self.last(key)
+        if entry is None:
+            logging.info("No checkpoint found, starting from the first row")
+            return 0
+        if entry["fingerprint"] != fingerprint:
+            logging.warning("Source file changed since the last checkpoint, starting from the first row")
+            return 0
+        logging.info(f"Resuming after {entry['committed_rows']} committed rows (checkpoint of {entry['time']})")
+        return entry["committed_rows"]
@@ -0,0 +1,231 @@
+import gzip
+import logging
+import os
+import re
+import unicodedata
+from xml.sax.saxutils import escape
+
+import pandas as pd
+
+import novo
+from pain001_export import amount_scale, column_texts
+
+# Conversion mode: reads the config source like the import does (header detection, column
+# mapping, clean_and_cast_dataframe) and writes the rows to an XML, CSV or Parquet file
+# instead of the database. Nothing here imports pyodbc or opens a connection.
+#
+# Sources are read and written chunk by chunk. The same inputs as the import are accepted:
+# a .gz/.bz2 file is decompressed while it is read, and the matching members of a .zip are
+# written one after the other to the one output file.
+
+CONVERT_CHUNK_ROWS = 50000
+
+CONVERT_FORMATS = {".csv": "csv", ".xml": "xml", ".parquet": "parquet"}
+
+# "saida.csv.gz" -> ("csv", True)
+def output_format(path):
+    base, extension = os.path.splitext(path.lower())
+    compressed = extension == ".gz"
+    if compressed:
+        extension = os.path.splitext(base)[1]
+    if extension not in CONVERT_FORMATS:
+        raise ValueError(f"Unknown output format '{extension}' (expected .csv, .xml or .parquet)")
+    if compressed and CONVERT_FORMATS[extension] == "parquet":
+        raise ValueError("Parquet files are already compressed; use .parquet")
+    return CONVERT_FORMATS[extension], compressed
+
+# Cast DataFrames of one data file, CONVERT_CHUNK_ROWS rows at a time.
+# stream: the open member of a compressed source, or None to read the file itself
+def iter_source_chunks(config, stream=None):
+    if config["type"] == "excel":
+        if stream is not None:
+            # openpyxl needs to seek, so a compressed sheet is decompressed into memory
+            config = {**config, "excel_data": stream.read()}
+        chunks = novo.iter_excel_chunks(config, chunk_size=CONVERT_CHUNK_ROWS)
+    elif config["type"] == "csv":
+        chunks = novo.iter_csv_chunks(config, source=stream, chunk_size=CONVERT_CHUNK_ROWS)
+    elif config["type"] == "json":
+        chunks = novo.iter_json_chunks(config, source=stream, chunk_size=CONVERT_CHUNK_ROWS)
+    else:
+        chunks = novo.iter_xml_chunks(config, source=stream, chunk_size=CONVERT_CHUNK_ROWS)
+    for chunk in chunks:
+        yield novo.clean_and_cast_dataframe(chunk, config)
+
+# Cast DataFrames of the config source, or of each data file in it when it is compressed
+def iter_converted_chunks(config):
+    from sources import data_suffixes, is_compressed, iter_compressed
+    if novo.has_lookups(config):
+        logging.warning("Lookup columns need the database: their source values are written as they are")
+    if config.get("dedupe"):
+        logging.warning("<dedupe> only applies to imports: duplicate rows are written as they are")
+    source = config["excel_file"] if config["type"] == "excel" else config["file_path"]
+    if not is_compressed(source):
+        yield from iter_source_chunks(config)
+        return
+    found = False
+    for member, stream in iter_compressed(source, data_suffixes(config["type"])):
+        logging.info(f"Converting {os.path.basename(source)}!{member}")
+        found = True
+        yield from iter_source_chunks(config, stream)
+    if not found:
+        logging.warning(f"No {config['type']} files found in {os.path.basename(source)}")
+
+class CsvOutput:
+    def __init__(self, out, config):
+        self.out = out
+        self.names = [col["name"] for col in config["columns"]]
+        self.header = True
+
+    def write_chunk(self, df):
+        df.to_csv(self.out, index=False, header=self.header)
+        self.header = False
+
+    def close(self):
+        if self.header:
+            pd.DataFrame(columns=self.names).to_csv(self.out, index=False)
+
+# XML element names every parser reads (without ":", which would need a namespace): the
+# ASCII and Latin letters that are name characters in both XML 1.0 editions. Parsers built
+# on expat (Python's ElementTree among them) reject most of the other 5th edition names.
+XML_NAME_START = "A-Z_a-z\u00c0-\u00d6\u00d8-\u00f6\u00f8-\u0131\u0134-\u013e\u0141-\u0148\u014a-\u017e"
+XML_NAME_CHAR = XML_NAME_START + "\\-.0-9\u00b7"
+XML_NAME = re.compile(f"[{XML_NAME_START}][{XML_NAME_CHAR}]*")
+
+# Element name for a table or column name that is not a valid XML name: SQL brackets and
+# spaces around it are dropped ("[2024-01]" -> "2024-01"), other characters are replaced by
+# their compatibility form without accents when it is valid ("Nº" -> "No", "ș" -> "s") or
+# else by "_", and a name that does not start with a letter or "_" gets a "_" in front
+# ("2024-01" -> "_2024-01").
+def xml_name(name):
+    name = name.strip()
+    if name.startswith("[") and name.endswith("]"):
+        name = name[1:-1].strip()
+    if XML_NAME.fullmatch(name):
+        return name
+    chars = []
+    for char in name:
+        if not re.fullmatch(f"[{XML_NAME_CHAR}]", char):
+            char = "".join(part for part in unicodedata.normalize("NFKD", char) if not unicodedata.combining(part))
+            char = char if char and re.fullmatch(f"[{XML_NAME_CHAR}]+", char) else "_"
+        chars.append(char)
+    name = "".join(chars)
+    return name if XML_NAME.fullmatch(name) else "_" + name
+
+# Element names of the table and its columns. Two columns that map to the same name would
+# make the rows ambiguous, so that is an error.
+def xml_names(table, columns):
+    names = {name: xml_name(name) for name in columns}
+    renamed = {name: element for name, element in names.items() if element != name}
+    if renamed:
+        logging.warning("Not valid as XML element names, renamed: " + ", ".join(f"'{name}' -> <{element}>" for name, element in renamed.items()))
+    used = {}
+    for name, element in names.items():
+        if element in used:
+            raise ValueError(f"Columns '{used[element]}' and '{name}' both become <{element}> in the XML output: rename one of them")
+        used[element] = name
+    return xml_name(table), names
+
+# <Tabela><row><Coluna>valor</Coluna>...</row></Tabela>; empty cells are left out. Table and
+# column names that are not valid XML names are renamed with xml_name().
+class XmlOutput:
+    def __init__(self, out, config):
+        self.out = out
+        self.columns = {col["name"]: col for col in config["columns"]}
+        self.table, self.elements = xml_names(config["table_name"], self.columns)
+        self.started = False
+
+    def write_chunk(self, df):
+        if not self.started:
+            self.out.write(f'<?xml version="1.0" encoding="utf-8"?>\n<{self.table}>\n')
+            self.names = list(df.columns)
+            if any(name not in self.elements for name in self.names):
+                self.elements = xml_names(self.table, self.names)[1]
+            self.tags = [self.elements[name] for name in self.names]
+            self.template = "  <row>\n" + "".join(f"    <{tag}>{{{i}}}</{tag}>\n" for i, tag in enumerate(self.tags)) + "  </row>\n"
+            self.started = True
+        columns = [[None if text is None else escape(text) for text in self.texts(df[name])] for name in self.names]
+        parts = []
+        for cells in zip(*columns):
+            if None in cells:
+                parts.append("  <row>\n" + "".join(f"    <{tag}>{cell}</{tag}>\n" for tag, cell in zip(self.tags, cells) if cell is not None) + "  </row>\n")
+            else:
+                parts.append(self.template.format(*cells))
+        self.out.write("".join(parts))
+
+    # DECIMAL(p,s) values keep their s decimal places ("0.00", not "0")
+    def texts(self, series):
+        col = self.columns.get(series.name)
+        if col and col["type"].upper().startswith("DECIMAL") and pd.api.types.is_float_dtype(series):
+            scale = amount_scale(col)
+            return [None if pd.isna(value) else f"{value:.{scale}f}" for value in series.tolist()]
+        return column_texts(series)
+
+    def close(self):
+        if not self.started:
+            self.out.write(f'<?xml version="1.0" encoding="utf-8"?>\n<{self.table}>\n')
+        self.out.write(f"</{self.table}>\n")
+
+# One row group per chunk, with a schema fixed from the config column types
+class ParquetOutput:
+    def __init__(self, path, config):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet output needs pyarrow (pip install pyarrow)")
+        self.pa = pa
+        self.path = path
+        self.pq = pq
+        self.writer = None
+        self.config = config
+
+    def arrow_type(self, name):
+        col = next((col for col in self.config["columns"] if col["name"] == name), None)
+        if col is None:
+            return self.pa.string()
+        if novo.is_date_column(col):
+            return self.pa.timestamp("ns")
+        if "INT" in col["type"].upper():
+            return self.pa.int64()
+        if novo.is_numeric_column(col):
+            return self.pa.float64()
+        return self.pa.string()
+
+    def open(self, names):
+        self.schema = self.pa.schema([(name, self.arrow_type(name)) for name in names])
+        self.writer = self.pq.ParquetWriter(self.path, self.schema)
+
+    def write_chunk(self, df):
+        if self.writer is None:
+            self.open(df.columns)
+        self.writer.write_table(self.pa.Table.from_pandas(df, schema=self.schema, preserve_index=False))
+
+    def close(self):
+        if self.writer is None:
+            self.open([col["name"] for col in self.config["columns"]])
+        self.writer.close()
+
+# Convert the config source into output_path (.csv, .xml, .parquet, or .csv.gz/.xml.gz).
+# Returns the number of rows written.
+def convert_config(config, output_path):
+    fmt, compressed = output_format(output_path)
+    source = config["excel_file"] if config["type"] == "excel" else config["file_path"]
+    logging.info(f"Converting {os.path.basename(source)} to {os.path.basename(output_path)}")
+    if fmt == "parquet":
+        out = None
+        output = ParquetOutput(output_path, config)
+    else:
+        out = gzip.open(output_path, "wt", encoding="utf-8", newline="") if compressed else open(output_path, "w", encoding="utf-8", newline="")
+        output = CsvOutput(out, config) if fmt == "csv" else XmlOutput(out, config)
+    rows = 0
+    try:
+        for chunk in iter_converted_chunks(config):
+            if len(chunk):
+                output.write_chunk(chunk)
+                rows += len(chunk)
+        output.close()
+    finally:
+        if out is not None:
+            out.close()
+    logging.info(f"{rows} rows written to {output_path}")
+    return rows
@@ -0,0 +1,128 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+from delta import UNHASHED_COLUMNS, hash_frame
+
+# Duplicate rows inside the imported file (e.g. a block pasted twice into a sheet):
+#
+# <database>
+#     <dedupe keep="first" columns="NIF,Projeto"/>
+# </database>
+#
+# Rows are the same when their `columns` are equal (default: the key="yes" columns, or the
+# whole row without Data_Hora), compared after the cast. Every row gets one 64-bit hash
+# (delta.hash_frame, vectorized in pandas) and duplicates are found on the hashes:
+#   keep="first"   the first row of each group is imported, the others are dropped
+#   keep="last"    the last row of each group is imported
+#   keep="reject"  no row of a group with duplicates is imported; all go to the reject log
+#
+# keep="first" works in one pass over the chunks: the hashes already imported are kept in a
+# SeenHashes set, 8 bytes per distinct row. keep="last" and keep="reject" need to know about
+# the rows further on, so the source is first read once to hash every row (same for
+# keep="first" when resuming, as the rows imported before are not read again); the import
+# pass then drops rows by their position in the source.
+# Two different rows have a 64-bit hash collision with probability ~n²/2^65: about one in
+# 400000 for 10 million rows.
+
+DEDUPE_MODES = ("first", "last", "reject")
+
+# Sorted copy of hashes without repeats
+def sorted_unique(hashes):
+    ordered = np.sort(hashes)
+    return ordered[np.append(True, ordered[1:] != ordered[:-1])] if len(ordered) else ordered
+
+# Set of 64-bit hashes in sorted numpy arrays. Each add() is a new level, merged with the
+# last one while that one is not more than twice as big, so there are at most ~log2(n)
+# levels to search. Two sorted levels are merged by a stable sort of both (a timsort, which
+# only merges the two runs); the hashes looked up are sorted first, so searchsorted walks
+# each level in order instead of jumping around it.
+class SeenHashes:
+    def __init__(self):
+        self.levels = []
+
+    def __len__(self):
+        return sum(len(level) for level in self.levels)
+
+    def nbytes(self):
+        return sum(level.nbytes for level in self.levels)
+
+    def contains(self, hashes):
+        order = np.argsort(hashes)
+        ordered = hashes[order]
+        found = np.zeros(len(hashes), dtype=bool)
+        for level in self.levels:
+            positions = np.minimum(np.searchsorted(level, ordered), len(level) - 1)
+            found[order] |= level[positions] == ordered
+        return found
+
+    def add(self, hashes):
+        if not len(hashes):
+            return
+        level = sorted_unique(hashes)
+        while self.levels and len(self.levels[-1]) <= 2 * len(level):
+            level = np.sort(np.concatenate([self.levels.pop(), level]), kind="stable")
+            level = level[np.append(True, level[1:] != level[:-1])]
+        self.levels.append(level)
+
+# Columns compared by the dedupe of a config
+def dedupe_columns(config):
+    if config.get("dedupe_columns"):
+        return config["dedupe_columns"]
+    keys = [col["name"] for col in config["columns"] if col.get("key")]
+    return keys or [col["name"] for col in config["columns"] if col["name"] not in UNHASHED_COLUMNS]
+
+class Deduplicator:
+    def __init__(self, config):
+        self.keep = config["dedupe"]
+        self.columns = dedupe_columns(config)
+        self.seen = SeenHashes()
+        self.plan = None
+        self.duplicates = 0
+        what = f"key ({', '.join(self.columns)})" if config.get("dedupe_columns") or any(col.get("key") for col in config["columns"]) else "row"
+        self.reason = f"duplicate {what}"
+
+    def row_hashes(self, df):
+        return hash_frame(df[self.columns])
+
+    # The positions of the rows to import need a pass over the whole source first
+    def needs_plan(self, skip):
+        return self.keep != "first" or skip > 0
+
+    # First pass: chunks of (first_record, DataFrame) from the start of the source, indexed
+    # from 0 in each chunk. Only the hashes and positions are kept.
+    def build_plan(self, chunks):
+        hashes, positions = [], []
+        for first_record, chunk in chunks:
+            hashes.append(self.row_hashes(chunk))
+            positions.append(chunk.index.to_numpy(dtype=np.int64) + first_record)
+        hashes = np.concatenate(hashes) if hashes else np.zeros(0, dtype=np.uint64)
+        positions = np.concatenate(positions) if positions else np.zeros(0, dtype=np.int64)
+        duplicated = pd.Series(hashes).duplicated(keep={"first": "first", "last": "last", "reject": False}[self.keep]).to_numpy()
+        self.plan = np.ones(int(positions.max()) + 1 if len(positions) else 0, dtype=bool)
+        self.plan[positions[duplicated]] = False
+        logging.info(f"Dedupe: {int(duplicated.sum())} of {len(hashes)} rows to leave out (keep {self.keep})")
+
+    # Drop the duplicates of a cast chunk (rejected ones are written to `rejects`). The kept
+    # rows keep their index, counted from first_record.
+    def filter(self, df, first_record, rejects):
+        if self.plan is not None:
+            positions = df.index.to_numpy(dtype=np.int64) + first_record
+            duplicate = np.zeros(len(df), dtype=bool)
+            planned = positions < len(self.plan)
+            duplicate[planned] = ~self.plan[positions[planned]]
+        else:
+            hashes = self.row_hashes(df)
+            duplicate = pd.Series(hashes).duplicated().to_numpy() | self.seen.contains(hashes)
+            self.seen.add(hashes[~duplicate])
+        if not duplicate.any():
+            return df
+        if self.keep == "reject":
+            rejects.write(df[duplicate], self.reason, first_record)
+        self.duplicates += int(duplicate.sum())
+        return df[~duplicate]
+
+    def metrics(self):
+        return {"keep": self.keep, "columns": self.columns, "duplicates": self.duplicates,
+                "seen_hashes_mb": round(self.seen.nbytes() / (1 << 20), 2)}
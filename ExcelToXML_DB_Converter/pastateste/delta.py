@@ -0,0 +1,186 @@
+import logging
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from sql_writer import dataframe_rows, enable_fast_executemany, insert_batches, insert_sql
+
+# Delta imports: instead of loading a monthly snapshot in full, the new rows are compared
+# with the snapshot imported last time for the same config and only the changes are written.
+#
+# Rows are matched on the key columns (key="yes" in the config). For each row two 64-bit
+# hashes are computed with pandas: one of the key values and one of the whole row. Rows
+# with the same key form a group, compared as a whole:
+#   key only in the new file  -> INSERT
+#   key only in the old file  -> DELETE ... WHERE key
+#   one row on each side, changed -> UPDATE ... SET ... WHERE key
+#   several rows, changed     -> DELETE the group and INSERT the new rows
+#
+# After the commit, the hashes and the key values of the new file are saved in a
+# compressed .npz file (one array per column), so the next diff never reads the table.
+
+SNAPSHOT_DIR = "snapshots"
+
+# Set by the import itself on every run, so left out of the row hash
+UNHASHED_COLUMNS = ("Data_Hora",)
+
+def snapshot_path(config, member=None, snapshot_dir=None):
+    base = os.path.splitext(os.path.basename(config.get("config_file") or "config"))[0]
+    name = f"{base}__{config['table_name'].strip()}"
+    if member:
+        name += "__" + re.sub(r"[^\w.-]", "_", member)
+    return os.path.join(snapshot_dir or SNAPSHOT_DIR, name + ".npz")
+
+# The same values hash the same whatever dtype the cast produced (int64, Int64, float64)
+def hash_frame(df):
+    normalized = {}
+    for name in df.columns:
+        series = df[name]
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            series = series.astype("float64")
+        normalized[name] = series
+    if not normalized:
+        return np.zeros(len(df), dtype=np.uint64)
+    return pd.util.hash_pandas_object(pd.DataFrame(normalized), index=False).to_numpy()
+
+class Snapshot:
+    def __init__(self, key_columns, key_hash, row_hash, keys):
+        self.key_columns = list(key_columns)
+        self.key_hash = key_hash
+        self.row_hash = row_hash
+        self.keys = keys
+
+    @classmethod
+    def from_frame(cls, df, key_columns):
+        hashed = [name for name in df.columns if name not in UNHASHED_COLUMNS]
+        keys = df[key_columns].reset_index(drop=True)
+        return cls(key_columns, hash_frame(keys), hash_frame(df[hashed]), keys)
+
+    @classmethod
+    def empty(cls, key_columns):
+        no_hashes = np.zeros(0, dtype=np.uint64)
+        return cls(key_columns, no_hashes, no_hashes, pd.DataFrame({name: pd.Series(dtype=object) for name in key_columns}))
+
+    # Saved snapshot, or an empty one when the config was never imported in delta mode
+    @classmethod
+    def load(cls, path, key_columns):
+        if not os.path.exists(path):
+            logging.info(f"No snapshot at {path}: every row is new")
+            return cls.empty(key_columns)
+        with np.load(path) as data:
+            saved_columns = data["key_columns"].tolist()
+            if saved_columns != list(key_columns):
+                raise ValueError(f"The key columns changed since the snapshot {path} was saved "
+                                 f"({', '.join(saved_columns)}); delete it and reload the table")
+            keys = {}
+            for i, name in enumerate(saved_columns):
+                values, nulls = data[f"key_{i}"], data[f"null_{i}"]
+                series = pd.Series(values)
+                keys[name] = series.astype(object).where(~nulls, None) if values.dtype.kind == "U" else series.where(~nulls)
+            return cls(saved_columns, data["key_hash"], data["row_hash"], pd.DataFrame(keys))
+
+    # Written next to the old file and renamed, so a crash never leaves half a snapshot
+    def save(self, path):
+        arrays = {"key_columns": np.array(self.key_columns), "key_hash": self.key_hash, "row_hash": self.row_hash}
+        for i, name in enumerate(self.key_columns):
+            series = self.keys[name]
+            nulls = series.isna().to_numpy()
+            if pd.api.types.is_datetime64_dtype(series) or pd.api.types.is_float_dtype(series):
+                values = series.to_numpy()
+            elif pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+                values = series.astype("float64").to_numpy()
+            else:
+                values = series.where(~nulls, "").astype(str).to_numpy(dtype=str)
+            arrays[f"key_{i}"] = values
+            arrays[f"null_{i}"] = nulls
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(temp_path, path)
+
+# What happens to a key group of the new file
+UNCHANGED, ADDED, UPDATED, REPLACED = 0, 1, 2, 3
+
+# Per key: sorted unique key hashes, rows, an order-independent hash of its rows and its
+# first row. Per row: the index of its key.
+def group_signatures(snapshot):
+    order = np.argsort(snapshot.key_hash, kind="stable")
+    keys = snapshot.key_hash[order]
+    first_of_key = np.r_[True, keys[1:] != keys[:-1]] if len(keys) else np.zeros(0, dtype=bool)
+    starts = np.flatnonzero(first_of_key)
+    counts = np.diff(np.r_[starts, len(keys)])
+    group = np.empty(len(keys), dtype=np.int64)
+    group[order] = np.cumsum(first_of_key) - 1
+    # Mix each row hash before adding them up, so swapped values do not cancel out
+    rows = snapshot.row_hash[order]
+    mixed = (rows ^ (rows >> np.uint64(33))) * np.uint64(0xFF51AFD7ED558CCD)
+    signatures = np.add.reduceat(mixed, starts) if len(keys) else mixed
+    return keys[starts], counts, signatures, order[starts], group
+
+# Row positions to write, and the counts of the change set
+def diff_snapshots(old, new):
+    old_keys, old_counts, old_signatures, old_first, _ = group_signatures(old)
+    new_keys, new_counts, new_signatures, _, new_group = group_signatures(new)
+    _, old_index, new_index = np.intersect1d(old_keys, new_keys, assume_unique=True, return_indices=True)
+    changed = (old_counts[old_index] != new_counts[new_index]) | (old_signatures[old_index] != new_signatures[new_index])
+    single = (old_counts[old_index] == 1) & (new_counts[new_index] == 1)
+
+    new_state = np.full(len(new_keys), ADDED, dtype=np.int8)
+    new_state[new_index] = np.where(~changed, UNCHANGED, np.where(single, UPDATED, REPLACED))
+    row_state = new_state[new_group]
+    removed = np.ones(len(old_keys), dtype=bool)
+    removed[old_index] = False
+    # One DELETE per key removes the whole group
+    deleted_keys = removed.copy()
+    deleted_keys[old_index] = changed & ~single
+    return {
+        "insert_rows": np.flatnonzero((row_state == ADDED) | (row_state == REPLACED)),
+        "update_rows": np.flatnonzero(row_state == UPDATED),
+        "delete_rows": np.sort(old_first[deleted_keys]),
+        "inserted": int((row_state == ADDED).sum()),
+        "updated": int(((row_state == UPDATED) | (row_state == REPLACED)).sum()),
+        "deleted": int(old_counts[removed].sum()),
+        "unchanged": int((row_state == UNCHANGED).sum()),
+    }
+
+# Run `statement` once per null pattern of the keys, with "a = ?" for the values that are
+# set and "a IS NULL" for the missing ones. values: DataFrame of parameters that go before
+# the key values (the SET of an UPDATE).
+def execute_keyed(cursor, statement, keys, controller, values=None):
+    nulls = keys.isna().to_numpy()
+    patterns = (nulls * (1 << np.arange(len(keys.columns)))).sum(axis=1)
+    key_rows = dataframe_rows(keys)
+    value_rows = dataframe_rows(values) if values is not None else [()] * len(keys)
+    for pattern in np.unique(patterns):
+        conditions = [f"{name} IS NULL" if pattern >> i & 1 else f"{name} = ?" for i, name in enumerate(keys.columns)]
+        sql = f"{statement} WHERE {' AND '.join(conditions)}"
+        rows = [value_rows[i] + tuple(value for value in key_rows[i] if value is not None)
+                for i in np.flatnonzero(patterns == pattern)]
+        insert_batches(cursor, sql, rows, controller)
+
+# Write the change set in one transaction: deletes, updates, then inserts
+def apply_changes(conn, table_name, df, old, changes, controller):
+    key_columns = old.key_columns
+    value_columns = [name for name in df.columns if name not in key_columns]
+    cursor = conn.cursor()
+    enable_fast_executemany(cursor)
+    try:
+        if len(changes["delete_rows"]):
+            execute_keyed(cursor, f"DELETE FROM {table_name}", old.keys.iloc[changes["delete_rows"]], controller)
+        if len(changes["update_rows"]) and value_columns:
+            updated = df.iloc[changes["update_rows"]]
+            assignments = ", ".join(f"{name} = ?" for name in value_columns)
+            execute_keyed(cursor, f"UPDATE {table_name} SET {assignments}", updated[key_columns], controller,
+                          values=updated[value_columns])
+        if len(changes["insert_rows"]):
+            inserted = df.iloc[changes["insert_rows"]]
+            insert_batches(cursor, insert_sql(inserted, table_name), dataframe_rows(inserted), controller)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
@@ -0,0 +1,17 @@
+import importlib.util
+import sys
+
+# Modules that are only loaded the first time one of their attributes is used. novo.py
+# loads pandas and numpy this way, so --help, --validate and --list-columns never pay for them.
+def lazy_import(name):
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named '{name}'")
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
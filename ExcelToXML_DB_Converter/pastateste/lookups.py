@@ -0,0 +1,147 @@
+import logging
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import novo
+
+# Lookup columns: the source value is replaced by a column of a reference table already in
+# the database (NIF -> employee ID, project code -> cost center), instead of fixing the
+# imported rows with SQL afterwards.
+#
+# <column name="ID_Colaborador" type="INT" source_name="NIF" lookup="Colaboradores" lookup_key="NIF" lookup_value="ID"/>
+#
+# The reference table is read once (SELECT key, value) into a pandas Index, which is a hash
+# table of the keys. A column is then resolved with one get_indexer() over its distinct
+# values, mapped back to the rows through their factorize codes. Keys are compared as text
+# with the whitespace collapsed and without case (like the default SQL Server collation),
+# and 123.0 is the same key as 123. Empty source values keep the column default; rows with
+# a value that is not in the reference table go to the reject log (rejects.py).
+#
+# A LookupCache holds the indexes of a run. The import service keeps one for all its jobs
+# and reloads a table once it is older than the cache ttl.
+
+DEFAULT_TTL_SECONDS = 300
+FETCH_ROWS = 50000
+
+# Distinct values -> comparable keys (None for empty values)
+def normalize_keys(values):
+    keys = []
+    for value in values:
+        text = novo.stringify_value(value)
+        text = " ".join(text.split()).casefold() if isinstance(text, str) else None
+        keys.append(text or None)
+    return keys
+
+class LookupIndex:
+    def __init__(self, name, keys, values):
+        self.name = name
+        keys = pd.Index(normalize_keys(keys), dtype=object)
+        values = np.asarray(values, dtype=object)
+        duplicated = keys.duplicated()
+        if duplicated.any():
+            logging.warning(f"Lookup {name}: {int(duplicated.sum())} repeated keys, the first row of each is used")
+        keep = ~duplicated & keys.notna()
+        self.index = keys[keep]
+        # The extra last slot is picked by position -1 (no match)
+        self.values = np.append(values[keep], None)
+        self.loaded_at = time.monotonic()
+
+    def __len__(self):
+        return len(self.index)
+
+    # (values, unmatched): the reference value of each row (None when there is none) and
+    # the mask of the rows with a non-empty value that is not in the table
+    def resolve(self, series):
+        codes, uniques = pd.factorize(series)
+        keys = normalize_keys(uniques)
+        positions = np.append(self.index.get_indexer(pd.Index(keys, dtype=object)), -1)[codes]
+        blank = np.append(np.array([key is None for key in keys], dtype=bool), True)[codes]
+        return pd.Series(self.values[positions], index=series.index), (positions == -1) & ~blank
+
+def lookup_name(col):
+    return f"{col['lookup']}.{col['lookup_key']}"
+
+# Read the key and value columns of the reference table of a lookup column
+def load_lookup(col, connect):
+    start = time.perf_counter()
+    keys, values = [], []
+    conn = connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {col['lookup_key']}, {col['lookup_value']} FROM {col['lookup']}")
+        while True:
+            rows = cursor.fetchmany(FETCH_ROWS)
+            if not rows:
+                break
+            for key, value in rows:
+                keys.append(key)
+                values.append(value)
+    finally:
+        conn.close()
+    index = LookupIndex(lookup_name(col), keys, values)
+    logging.info(f"Lookup {lookup_name(col)} -> {col['lookup_value']}: {len(index)} keys loaded in {time.perf_counter() - start:.2f}s")
+    return index
+
+class LookupCache:
+    # ttl: seconds before a table is read again (None: never, for a single run)
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self.indexes = {}
+        self.lock = threading.Lock()
+        self.table_locks = {}
+        self.loads = 0
+        self.hits = 0
+
+    # Index of `key` if it is loaded and not older than the ttl (called with the lock held)
+    def fresh(self, key):
+        index = self.indexes.get(key)
+        if index is not None and (self.ttl is None or time.monotonic() - index.loaded_at < self.ttl):
+            self.hits += 1
+            return index
+        return None
+
+    # The index of a lookup column. Each table is loaded under its own lock: jobs asking for a
+    # table that is being loaded wait for it, jobs using other tables do not.
+    def get(self, config, col, connect):
+        key = (config.get("server"), config.get("port"), config.get("database"),
+               col["lookup"], col["lookup_key"], col["lookup_value"])
+        with self.lock:
+            index = self.fresh(key)
+            if index is not None:
+                return index
+            table_lock = self.table_locks.setdefault(key, threading.Lock())
+        with table_lock:
+            with self.lock:
+                # Loaded by another job while this one waited
+                index = self.fresh(key)
+            if index is not None:
+                return index
+            index = load_lookup(col, connect)
+            with self.lock:
+                self.indexes[key] = index
+                self.loads += 1
+            return index
+
+    def stats(self):
+        return {"tables": len(self.indexes), "loads": self.loads, "hits": self.hits}
+
+# Replace the lookup columns of df by their reference values. Rows with a value that has no
+# match are written to `rejects` (with the source values; not when rejects is None) and
+# removed; the other rows keep their index, so the caller still knows their position in the source.
+def apply_lookups(df, config, cache, connect, rejects, first_record=0):
+    for col in config["columns"]:
+        if not col.get("lookup") or col["name"] not in df.columns:
+            continue
+        values, unmatched = cache.get(config, col, connect).resolve(df[col["name"]])
+        if unmatched.any():
+            missing = df[unmatched]
+            if rejects is not None:
+                rejects.write(missing, [f"{col['name']}: {value!r} not in {lookup_name(col)}" for value in missing[col["name"]]],
+                              first_record)
+            df = df[~unmatched].copy()
+            values = values[~unmatched]
+        df[col["name"]] = values
+    return df
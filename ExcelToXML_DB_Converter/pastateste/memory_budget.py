@@ -0,0 +1,158 @@
+import logging
+import os
+import re
+import sys
+import threading
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Memory budget for --max-memory. Without it a sheet is read whole, cast whole and turned
+# into rows for the writer whole, so a big file needs several times its size in RAM.
+# With a budget the file is read, cast and written chunk by chunk, and the chunk size
+# comes from what the chunks really cost:
+#
+#   - a sampler thread reads the resident set size (RSS) every SAMPLE_SECONDS, so the
+#     highest RSS reached while a chunk was read, cast and written is known;
+#   - that peak, minus the RSS before the chunk, divided by its rows, is the memory of
+#     one row in the pipeline (never less than the DataFrame itself takes);
+#   - the next chunk gets the rows that fit in TARGET_FRACTION of the budget above the
+#     current RSS, growing at most 2x per chunk;
+#   - when the RSS goes over SHRINK_FRACTION of the budget, the next chunk is halved.
+#
+# RSS is read from /proc on Linux; elsewhere psutil is needed.
+
+# Plain numbers are megabytes
+SIZE_UNITS = {"": 1 << 20, "B": 1, "K": 1 << 10, "KB": 1 << 10, "M": 1 << 20, "MB": 1 << 20, "G": 1 << 30, "GB": 1 << 30}
+
+FIRST_CHUNK_ROWS = 5000
+MIN_CHUNK_ROWS = 500
+MAX_CHUNK_ROWS = 1000000
+TARGET_FRACTION = 0.8
+SHRINK_FRACTION = 0.9
+SAMPLE_SECONDS = 0.02
+
+# Rows of a chunk whose DataFrame size is measured (memory_usage(deep=True) is slow on text)
+MEASURED_ROWS = 2000
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+# "512MB", "2GB", "1.5G" or "800" (MB) -> bytes
+def parse_size(text):
+    match = re.fullmatch(r"\s*(\d+(?:[.,]\d+)?)\s*([KMG]?B?)\s*", str(text), re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid memory size: {text} (e.g. 512MB or 2GB)")
+    return int(float(match.group(1).replace(",", ".")) * SIZE_UNITS[match.group(2).upper()])
+
+def megabytes(size):
+    return round(size / (1 << 20), 1) if size is not None else None
+
+# Resident set size of this process in bytes, or None when it cannot be read
+def current_rss():
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+# Highest RSS of the process so far, in bytes
+def peak_rss():
+    if psutil is not None:
+        peak = getattr(psutil.Process().memory_info(), "peak_wset", None)
+        if peak:
+            return peak
+    try:
+        import resource
+    except ImportError:
+        return current_rss()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+# Bytes per row of a DataFrame chunk, measured on its first rows
+def frame_row_bytes(df):
+    sample = df.iloc[:MEASURED_ROWS]
+    return sample.memory_usage(index=False, deep=True).sum() / len(sample) if len(sample) else 0.0
+
+class MemoryBudget:
+    def __init__(self, limit, first_rows=FIRST_CHUNK_ROWS):
+        if current_rss() is None:
+            raise RuntimeError("--max-memory cannot read the memory of the process on this system: install psutil")
+        self.limit = limit
+        self.chunk_rows = first_rows
+        self.row_bytes = None
+        self.chunk_sizes = []
+        self.shrinks = 0
+        self.over_budget = False
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.window_start = self.window_peak = self.peak = current_rss()
+        if self.peak >= limit * TARGET_FRACTION:
+            logging.warning(f"The process already uses {megabytes(self.peak)} MB of the {megabytes(limit)} MB budget")
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.sample_until_stopped, name="memory-sampler", daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+        self.sample()
+
+    def sample(self):
+        rss = current_rss()
+        with self.lock:
+            self.peak = max(self.peak, rss)
+            self.window_peak = max(self.window_peak, rss)
+        return rss
+
+    def sample_until_stopped(self):
+        while not self.stopped.wait(SAMPLE_SECONDS):
+            self.sample()
+
+    # Called once a chunk has been written and dropped: measures it and sizes the next one
+    def chunk_done(self, rows, frame_bytes=0.0):
+        rss = self.sample()
+        with self.lock:
+            window_start, window_peak = self.window_start, self.window_peak
+            self.window_start = self.window_peak = rss
+        if not rows:
+            return self.chunk_rows
+        self.chunk_sizes.append(rows)
+        measured = max((window_peak - window_start) / rows, frame_bytes)
+        # A chunk that fits in memory freed by the previous ones barely moves the RSS, so
+        # an estimate only drops slowly
+        self.row_bytes = measured if self.row_bytes is None else max(measured, 0.8 * self.row_bytes)
+
+        if max(rss, window_peak) >= self.limit * SHRINK_FRACTION:
+            next_rows = max(self.chunk_rows // 2, MIN_CHUNK_ROWS)
+            if next_rows < self.chunk_rows:
+                self.shrinks += 1
+                logging.info(f"Memory at {megabytes(max(rss, window_peak))} MB of {megabytes(self.limit)} MB: "
+                             f"next chunk {next_rows} rows")
+        else:
+            fit = (self.limit * TARGET_FRACTION - rss) / self.row_bytes if self.row_bytes else self.chunk_rows * 2
+            next_rows = min(fit, self.chunk_rows * 2)
+        self.chunk_rows = int(max(MIN_CHUNK_ROWS, min(MAX_CHUNK_ROWS, next_rows)))
+        if window_peak > self.limit and not self.over_budget:
+            self.over_budget = True
+            logging.warning(f"Memory went over the budget ({megabytes(window_peak)} MB of {megabytes(self.limit)} MB)")
+        return self.chunk_rows
+
+    def metrics(self):
+        sizes = self.chunk_sizes or [0]
+        return {
+            "max_memory_mb": megabytes(self.limit),
+            "peak_memory_mb": megabytes(self.peak),
+            "chunks": len(self.chunk_sizes),
+            "chunk_rows_min": min(sizes),
+            "chunk_rows_max": max(sizes),
+            "row_bytes": round(self.row_bytes or 0),
+            "shrinks": self.shrinks,
+        }
@@ -1,21 +1,22 @@
-import pandas as pd
-import pyodbc
 import os
-from dotenv import load_dotenv
+import gc
+import io
+import itertools
+import json
 import xml.etree.ElementTree as ET
 import logging
 import argparse
+import contextlib
+import re
+import sys
+import time
 from datetime import datetime
 
-# Carregar o arquivo .env
-load_dotenv(dotenv_path="conexao.env")
+from lazy import lazy_import
 
-# Obter variáveis de ambiente
-db_server = os.getenv("DB_SERVER")
-db_port = os.getenv("DB_PORT")
-db_name = os.getenv("DB_NAME")
-db_user = os.getenv("DB_USER")
-db_password = os.getenv("DB_PASSWORD")
+# pandas and numpy are loaded on first use, so --help and the config checks start fast
+pd = lazy_import("pandas")
+np = lazy_import("numpy")
 
 # Logging setup
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -65,11 +66,14 @@ def normalize_column_names(df):
 
 # Database connection 
 def connect_to_sql(config):
-    server = os.getenv("DB_SERVER")
-    port = os.getenv("DB_PORT")
-    database = os.getenv("DB_NAME")
-    username = os.getenv("DB_USER")
-    password = os.getenv("DB_PASSWORD")
+    # Carregar o arquivo .env (only when a connection is opened)
+    from dotenv import load_dotenv
+    load_dotenv(dotenv_path="conexao.env")
+    db_server = os.getenv("DB_SERVER")
+    db_port = os.getenv("DB_PORT")
+    db_name = os.getenv("DB_NAME")
+    db_user = os.getenv("DB_USER")
+    db_password = os.getenv("DB_PASSWORD")
 
     conn_str = (
       f"DRIVER={{ODBC Driver 18 for SQL Server}};"
@@ -79,6 +83,8 @@ def connect_to_sql(config):
     f"PWD={db_password};"
     f"Encrypt=no;"
     )
+    # Imported here so conversion and export runs work without the ODBC driver
+    import pyodbc
     return pyodbc.connect(conn_str)
 
 # Create the table if it doesn't exist
@@ -95,6 +101,28 @@ def create_table_if_not_exists(config, conn):
     conn.commit()
     cursor.close()
 
+# Decimal and thousands separators for the "locale" column attribute
+NUMBER_LOCALES = {
+    "pt": (",", "."), "pt_pt": (",", "."), "pt_br": (",", "."), "es": (",", "."), "de": (",", "."),
+    "fr": (",", " "), "en": (".", ","), "en_us": (".", ","), "en_gb": (".", ","),
+}
+
+# Separators of a numeric column: locale="pt_PT", or decimal_sep="," (and thousands_sep)
+def number_separators(attrib):
+    decimal_sep = attrib.get("decimal_sep")
+    thousands_sep = attrib.get("thousands_sep")
+    locale_name = attrib.get("locale")
+    if locale_name:
+        key = locale_name.lower().replace("-", "_")
+        separators = NUMBER_LOCALES.get(key) or NUMBER_LOCALES.get(key.split("_")[0])
+        if separators is None:
+            raise ValueError(f"Unknown number locale: {locale_name}")
+        decimal_sep = decimal_sep or separators[0]
+        thousands_sep = thousands_sep if thousands_sep is not None else separators[1]
+    if decimal_sep and thousands_sep is None:
+        thousands_sep = "." if decimal_sep == "," else ","
+    return {"decimal_sep": decimal_sep, "thousands_sep": thousands_sep}
+
 # Load the configuration file
 def load_config(file_path):
     tree = ET.parse(file_path)
@@ -123,8 +151,23 @@ def load_config(file_path):
         "database": get_text_or_none(database, "./database_name"),
         "trusted_connection": get_text_or_none(database, "./trusted_connection").lower() == "yes" if get_text_or_none(database, "./trusted_connection") else False,
         "table_name": table_elem.attrib["name"],
+        "config_file": file_path,
         "columns": []
     }
+    writers_text = get_text_or_none(database, "./writers")
+    config["writers"] = int(writers_text) if writers_text and writers_text.isdigit() else 1
+    atomic_text = get_text_or_none(database, "./atomic")
+    config["atomic"] = atomic_text is not None and atomic_text.lower() == "yes"
+    config["max_memory"] = get_text_or_none(database, "./max_memory")
+    config["reject_file"] = get_text_or_none(database, "./reject_file")
+    delta_text = get_text_or_none(database, "./delta")
+    config["delta"] = delta_text is not None and delta_text.lower() == "yes"
+    dedupe = database.find("./dedupe")
+    config["dedupe"] = dedupe.attrib.get("keep", "first").lower() if dedupe is not None else None
+    dedupe_columns = dedupe.attrib.get("columns") if dedupe is not None else None
+    config["dedupe_columns"] = [name.strip() for name in dedupe_columns.split(",") if name.strip()] if dedupe_columns else None
+    batching = database.find("./batching")
+    config["batching"] = {key: float(value) for key, value in batching.attrib.items()} if batching is not None else {}
 
 
     # Read all columns 
@@ -133,9 +176,17 @@ def load_config(file_path):
             "name": col.attrib["name"],
             "type": col.attrib["type"],
             "xpath": col.attrib.get("xpath"),
+            "path": col.attrib.get("path"),
             "attribute": col.attrib.get("attribute"),
             "source_name": col.attrib.get("source_name"),
-            "default": col.attrib.get("default", None)
+            "default": col.attrib.get("default", None),
+            "scope": col.attrib.get("scope"),
+            "format": col.attrib.get("format"),
+            "key": col.attrib.get("key", "").lower() == "yes",
+            "lookup": col.attrib.get("lookup"),
+            "lookup_key": col.attrib.get("lookup_key"),
+            "lookup_value": col.attrib.get("lookup_value"),
+            **number_separators(col.attrib)
         })
 
        # If the file is Excel
@@ -146,6 +197,8 @@ def load_config(file_path):
         config["sheet_name"] = get_text_or_none(excel, "./sheet_name")
         skip_rows_text = get_text_or_none(excel, "./skip_rows")
         config["skip_rows"] = int(skip_rows_text) if skip_rows_text and skip_rows_text.isdigit() else None
+        typed_text = get_text_or_none(excel, "./typed")
+        config["typed"] = typed_text is not None and typed_text.lower() == "yes"
 
      # If the file is XML
     elif root.find("./xml") is not None:
@@ -157,13 +210,116 @@ def load_config(file_path):
         config["namespace"] = namespace_elem.attrib["uri"]
         config["root_path"] = get_text_or_none(xml, "./root_path")
         config["file_path"] = get_text_or_none(xml, "./file_path")
+        config["xml_backend"] = get_text_or_none(xml, "./backend") or "auto"
+        workers_text = get_text_or_none(xml, "./workers")
+        config["xml_workers"] = int(workers_text) if workers_text and workers_text.isdigit() else 1
+
+    # If the file is CSV
+    elif root.find("./csv") is not None:
+        csv = root.find("./csv")
+        config["type"] = "csv"
+        config["file_path"] = get_text_or_none(csv, "./file_path")
+        delimiter = get_text_or_none(csv, "./delimiter") or ","
+        config["delimiter"] = "\t" if delimiter.lower() in ("\\t", "tab") else delimiter
+        config["encoding"] = get_text_or_none(csv, "./encoding") or "utf-8"
+        skip_rows_text = get_text_or_none(csv, "./skip_rows")
+        config["skip_rows"] = int(skip_rows_text) if skip_rows_text and skip_rows_text.isdigit() else 0
+        config["csv_engine"] = (get_text_or_none(csv, "./engine") or "auto").lower()
+
+    # If the file is JSON or NDJSON
+    elif root.find("./json") is not None:
+        json_elem = root.find("./json")
+        config["type"] = "json"
+        config["file_path"] = get_text_or_none(json_elem, "./file_path")
+        config["records_path"] = get_text_or_none(json_elem, "./records_path")
+        config["json_format"] = (get_text_or_none(json_elem, "./format") or "auto").lower()
 
     else:
-        raise ValueError("File type not specified correctly (expected <excel> or <xml>)")
+        raise ValueError("File type not specified correctly (expected <excel>, <xml>, <csv> or <json>)")
+
+    # Optional <export>: fixed pain.001 values, e.g. <value path="PmtInf/Dbtr/Nm">Empresa</value>
+    export = root.find("./export")
+    config["export_file"] = get_text_or_none(export, "./file_path") if export is not None else None
+    config["export_values"] = {value.attrib["path"]: (value.text or "").strip() for value in export.findall("./value")} if export is not None else {}
      # Error message 
     return config
 
  
+# SQL types the config columns can use
+SQL_TYPE_PATTERN = re.compile(r"^(N?VARCHAR\((\d+|MAX)\)|N?CHAR\(\d+\)|DECIMAL\(\d+\s*,\s*\d+\)|NUMERIC\(\d+\s*,\s*\d+\)|"
+                              r"INT|BIGINT|SMALLINT|TINYINT|BIT|FLOAT|REAL|MONEY|DATE|DATETIME|DATETIME2|TIME|N?TEXT)$", re.IGNORECASE)
+
+# Checks a config without reading any data (no pandas). Returns (errors, warnings).
+def validate_config(config):
+    errors, warnings = [], []
+    names = [col["name"] for col in config["columns"]]
+    if not names:
+        errors.append("The table has no <column>")
+    for name in sorted({name for name in names if names.count(name) > 1}):
+        errors.append(f"Column '{name}' is defined more than once")
+    for col in config["columns"]:
+        if not SQL_TYPE_PATTERN.match(col["type"].strip()):
+            warnings.append(f"Column '{col['name']}': unknown type '{col['type']}'")
+        if config["type"] in ("excel", "csv") and not col.get("source_name") and col["name"] != "Data_Hora":
+            warnings.append(f"Column '{col['name']}' has no source_name; it always gets its default")
+        if config["type"] == "xml" and not col.get("xpath") and col.get("default") is None and col["name"] != "Data_Hora":
+            warnings.append(f"Column '{col['name']}' has no xpath and no default")
+        if config["type"] == "json" and not col.get("path") and col.get("default") is None and col["name"] != "Data_Hora":
+            warnings.append(f"Column '{col['name']}' has no path and no default")
+        if config["type"] == "json" and col.get("path"):
+            try:
+                compile_json_path(col["path"])
+            except ValueError as e:
+                errors.append(f"Column '{col['name']}': {e}")
+        if col.get("decimal_sep") and not is_numeric_column(col):
+            warnings.append(f"Column '{col['name']}': locale/decimal_sep only applies to DECIMAL/INT columns")
+        if (col.get("lookup") or col.get("lookup_key") or col.get("lookup_value")) and not (col.get("lookup") and col.get("lookup_key") and col.get("lookup_value")):
+            errors.append(f"Column '{col['name']}': a lookup needs lookup, lookup_key and lookup_value")
+    if config.get("max_memory"):
+        from memory_budget import parse_size
+        try:
+            parse_size(config["max_memory"])
+        except ValueError as e:
+            errors.append(str(e))
+    if config["type"] == "json" and config["json_format"] not in ("auto", "ndjson", "array"):
+        errors.append(f"Unknown JSON <format> '{config['json_format']}' (expected auto, ndjson or array)")
+    if config["type"] == "json" and config.get("records_path"):
+        try:
+            compile_json_path(config["records_path"])
+        except ValueError as e:
+            errors.append(f"<records_path>: {e}")
+    if config.get("delta") and not any(col.get("key") for col in config["columns"]):
+        errors.append('Delta imports need key columns (key="yes")')
+    if config.get("dedupe"):
+        from dedupe import DEDUPE_MODES
+        if config["dedupe"] not in DEDUPE_MODES:
+            errors.append(f"Unknown <dedupe> keep '{config['dedupe']}' (expected {', '.join(DEDUPE_MODES)})")
+        names = {col["name"] for col in config["columns"]}
+        for name in config.get("dedupe_columns") or []:
+            if name not in names:
+                errors.append(f"<dedupe> column '{name}' is not a config column")
+    source = config["excel_file"] if config["type"] == "excel" else config["file_path"]
+    if not source or source.upper() == "ASK":
+        warnings.append("No data file in the config; pass it on the command line")
+    elif not os.path.exists(source):
+        errors.append(f"Data file not found: {source}")
+    return errors, warnings
+
+# One line per config column: name, type, where the value comes from and its options
+def describe_columns(config):
+    lines = []
+    for col in config["columns"]:
+        source = col.get("source_name") or col.get("xpath") or col.get("path") or "-"
+        if col.get("attribute"):
+            source += f" @{col['attribute']}"
+        options = [option for option, present in (
+            ("key", col.get("key")), (f"scope={col.get('scope')}", col.get("scope")),
+            (f"lookup={col.get('lookup')}.{col.get('lookup_key')}->{col.get('lookup_value')}", col.get("lookup")),
+            (f"decimal_sep={col.get('decimal_sep')!r}", col.get("decimal_sep")), (f"format={col.get('format')}", col.get("format")),
+            (f"default={col.get('default')!r}", col.get("default"))) if present]
+        lines.append(f"{col['name']:<30} {col['type']:<16} {source:<40} {' '.join(options)}".rstrip())
+    return lines
+
 # Get the columns from the DataFrame and normalize the names 
 def find_column(df, source_name):
     normalized_df_cols = {normalize_name(str(col).strip()): col for col in df.columns}
@@ -178,13 +334,16 @@ def validate_headers(df, config):
 
 # Check if the Excel file exists
 def read_excel_with_fallback(config):
-    if not os.path.exists(config['excel_file']):
+    if config.get("excel_data") is None and not os.path.exists(config['excel_file']):
         raise FileNotFoundError(f"File not found: {config['excel_file']}")
 
+    # Typed mode keeps openpyxl's numbers and datetimes; text columns are converted later
+    dtype = None if config.get("typed") else str
+
     # Try to read the file 
     if config.get("skip_rows") is not None:
         try:
-            df = pd.read_excel(config['excel_file'], sheet_name=config['sheet_name'], skiprows=config['skip_rows'], dtype=str, engine="openpyxl")
+            df = pd.read_excel(excel_input(config), sheet_name=config['sheet_name'], skiprows=config['skip_rows'], dtype=dtype, engine="openpyxl")
             df = make_columns_unique(df)
             df = normalize_column_names(df)
             if validate_headers(df, config):
@@ -193,7 +352,7 @@ def read_excel_with_fallback(config):
             logging.warning(f"Error reading with skip_rows: {e}")
 
      # Search for the header to see where the column names are
-    all_data = pd.read_excel(config['excel_file'], sheet_name=config['sheet_name'], header=None, dtype=str, engine="openpyxl")
+    all_data = pd.read_excel(excel_input(config), sheet_name=config['sheet_name'], header=None, dtype=dtype, engine="openpyxl")
     expected = [normalize_name(col['source_name']) for col in config['columns']]
     best_match = {'idx': 0, 'matches': 0}
 
@@ -207,140 +366,1267 @@ def read_excel_with_fallback(config):
 
     # If found, read from that row 
     if best_match['matches'] > 0:
-        df = pd.read_excel(config['excel_file'], sheet_name=config['sheet_name'], skiprows=best_match['idx'], dtype=str, engine="openpyxl")
+        df = pd.read_excel(excel_input(config), sheet_name=config['sheet_name'], skiprows=best_match['idx'], dtype=dtype, engine="openpyxl")
         df = make_columns_unique(df)
         df = normalize_column_names(df)
         return df
     else:
         raise ValueError("Could not identify valid headers in Excel")
     
- # Read the XML file
-def parse_xml_to_dataframe(config):
-    tree = ET.parse(config["file_path"])
-    root = tree.getroot()
+# What pandas reads: the file path, or the bytes of a member read from an archive
+def excel_input(config):
+    if config.get("excel_data") is not None:
+        return io.BytesIO(config["excel_data"])
+    return config["excel_file"]
+
+# Rows searched for the header when the sheet is streamed (--max-memory)
+EXCEL_HEADER_SEARCH_ROWS = 1000
+
+# Cell text read_excel turns into NaN (its default na_values)
+EXCEL_NA_VALUES = frozenset({"", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND",
+                             "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null"})
+
+# A cell as read_excel(dtype=str) gives it: whole numbers without ".0", missing text as None
+def excel_text(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return None if value in EXCEL_NA_VALUES else value
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+# A cell as read_excel gives it in typed mode
+def excel_value(value):
+    return None if isinstance(value, str) and value in EXCEL_NA_VALUES else value
+
+# Column names of a header row, as read_excel names them
+def excel_header_names(row):
+    return [f"Unnamed: {i}" if value is None else str(int(value)) if isinstance(value, float) and value.is_integer() else str(value)
+            for i, value in enumerate(row)]
+
+# (index, values) of the header row: after skip_rows if the config columns are there,
+# otherwise the row among the first EXCEL_HEADER_SEARCH_ROWS that matches most of them
+def find_excel_header(sheet, config):
+    expected = [normalize_name(col['source_name']) for col in config['columns']]
+    if config.get("skip_rows") is not None:
+        first = config["skip_rows"] + 1
+        row = next(sheet.iter_rows(min_row=first, max_row=first, values_only=True), None)
+        if row is not None and set(expected).issubset(normalize_name(name) for name in excel_header_names(row)):
+            return config["skip_rows"], row
+        logging.warning(f"Header not found on row {first}, searching for it")
+
+    best = (None, None, 0)
+    for idx, row in enumerate(sheet.iter_rows(max_row=EXCEL_HEADER_SEARCH_ROWS, values_only=True)):
+        cells = {normalize_name(str(cell)) for cell in row}
+        matches = sum(1 for col in expected if col in cells)
+        if matches > best[2]:
+            best = (idx, row, matches)
+            if matches == len(expected):
+                break
+    if not best[2]:
+        raise ValueError("Could not identify valid headers in Excel")
+    return best[0], best[1]
+
+# Rows per chunk of a sheet read in chunks without --max-memory (e.g. for <dedupe>)
+EXCEL_CHUNK_ROWS = 100000
+
+# Stream the sheet in chunks of budget.chunk_rows rows (--max-memory) instead of reading it
+# whole: openpyxl in read-only mode, each chunk mapped like read_excel_mapped.
+# skip_rows: data rows already committed (--resume).
+def iter_excel_chunks(config, budget=None, skip_rows=0, chunk_size=EXCEL_CHUNK_ROWS):
+    import openpyxl
+    if config.get("excel_data") is None and not os.path.exists(config['excel_file']):
+        raise FileNotFoundError(f"File not found: {config['excel_file']}")
+    workbook = openpyxl.load_workbook(excel_input(config), read_only=True, data_only=True)
+    try:
+        sheet = workbook[config["sheet_name"]] if config.get("sheet_name") else workbook.worksheets[0]
+        header_index, header = find_excel_header(sheet, config)
+        names = excel_header_names(header)
+        convert = excel_value if config.get("typed") else excel_text
+        empty_row = (None,) * len(names)
+
+        # Blank rows are kept only when data follows, as read_excel drops the trailing ones
+        def data_rows():
+            blank = 0
+            for row in sheet.iter_rows(min_row=header_index + 2, values_only=True):
+                if all(value is None for value in row):
+                    blank += 1
+                    continue
+                for _ in range(blank):
+                    yield empty_row
+                blank = 0
+                yield tuple(convert(value) for value in row)
+
+        rows = itertools.islice(data_rows(), skip_rows, None)
+        first = True
+        while True:
+            chunk = list(itertools.islice(rows, budget.chunk_rows if budget else chunk_size))
+            if not chunk:
+                break
+            df = pd.DataFrame(chunk, dtype=object).reindex(columns=range(len(names)))
+            del chunk
+            df.columns = names
+            df = normalize_column_names(make_columns_unique(df))
+            if config.get("typed"):
+                df = df.infer_objects()
+            yield map_columns(df, config, warn=first)
+            first = False
+    finally:
+        workbook.close()
+
+# Rows per chunk of a CSV source (without --max-memory) and bytes per block read by pyarrow
+CSV_CHUNK_ROWS = 100000
+CSV_BLOCK_BYTES = 4 << 20
+
+# The pyarrow CSV reader, or None when pyarrow is not installed or <engine>pandas</engine>
+def csv_arrow_module(config):
+    if config.get("csv_engine", "auto") == "pandas":
+        return None
+    try:
+        from pyarrow import csv as pa_csv
+        return pa_csv
+    except ImportError:
+        if config.get("csv_engine") == "pyarrow":
+            raise
+        return None
+
+# Stream a CSV file in chunks (always: multi-GB exports are never read whole). Only the
+# header columns the config uses are read, all as text, so there is no type guessing per
+# chunk; the cast stage converts them as it does for a sheet read as text. Cells such as
+# "", "NA" or "NULL" are missing, as with read_excel.
+# source: path or binary file object (default: config["file_path"]); skip_records: data rows
+# already committed (--resume); budget: a MemoryBudget whose chunk_rows replaces chunk_size.
+def iter_csv_chunks(config, chunk_size=CSV_CHUNK_ROWS, source=None, skip_records=0, budget=None):
+    source = source or config["file_path"]
+    if isinstance(source, str) and not os.path.exists(source):
+        raise FileNotFoundError(f"File not found: {source}")
+    names = list(pd.read_csv(source, sep=config["delimiter"], encoding=config["encoding"],
+                             skiprows=config["skip_rows"], nrows=0).columns)
+    if hasattr(source, "seek"):
+        source.seek(0)
+    header = pd.DataFrame(columns=names)
+    found = {find_column(header, col["source_name"]) for col in config["columns"] if col.get("source_name")}
+    used = [name for name in names if name in found]
+    chunk_rows = lambda: budget.chunk_rows if budget is not None else chunk_size
+
+    pa_csv = csv_arrow_module(config)
+    if pa_csv is not None and arrow_header_matches(pa_csv, source, config, names):
+        frames = read_csv_arrow(pa_csv, source, config, used, skip_records, chunk_rows)
+    else:
+        frames = read_csv_pandas(source, config, used, skip_records, chunk_rows)
+    first = True
+    for df in frames:
+        yield map_columns(df, config, warn=first)
+        first = False
+
+# pyarrow does not count blank lines in skip_rows and keeps duplicated names as they are,
+# so it is only used when it finds the same header as read_csv, without duplicates
+def arrow_header_matches(pa_csv, source, config, names):
+    reader = pa_csv.open_csv(source, read_options=pa_csv.ReadOptions(skip_rows=config["skip_rows"], encoding=config["encoding"]),
+                             parse_options=pa_csv.ParseOptions(delimiter=config["delimiter"]))
+    arrow_names = reader.schema.names
+    reader.close()
+    if hasattr(source, "seek"):
+        source.seek(0)
+    expected = ["" if name.startswith("Unnamed: ") else name for name in names]
+    if arrow_names != expected or len(set(arrow_names)) != len(arrow_names):
+        logging.info("Reading the CSV with pandas: pyarrow does not see the same header")
+        return False
+    return True
+
+# pyarrow's streaming reader: blocks of CSV_BLOCK_BYTES are parsed (in parallel) and
+# regrouped into chunks of chunk_rows() rows
+def read_csv_arrow(pa_csv, source, config, used, skip_records, chunk_rows):
+    import pyarrow as pa
+    reader = pa_csv.open_csv(
+        source,
+        read_options=pa_csv.ReadOptions(skip_rows=config["skip_rows"], skip_rows_after_names=skip_records,
+                                        encoding=config["encoding"], block_size=CSV_BLOCK_BYTES),
+        parse_options=pa_csv.ParseOptions(delimiter=config["delimiter"]),
+        convert_options=pa_csv.ConvertOptions(include_columns=used, column_types={name: pa.string() for name in used},
+                                              null_values=sorted(EXCEL_NA_VALUES), strings_can_be_null=True))
+    batches, rows = [], 0
+    for batch in reader:
+        batches.append(batch)
+        rows += batch.num_rows
+        while rows and rows >= chunk_rows():
+            table = pa.Table.from_batches(batches)
+            size = chunk_rows()
+            yield table.slice(0, size).to_pandas()
+            batches = table.slice(size).to_batches()
+            rows -= size
+            del table
+    if rows:
+        yield pa.Table.from_batches(batches).to_pandas()
+
+# read_csv in iterator mode, one get_chunk(chunk_rows()) at a time
+def read_csv_pandas(source, config, used, skip_records, chunk_rows):
+    with pd.read_csv(source, sep=config["delimiter"], encoding=config["encoding"], skiprows=config["skip_rows"],
+                     usecols=used, dtype=str, iterator=True) as reader:
+        # Rows already committed are parsed and dropped (skiprows counts lines, not rows)
+        while skip_records > 0:
+            try:
+                skip_records -= len(reader.get_chunk(min(skip_records, CSV_CHUNK_ROWS)))
+            except StopIteration:
+                return
+        while True:
+            try:
+                df = reader.get_chunk(chunk_rows())
+            except StopIteration:
+                return
+            yield df.reset_index(drop=True)
+
+# Rows per chunk of a JSON source (without --max-memory), and characters read at a time
+# from a JSON document
+JSON_CHUNK_ROWS = 65536
+JSON_READ_CHARS = 1 << 20
+
+JSON_PATH_STEP = re.compile(r'\.?([^.\[\]"]+)|\[(\d+)\]|\["([^"]*)"\]')
+
+# Column path of a JSON record -> list of keys and list indexes:
+# "Amt.InstdAmt.value" -> ["Amt", "InstdAmt", "value"], "lines[0].amount" -> ["lines", 0, "amount"],
+# '["a.b"]' for keys with dots
+def compile_json_path(path):
+    steps, position = [], 0
+    path = path.strip()
+    while position < len(path):
+        match = JSON_PATH_STEP.match(path, position)
+        # keys start with "." except the first one
+        if not match or (match.group(1) is not None and match.group(0).startswith(".") != (position > 0)):
+            raise ValueError(f"Invalid JSON path '{path}' at position {position}")
+        key, index, quoted = match.groups()
+        steps.append(int(index) if index is not None else key if key is not None else quoted)
+        position = match.end()
+    if not steps:
+        raise ValueError("Empty JSON path")
+    return steps
+
+# Value at the path of a record, or None when a key or index is missing
+def json_lookup(record, steps):
+    value = record
+    for step in steps:
+        if type(step) is str:
+            if not isinstance(value, dict):
+                return None
+            value = value.get(step)
+        elif isinstance(value, list) and step < len(value):
+            value = value[step]
+        else:
+            return None
+    return value
+
+# Text of a JSON value for a text column: objects, lists and booleans as JSON, 12.0 -> "12"
+def json_text(value):
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list, bool)):
+        return json.dumps(value, ensure_ascii=False)
+    return stringify_value(value)
+
+# Records of an NDJSON file, one JSON value per non-blank line
+def iter_ndjson_records(text):
+    loads = json.loads
+    for number, line in enumerate(text, 1):
+        if line.strip():
+            try:
+                yield loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid JSON on line {number}: {e.msg}"
+                                 + (" (for a JSON document, set <records_path>)" if number == 1 else ""))
+
+# Records of a JSON array, decoded one at a time from a buffer of JSON_READ_CHARS characters,
+# so only the current record is in memory. steps: keys (and indexes) from the top of the
+# document to the array; the values passed on the way are decoded whole and dropped.
+def iter_json_array_records(text, steps):
+    decoder = json.JSONDecoder()
+    buffer, position, eof = "", 0, False
+
+    def fill():
+        nonlocal buffer, position, eof
+        chunk = text.read(JSON_READ_CHARS)
+        eof = not chunk
+        buffer, position = buffer[position:] + chunk, 0
+
+    def next_char():
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n":
+                position += 1
+            if position < len(buffer) or eof:
+                return buffer[position] if position < len(buffer) else ""
+            fill()
+
+    def expect(chars):
+        nonlocal position
+        char = next_char()
+        if not char or char not in chars:
+            raise ValueError(f"Invalid JSON: expected {' or '.join(repr(c) for c in chars)}, found {char or 'end of file'!r}")
+        position += 1
+        return char
+
+    # A value cut at the end of the buffer may still decode ("12" of "1234"), so a value
+    # that ends there is decoded again with more text
+    def decode():
+        nonlocal position
+        next_char()
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+                if end < len(buffer) or eof:
+                    position = end
+                    return value
+            except json.JSONDecodeError as e:
+                if eof:
+                    raise ValueError(f"Invalid JSON: {e.msg}")
+            fill()
+
+    for step in steps:
+        if type(step) is int:
+            expect("[")
+            for _ in range(step):
+                decode()
+                expect(",")
+            continue
+        expect("{")
+        while True:
+            if next_char() == "}":
+                raise ValueError(f"Key '{step}' of <records_path> not found")
+            key = decode()
+            expect(":")
+            if key == step:
+                break
+            decode()
+            expect(",}")
+    expect("[")
+    if next_char() == "]":
+        return
+    while True:
+        yield decode()
+        if expect(",]") == "]":
+            return
+
+# "ndjson" or "array" for <format>auto</format>: a document that starts with "[" is an
+# array, one that starts with "{" is NDJSON unless <records_path> points into it
+def json_format(config, head):
+    if config.get("json_format", "auto") != "auto":
+        return config["json_format"]
+    return "array" if head == b"[" or config.get("records_path") else "ndjson"
+
+# Stream the records of a JSON array or NDJSON file in chunks; the file is never read whole.
+# Each column takes the value at its `path` in the record. Numbers of numeric columns are
+# kept as numbers, everything else is text for the cast stage, as with XML.
+# source: path or binary file object (default: config["file_path"]); skip_records: records
+# already committed (--resume); budget: a MemoryBudget whose chunk_rows replaces chunk_size.
+def iter_json_chunks(config, chunk_size=JSON_CHUNK_ROWS, source=None, skip_records=0, budget=None):
+    source = source or config["file_path"]
+    if isinstance(source, str) and not os.path.exists(source):
+        raise FileNotFoundError(f"File not found: {source}")
+    opened = isinstance(source, str)
+    stream = open(source, "rb") if opened else source
+    if not hasattr(stream, "peek"):
+        stream = io.BufferedReader(stream)
+    layout = json_format(config, stream.peek(64).lstrip(b"\xef\xbb\xbf \t\r\n")[:1])
+    # JSON is UTF-8 (RFC 8259); utf-8-sig also accepts a BOM
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="" if layout == "array" else None)
+    if layout == "array":
+        steps = compile_json_path(config["records_path"]) if config.get("records_path") else []
+        records = iter_json_array_records(text, steps)
+    else:
+        records = iter_ndjson_records(text)
+    records = itertools.islice(records, skip_records, None)
+
+    columns = [col for col in config["columns"] if col.get("path")]
+    paths = [compile_json_path(col["path"]) for col in columns]
+    text_columns = [not is_numeric_column(col) or bool(col.get("lookup")) for col in columns]
+    defaults = [col.get("default") for col in columns]
+    missing = [0] * len(columns)
+    chunk_rows = lambda: budget.chunk_rows if budget is not None else chunk_size
+    buffers = ColumnBuffers(columns, chunk_rows())
+    chunks_yielded = 0
+
+    # Records are dicts, which the cyclic GC keeps rescanning; paused while decoding only
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for record in records:
+            row = []
+            for i, steps in enumerate(paths):
+                value = json_lookup(record, steps)
+                if value is None:
+                    missing[i] += 1
+                elif type(value) is str:
+                    value = value.strip()
+                elif text_columns[i] or isinstance(value, (dict, list)):
+                    value = json_text(value)
+                if value is None or value == "":
+                    value = defaults[i]
+                row.append(value)
+            buffers.append_row(row)
+            if buffers.size >= chunk_rows():
+                if gc_enabled:
+                    gc.enable()
+                yield buffers.to_frame()
+                gc.disable()
+                chunks_yielded += 1
+                buffers = ColumnBuffers(columns, chunk_rows())
+    finally:
+        if gc_enabled:
+            gc.enable()
+        # A file object of a compressed source is closed by its owner
+        if opened:
+            text.close()
+        else:
+            text.detach()
+
+    for col, count in zip(columns, missing):
+        if count:
+            logging.warning(f"Path '{col['path']}' not found in {count} records for column '{col['name']}'")
+    if buffers.size or not chunks_yielded:
+        yield buffers.to_frame()
+
+# Turn "ns:Tag" into the "{uri}Tag" form used by ElementTree
+def qualify_tag(tag, namespace_uri):
+    tag = tag.strip()
+    if tag.startswith("ns:"):
+        return f"{{{namespace_uri}}}{tag[3:]}"
+    return tag
+
+# XML backends. iter_events() streams ("start"/"end", element) for the record and scope
+# tags only, and drops each record from the tree once the caller is done with it;
+# compile() turns a column XPath into a function that returns the matched node (or None)
+class ElementTreeBackend:
+    name = "etree"
+
+    def iter_events(self, source, tags):
+        stack = []
+        for event, elem in ET.iterparse(source, events=("start", "end")):
+            if event == "start":
+                stack.append(elem)
+                if elem.tag in tags:
+                    yield event, elem
+                continue
+            stack.pop()
+            if elem.tag in tags:
+                yield event, elem
+                if stack:
+                    stack[-1].remove(elem)
+
+    def pull_parser(self, events):
+        return ET.XMLPullParser(events=events)
+
+    # ElementTree only supports its XPath subset, interpreted on every find()
+    def compile(self, xpath, namespace):
+        return lambda elem: elem.find(xpath, namespace)
+
+# lxml is optional, and only imported when an XML file is read
+def import_lxml():
+    try:
+        from lxml import etree
+    except ImportError:
+        return None
+    return etree
+
+class LxmlBackend:
+    name = "lxml"
+
+    def __init__(self, etree):
+        self.etree = etree
+
+    # lxml filters the tags in C, so other elements never reach Python
+    def iter_events(self, source, tags):
+        for event, elem in self.etree.iterparse(source, events=("start", "end"), tag=list(tags)):
+            yield event, elem
+            if event == "end":
+                parent = elem.getparent()
+                if parent is not None:
+                    parent.remove(elem)
+
+    def pull_parser(self, events):
+        return self.etree.XMLPullParser(events=events)
+
+    # Full XPath 1.0, compiled once with the config namespace bound
+    def compile(self, xpath, namespace):
+        compiled = self.etree.XPath(xpath, namespaces=namespace)
+
+        def find(elem):
+            result = compiled(elem)
+            if isinstance(result, list):
+                return result[0] if result else None
+            return result
+        return find
+
+# Backend from <xml><backend>: "lxml", "etree" or "auto" (lxml when installed)
+def get_xml_backend(name="auto"):
+    name = (name or "auto").lower()
+    lxml_etree = import_lxml() if name in ("lxml", "auto") else None
+    if name == "lxml" and lxml_etree is None:
+        raise ValueError("XML backend 'lxml' requested but lxml is not installed")
+    if lxml_etree is not None:
+        return LxmlBackend(lxml_etree)
+    if name not in ("etree", "auto"):
+        raise ValueError(f"Unknown XML backend: {name}")
+    return ElementTreeBackend()
+
+# Compile every column XPath of the config once; returns {column name: finder}
+def compile_xml_columns(config, backend):
     namespace = {"ns": config["namespace"]}
-    # Get each record 
-    data = []
-    for item in root.findall(config["root_path"], namespace):
-        row = {}
-        for col in config["columns"]:
-            value = None
+    finders = {}
+    for col in config["columns"]:
+        if col.get("xpath"):
             try:
-                elem = item.find(col["xpath"], namespace)
-                if elem is not None:
-                    value = elem.attrib.get(col["attribute"]) if col["attribute"] else elem.text
-                else:
-                    logging.warning(f"XPath '{col['xpath']}' not found for column '{col['name']}' in current item.")
+                finders[col["name"]] = backend.compile(col["xpath"], namespace)
             except Exception as e:
-                logging.warning(f"Error while processing XPath '{col['xpath']}' for column '{col['name']}': {e}")
+                raise ValueError(f"Invalid XPath '{col['xpath']}' for column '{col['name']}': {e}")
+    return finders
+
+# Read one column value from an element (record or ancestor)
+def extract_value(elem, col, finder):
+    value = None
+    try:
+        found = finder(elem)
+        if isinstance(found, str):
+            value = str(found)
+        elif found is not None:
+            value = found.attrib.get(col["attribute"]) if col["attribute"] else found.text
+        else:
+            logging.warning(f"XPath '{col['xpath']}' not found for column '{col['name']}' in current item.")
+    except Exception as e:
+        logging.warning(f"Error while processing XPath '{col['xpath']}' for column '{col['name']}': {e}")
+
+    if value is None or value == "":
+        value = col.get("default", None)
+    return value.strip() if isinstance(value, str) else value
 
-            if value is None or value == "":
-                value = col.get("default", None)
+# Rows per chunk when the XML reader is asked for chunks
+XML_CHUNK_ROWS = 65536
 
-            row[col["name"]] = value.strip() if isinstance(value, str) else value
+# Numeric columns are buffered as floats, the rest as text
+def is_numeric_column(col):
+    col_type = col["type"].upper()
+    return "DECIMAL" in col_type or "INT" in col_type
 
-        data.append(row)
-     # Return a DataFrame with all the data
-    return pd.DataFrame(data)
+def to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+# Per-column buffers filled while reading records: pre-sized float arrays for numeric
+# columns and lists for text, turned into a DataFrame without building rows
+class ColumnBuffers:
+    def __init__(self, columns, capacity=XML_CHUNK_ROWS):
+        self.columns = columns
+        # Columns with a locale are parsed later by the cast stage, lookup columns hold the key
+        self.numeric = [is_numeric_column(col) and not col.get("decimal_sep") and not col.get("lookup") for col in columns]
+        self.size = 0
+        self.capacity = capacity
+        self.values = [np.empty(capacity, dtype="float64") if numeric else [] for numeric in self.numeric]
+
+    def append_row(self, row_values):
+        if self.size == self.capacity:
+            self.capacity *= 2
+            self.values = [np.resize(buf, self.capacity) if numeric else buf for buf, numeric in zip(self.values, self.numeric)]
+        for buf, numeric, value in zip(self.values, self.numeric, row_values):
+            if numeric:
+                buf[self.size] = to_float(value)
+            else:
+                buf.append(value)
+        self.size += 1
+
+    def to_frame(self):
+        data = {}
+        for col, buf, numeric in zip(self.columns, self.values, self.numeric):
+            data[col["name"]] = buf[:self.size] if numeric else buf
+        return pd.DataFrame(data, columns=[col["name"] for col in self.columns], copy=False)
+
+ # Read the XML file in chunks of chunk_size records (chunk_size=None gives one chunk)
+ # Streams the file once: columns with a "scope" (e.g. scope="ns:PmtInf") are read from that
+ # ancestor when its first record starts, and the same values are copied to all its records.
+ # source can be a path or file object (default: config["file_path"]); context holds scope
+ # values captured elsewhere, for fragments that do not contain the ancestors
+# skip_records: records at the start that are only parsed, not extracted (--resume)
+# budget: a MemoryBudget (--max-memory) whose chunk_rows replaces chunk_size, read again
+# before each chunk
+# compiled: (backend, finders) from get_xml_backend/compile_xml_columns, to reuse them
+# across calls (the workers of xml_parallel)
+def iter_xml_chunks(config, chunk_size=XML_CHUNK_ROWS, source=None, context=None, skip_records=0, budget=None, compiled=None):
+    if budget is not None:
+        chunk_size = budget.chunk_rows
+    if compiled is None:
+        backend = get_xml_backend(config.get("xml_backend"))
+        compiled = (backend, compile_xml_columns(config, backend))
+    backend, finders = compiled
+    record_tag = qualify_tag(config["root_path"].split("/")[-1], config["namespace"])
+    columns = [col for col in config["columns"] if col.get("xpath")]
+    scoped_columns = {}
+    for col in columns:
+        if col.get("scope"):
+            scoped_columns.setdefault(qualify_tag(col["scope"], config["namespace"]), []).append(col)
+
+    # Open scope ancestors, and the values already captured for each of them
+    open_scopes = []
+    captured = {}
+    inherited = dict(context or {})
+    buffers = ColumnBuffers(columns, chunk_size or XML_CHUNK_ROWS)
+    chunks_yielded = 0
+
+    # The parser creates and frees millions of short-lived elements; with the cyclic GC on,
+    # it keeps rescanning the growing buffers for nothing. Paused while parsing only.
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        tags = {record_tag, *scoped_columns}
+        for event, elem in backend.iter_events(source or config["file_path"], tags):
+            if elem.tag != record_tag:
+                if event == "start":
+                    open_scopes.append(elem)
+                else:
+                    open_scopes.pop()
+                continue
+
+            if skip_records:
+                if event == "end":
+                    skip_records -= 1
+                continue
+
+            if event == "start":
+                if scoped_columns:
+                    inherited = dict(context or {})
+                    for ancestor in open_scopes:
+                        if ancestor not in captured:
+                            captured[ancestor] = {col["name"]: extract_value(ancestor, col, finders[col["name"]]) for col in scoped_columns[ancestor.tag]}
+                        inherited.update(captured[ancestor])
+                continue
+
+            # Get each record (the backend drops it afterwards so memory stays flat)
+            buffers.append_row([
+                inherited.get(col["name"], col.get("default", None)) if col.get("scope") else extract_value(elem, col, finders[col["name"]])
+                for col in columns
+            ])
+            if chunk_size and buffers.size >= chunk_size:
+                if gc_enabled:
+                    gc.enable()
+                yield buffers.to_frame()
+                gc.disable()
+                chunks_yielded += 1
+                if budget is not None:
+                    chunk_size = budget.chunk_rows
+                buffers = ColumnBuffers(columns, chunk_size)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    if buffers.size or not chunks_yielded:
+        yield buffers.to_frame()
+
+ # Read the XML file
+def parse_xml_to_dataframe(config, skip_records=0, source=None):
+    # Return a DataFrame with all the data
+    return next(iter_xml_chunks(config, chunk_size=None, source=source, skip_records=skip_records))
  
+def is_date_column(col):
+    return "DATE" in col["type"].upper()
+
+# Text version of one native cell value, as dtype=str would give (12.0 -> "12")
+def stringify_value(value):
+    if isinstance(value, str) or pd.isna(value):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+# Text version of a column read with native types
+def stringify_column(series):
+    if pd.api.types.is_float_dtype(series.dtype):
+        non_null = series.dropna()
+        if (non_null == non_null.round()).all():
+            return series.astype("Int64").astype(str).where(series.notna(), np.nan).astype(object)
+    if pd.api.types.is_float_dtype(series.dtype) or pd.api.types.is_datetime64_any_dtype(series.dtype):
+        series = series.astype(object)
+    if series.dtype == object:
+        return series.map(stringify_value)
+    return series.astype(str).where(series.notna(), np.nan).astype(object)
+
+# Typed mode: only the text columns of the config are turned into strings
+def stringify_text_columns(df, config):
+    for col in config["columns"]:
+        col_name = col["name"]
+        if col_name in df.columns and not (is_numeric_column(col) or is_date_column(col)):
+            df[col_name] = stringify_column(df[col_name])
+    return df
+
+# Distinct date strings kept per column before the cache is reset
+DATE_CACHE_MAX = 100000
+
+# Parse a date column once per distinct value, with the column's "format" when given
+# (e.g. format="%d/%m/%Y"). Parsed values are cached on the column, so later chunks and
+# files only parse dates not seen before
+def parse_dates(series, col):
+    cache = col.setdefault("_date_cache", {})
+    if len(cache) > DATE_CACHE_MAX:
+        cache.clear()
+    codes, uniques = pd.factorize(series)
+    new_values = [value for value in uniques if value not in cache]
+    if new_values:
+        parsed = pd.to_datetime(pd.Series(new_values, dtype=object), format=col.get("format"), errors="coerce")
+        cache.update(zip(new_values, parsed))
+    parsed_uniques = pd.DatetimeIndex([cache[value] for value in uniques], dtype="datetime64[ns]").values
+    result = parsed_uniques[codes] if len(uniques) else np.full(len(codes), np.datetime64("NaT"), dtype="datetime64[ns]")
+    result[codes == -1] = np.datetime64("NaT")
+    return pd.Series(result, index=series.index)
+
+# Distinct values of a date column that is not all dates: values that already are dates
+# (typed Excel cells) are kept, only the text goes through parse_dates and the column format
+def dates_from_uniques(uniques, col):
+    values = pd.Series(uniques, dtype=object)
+    is_date = values.map(lambda value: isinstance(value, (datetime, np.datetime64))).to_numpy(dtype=bool)
+    result = np.full(len(values), np.datetime64("NaT"), dtype="datetime64[ns]")
+    if is_date.any():
+        result[is_date] = pd.to_datetime(values[is_date].tolist()).values
+    if not is_date.all():
+        result[~is_date] = parse_dates(clean_text(values[~is_date]), col).to_numpy()
+    return result
+
+# Default for a date column: "now", a date in the column format, or nothing (NULL)
+def date_default(col):
+    default_value = col.get("default")
+    if not default_value:
+        return None
+    if default_value.lower() == "now":
+        return pd.Timestamp.now()
+    return pd.to_datetime(default_value, format=col.get("format"))
+
  # Prepare the data for insertion into the database
+ # Most columns repeat a few values (currency, company, project, amounts...), so each column
+ # is factorized once: cleanup, conversion and defaults run on the distinct values only and
+ # the results are mapped back through the codes. Missing cells get the column default.
 def clean_and_cast_dataframe(df, config):
     for col in config["columns"]:
         col_name = col["name"]
+        if col_name not in df.columns:
+            continue
+        series = df[col_name]
+        col_type = col["type"].upper()
         default_value = col.get("default")
-        
-        if col_name in df.columns and df[col_name].dtype == object:
-            df[col_name] = df[col_name].astype(str).apply(lambda x: ' '.join(x.split()))
-
-         # If decimal, convert to numbers
-        if "DECIMAL" in col["type"].upper():
-            df[col_name] = pd.to_numeric(df[col_name], errors="coerce")
-            default_value = float(default_value) if default_value is not None else 0.00
-            df[col_name] = df[col_name].fillna(default_value)
-
-         # If integer, convert
-        elif "INT" in col["type"].upper():
-            df[col_name] = pd.to_numeric(df[col_name], errors="coerce", downcast="integer")
-            default_value = int(default_value) if default_value is not None else 0
-            df[col_name] = df[col_name].fillna(default_value)
-
-         
-        elif "DATE" in col["type"].upper():
-            df[col_name] = pd.to_datetime(df[col_name], errors="coerce")
-            df[col_name] = df[col_name].fillna(pd.Timestamp.now())
+
+         # If decimal or integer, convert to numbers (columns read as numbers are kept as they are)
+        if "DECIMAL" in col_type or "INT" in col_type:
+            is_decimal = "DECIMAL" in col_type
+            if default_value is None:
+                default_value = 0.00 if is_decimal else 0
+            else:
+                default_value = float(default_value) if is_decimal else int(default_value)
+            if pd.api.types.is_numeric_dtype(series):
+                values = series.fillna(default_value)
+            else:
+                numeric_dtype = "float64" if is_decimal else None
+                values = cast_by_uniques(series, lambda uniques: to_numbers(uniques, col).fillna(default_value).to_numpy(dtype=numeric_dtype), default_value)
+            if not is_decimal:
+                values = pd.to_numeric(values, downcast="integer")
+            df[col_name] = values
+
+        elif "DATE" in col_type:
+            default_value = date_default(col)
+            if pd.api.types.is_datetime64_any_dtype(series):
+                values = series
+            else:
+                values = cast_by_uniques(series, lambda uniques: dates_from_uniques(uniques, col), np.datetime64("NaT"))
+            if default_value is not None:
+                values = values.fillna(default_value)
+            df[col_name] = values
 
          # If text, ensure all are strings
         else:
             default_value = str(default_value) if default_value is not None else "N/A"
-            df[col_name] = df[col_name].fillna(default_value).astype(str)
+            df[col_name] = cast_by_uniques(series, lambda uniques: clean_text(uniques).to_numpy(dtype=object), default_value)
 
     return df
 
-# Connect and create the table if it doesn't exist
-def import_to_sql(df, config):
-    conn = connect_to_sql(config)
-    create_table_if_not_exists(config, conn)
-    cursor = conn.cursor()
+# Convert the distinct values of a numeric column, using its locale separators if any
+def to_numbers(uniques, col):
+    if not col.get("decimal_sep"):
+        return pd.to_numeric(clean_text(uniques), errors="coerce")
+    values = pd.Series(uniques, dtype=object)
+    is_text = values.map(type) == str
+    numbers = pd.to_numeric(values.where(~is_text), errors="coerce")
+    numbers[is_text] = parse_localized_numbers(values[is_text], col["decimal_sep"], col["thousands_sep"])
+    return numbers
+
+# Rows per block in parse_localized_numbers (bounds the size of the character matrices)
+NUMBER_BLOCK_ROWS = 65536
+POWERS_OF_10 = tuple(10 ** exponent for exponent in range(19))
+
+CURRENCY_SYMBOLS = "€$£¥"
+SPACE_CHARS = " \t\u00a0\u202f"
+
+# Vectorized parse of amounts like "1.234,56", "€ 12,50" or "(1 234,56)". The strings become a
+# matrix of character codes: digits build an exact integer mantissa, the digits after the
+# decimal separator give the power of 10 to divide by, and the thousands separators are
+# skipped. "-" or "(" makes the amount negative. Text that is not an amount ("N/A 2024",
+# "12/03/2024", "1e5", "12-3", "12.5" with decimal_sep ",") is NaN, so the column default applies.
+def parse_localized_numbers(text, decimal_sep, thousands_sep):
+    text = pd.Series(text, dtype=object)
+    chars = text.to_numpy(dtype=str)
+    values = np.empty(len(chars), dtype="float64")
+    for start in range(0, len(chars), NUMBER_BLOCK_ROWS):
+        values[start:start + NUMBER_BLOCK_ROWS] = parse_number_block(chars[start:start + NUMBER_BLOCK_ROWS], decimal_sep, thousands_sep)
+
+    # Beyond 15 digits the mantissa is not exact as a float: parse those few with string ops
+    too_long = np.isinf(values)
+    if too_long.any():
+        long_text = text[too_long].astype(str)
+        negative = long_text.str.contains(r"[-(]", regex=True).to_numpy()
+        long_text = long_text.str.replace(r"[^0-9" + re.escape(decimal_sep) + "]", "", regex=True).str.replace(decimal_sep, ".", regex=False)
+        long_values = pd.to_numeric(long_text, errors="coerce").to_numpy()
+        values[too_long] = np.where(negative, -long_values, long_values)
+    return pd.Series(values, index=text.index)
+
+# Cells of a code matrix that are one of `chars` (np.isin is slower for a few codes)
+def is_any_char(codes, chars):
+    found = np.zeros(codes.shape, dtype=bool)
+    for char in chars:
+        found |= codes == ord(char)
+    return found
+
+def parse_number_block(chars, decimal_sep, thousands_sep):
+    powers = np.array(POWERS_OF_10, dtype=np.int64)
+    codes = chars.view(np.uint32).reshape(len(chars), -1)
+    if codes.shape[1] == 0:
+        return np.full(len(chars), np.nan)
+    is_digit = (codes >= 48) & (codes <= 57)
+    is_decimal = codes == ord(decimal_sep)
+    digit_position = np.cumsum(is_digit, axis=1, dtype=np.int16)
+    digit_count = digit_position[:, -1].astype(np.int64)
+    fraction_digits = (is_digit & (np.cumsum(is_decimal, axis=1) > 0)).sum(axis=1)
+    digits_to_the_right = np.minimum(digit_count[:, None] - digit_position, 18)
+    mantissa = (np.where(is_digit, codes - 48, 0) * powers[digits_to_the_right]).sum(axis=1)
+    values = mantissa / powers[np.minimum(fraction_digits, 18)]
+    values = np.where(((codes == ord("-")) | (codes == ord("("))).any(axis=1), -values, values)
+    values[~valid_number_block(codes, is_digit, is_decimal, digit_position, digit_count - fraction_digits, thousands_sep)] = np.nan
+    values[(digit_count > 15) & ~np.isnan(values)] = np.inf
+    return values
+
+# Rows of a code matrix that are one amount: between the first and the last digit or decimal
+# separator only digits, one decimal separator and thousands separators (in groups of 3 digits
+# after a first group of 1-3, none after the decimal separator); around it only spaces,
+# currency symbols and one leading or trailing sign or one pair of parentheses. Cells are
+# padded with code 0. Row reductions dominate the cost, so the cell checks are reduced once
+# and the four counts are packed into one sum (base: the row width + 1).
+def valid_number_block(codes, is_digit, is_decimal, digit_position, integer_digits, thousands_sep):
+    width = codes.shape[1]
+    columns = np.arange(width)
+    is_space = is_any_char(codes, SPACE_CHARS)
+    if not thousands_sep:
+        is_thousands = np.zeros_like(is_digit)
+    elif thousands_sep.isspace():
+        # A space separator also matches the non-breaking spaces Excel exports
+        is_thousands = is_space
+    else:
+        is_thousands = codes == ord(thousands_sep)
+    is_sign = (codes == ord("-")) | (codes == ord("+"))
+    is_open, is_close = codes == ord("("), codes == ord(")")
+
+    in_number = is_digit | is_decimal
+    first = np.argmax(in_number, axis=1)[:, None]
+    last = width - 1 - np.argmax(in_number[:, ::-1], axis=1)[:, None]
+    inside = (columns >= first) & (columns <= last)
+    around = is_space | is_sign | is_open | is_close | is_any_char(codes, CURRENCY_SYMBOLS) | (codes == 0)
+    bad_cell = np.where(inside, ~(in_number | is_thousands), ~around) | (is_open & (columns > last)) | (is_close & (columns < first))
+    base = width + 1
+    count_type = np.int32 if base ** 4 < 2 ** 31 else np.int64
+    counts = (is_sign.astype(count_type) + is_open * base + is_close * base ** 2 + is_decimal * base ** 3).sum(axis=1, dtype=count_type)
+    signs, opens, closes, decimals = counts % base, counts // base % base, counts // base ** 2 % base, counts // base ** 3
+    valid = (~bad_cell.any(axis=1) & (digit_position[:, -1] > 0) & (decimals <= 1) & (signs <= 1) & (opens <= 1)
+             & (opens == closes) & ((signs == 0) | (opens == 0)))
+
+    # Thousands grouping, from the digits before each separator: 1-3 for the first, 3 more for
+    # each next one and 3 more up to the decimal separator (a separator after it fails this)
+    rows, cols = np.nonzero(is_thousands & inside)
+    if len(rows):
+        before = digit_position[rows, cols].astype(np.int64)
+        first_in_row = np.append(True, rows[1:] != rows[:-1])
+        last_in_row = np.append(rows[1:] != rows[:-1], True)
+        previous = np.append(0, before[:-1])
+        bad = np.where(first_in_row, (before < 1) | (before > 3), before - previous != 3)
+        bad |= last_in_row & (integer_digits[rows] - before != 3)
+        valid[rows[bad]] = False
+    return valid
+
+# Collapse repeated/leading/trailing whitespace in the distinct values of a column
+def clean_text(uniques):
+    return pd.Series([" ".join(str(value).split()) for value in uniques], dtype=object)
+
+# Apply convert() to the distinct values of a series and map the results back to every row
+def cast_by_uniques(series, convert, missing_value):
+    codes, uniques = pd.factorize(series)
+    if not len(uniques):
+        return pd.Series([missing_value] * len(series), index=series.index).infer_objects()
+    converted = convert(uniques)
+    # Code -1 (missing) picks the extra last slot, which holds missing_value
+    lookup = np.empty(len(converted) + 1, dtype=converted.dtype)
+    lookup[:-1] = converted
+    lookup[-1] = missing_value
+    return pd.Series(lookup[codes], index=series.index)
 
-     # Prepare the command
-    placeholders = ', '.join(['?'] * len(df.columns))
-    sql = f"INSERT INTO {config['table_name']} ({', '.join(df.columns)}) VALUES ({placeholders})"
+# Source rows done once the first `committed` rows of df are committed. Rows taken out before
+# the writer (rejects) leave gaps in the index, which counts the rows from the start of df.
+def consumed_rows(df, committed):
+    return int(df.index[committed - 1]) + 1 if committed else 0
 
-    # Insert data row by row
-    success = 0
-    for idx, row in df.iterrows():
+# Connect and create the table if it doesn't exist. `connect` opens one connection
+# (default: connect_to_sql); with config["writers"] > 1 the rows are split over that many.
+# Returns the run metrics (rows inserted, time and the batch sizes the writer chose).
+# on_commit(rows) is called after each commit with the number of rows committed so far.
+def import_to_sql(df, config, connect=None, on_commit=None):
+    from sql_writer import BatchController, parallel_insert, sequential_insert
+    connect = connect or (lambda: connect_to_sql(config))
+    start = time.perf_counter()
+    conn = connect()
+    create_table_if_not_exists(config, conn)
+
+    if config.get("writers", 1) > 1:
+        conn.close()
+        success, writer_metrics = parallel_insert(df, config["table_name"], connect, config["writers"],
+                                                  atomic=config.get("atomic", False), batching=config.get("batching"),
+                                                  on_commit=on_commit)
+    else:
+        controller = BatchController(**config.get("batching", {}))
         try:
-            cursor.execute(sql, tuple(row))
-            success += 1
-        except Exception as e:
-            logging.warning(f"Error on row {idx + 1}: {e}")
-            conn.rollback()
-    conn.commit()
-    cursor.close()
-    conn.close()
-    logging.info(f"{success}/{len(df)} rows inserted into '{config['table_name']}'")
+            success = sequential_insert(conn, df, config["table_name"], controller, on_commit=on_commit)
+        finally:
+            conn.close()
+        writer_metrics = [controller.metrics()]
+        logging.info(f"{success}/{len(df)} rows inserted into '{config['table_name']}'")
 
-# If Excel, read the data
-def process_config(config):
-    if config["type"] == "excel":
-        logging.info(f" Processing Excel file: {os.path.basename(config['excel_file'])}")
-        df = read_excel_with_fallback(config)
-
-         # Map the columns to the names defined in the XML
-        selected_columns = {}
-        for col in config["columns"]:
-            found_col = find_column(df, col["source_name"])
-            if found_col:
-                selected_columns[col["name"]] = found_col
-            else:
-                logging.warning(f"Column '{col['source_name']}' not found. Using default.")
+    metrics = {"table": config["table_name"], "rows": len(df), "inserted": success,
+               "seconds": round(time.perf_counter() - start, 3), "writers": writer_metrics}
+    logging.info(f"Writer metrics: {metrics}")
+    return metrics
 
-        # Assign the correct names or default
-        for col in config["columns"]:
-            col_name = col["name"]
-            if col_name in selected_columns:
-                df[col_name] = df[selected_columns[col_name]]
+# Insert DataFrame chunks (--max-memory) over one connection, or over `writers` connections
+# per chunk. The batch controller carries over from chunk to chunk; every chunk ends with a
+# commit. on_commit(rows) gets the source rows done counted from the first chunk: a chunk
+# with rejected rows has chunk.attrs["source_rows"] rows in the source.
+def import_chunks(chunks, config, connect=None, on_commit=None):
+    from sql_writer import BatchController, parallel_insert, sequential_insert
+    connect = connect or (lambda: connect_to_sql(config))
+    start = time.perf_counter()
+    controller = BatchController(**config.get("batching", {}))
+    writer_metrics = []
+    rows = inserted = source_rows = 0
+    conn = connect()
+    try:
+        create_table_if_not_exists(config, conn)
+        for chunk in chunks:
+            report = (lambda committed, offset=source_rows, chunk=chunk: on_commit(offset + consumed_rows(chunk, committed))) if on_commit else None
+            if config.get("writers", 1) > 1:
+                success, chunk_metrics = parallel_insert(chunk, config["table_name"], connect, config["writers"],
+                                                         atomic=config.get("atomic", False), batching=config.get("batching"),
+                                                         on_commit=report)
+                writer_metrics.extend(chunk_metrics)
             else:
-                df[col_name] = col.get("default", "")
+                success = sequential_insert(conn, chunk, config["table_name"], controller, on_commit=report)
+            rows += len(chunk)
+            source_rows += chunk.attrs.get("source_rows", len(chunk))
+            inserted += success
+            del chunk, report
+    finally:
+        conn.close()
+    logging.info(f"{inserted}/{rows} rows inserted into '{config['table_name']}'")
+
+    metrics = {"table": config["table_name"], "rows": rows, "inserted": inserted,
+               "seconds": round(time.perf_counter() - start, 3), "writers": writer_metrics or [controller.metrics()]}
+    logging.info(f"Writer metrics: {metrics}")
+    return metrics
+
+# Delta mode: write only the rows that changed since the snapshot saved by the last delta
+# import of the config (see delta.py), in one transaction. The snapshot is replaced after the commit.
+def import_delta(df, config, member=None, connect=None):
+    from delta import Snapshot, apply_changes, diff_snapshots, snapshot_path
+    from sql_writer import BatchController
+    key_columns = [col["name"] for col in config["columns"] if col.get("key")]
+    if not key_columns:
+        raise ValueError('Delta imports need key columns: add key="yes" to the <column> elements that identify a row')
+    connect = connect or (lambda: connect_to_sql(config))
+    start = time.perf_counter()
+    path = snapshot_path(config, member, config.get("snapshot_dir"))
+    old = Snapshot.load(path, key_columns)
+    new = Snapshot.from_frame(df, key_columns)
+    changes = diff_snapshots(old, new)
+
+    conn = connect()
+    controller = BatchController(**config.get("batching", {}))
+    try:
+        create_table_if_not_exists(config, conn)
+        apply_changes(conn, config["table_name"], df, old, changes, controller)
+    finally:
+        conn.close()
+    new.save(path)
+
+    metrics = {"table": config["table_name"], "rows": len(df), "inserted": changes["inserted"],
+               "updated": changes["updated"], "deleted": changes["deleted"], "unchanged": changes["unchanged"],
+               "seconds": round(time.perf_counter() - start, 3), "writers": [controller.metrics()]}
+    logging.info(f"Delta of '{config['table_name']}': {changes['inserted']} inserted, {changes['updated']} updated, "
+                 f"{changes['deleted']} deleted, {changes['unchanged']} unchanged")
+    return metrics
+
+# Read the Excel sheet and keep only the config columns, under their config names
+def read_excel_mapped(config):
+    return map_columns(read_excel_with_fallback(config), config)
+
+# Keep only the config columns of a sheet, CSV or chunk of them, under their config names
+def map_columns(df, config, warn=True):
+     # Map the columns to the names defined in the XML
+    selected_columns = {}
+    for col in config["columns"]:
+        found_col = find_column(df, col["source_name"])
+        if found_col:
+            selected_columns[col["name"]] = found_col
+        elif warn:
+            logging.warning(f"Column '{col['source_name']}' not found. Using default.")
+
+    # Assign the correct names or default
+    for col in config["columns"]:
+        col_name = col["name"]
+        if col_name in selected_columns:
+            df[col_name] = df[selected_columns[col_name]]
+        else:
+            df[col_name] = col.get("default", "")
+
+    # Ensure only the defined columns are kept
+    df = df[[col["name"] for col in config["columns"] if col["name"] in df.columns]].copy()
+    if config.get("typed"):
+        df = stringify_text_columns(df, config)
+    return df
 
-        # Ensure only the defined columns are kept
-        df = df[[col["name"] for col in config["columns"] if col["name"] in df.columns]]
-        df["Data_Hora"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        df = clean_and_cast_dataframe(df, config)
-        import_to_sql(df, config)
+# Import the config source. A .gz/.bz2 file is decompressed while it is read, and each
+# matching member of a .zip is imported as its own source, in one pass over the archive.
+# connect: opens a database connection (default: connect_to_sql), as in import_to_sql.
+def process_config(config, connect=None):
+    from sources import data_suffixes, is_compressed, iter_compressed
+    if has_lookups(config) and not config.get("lookup_cache"):
+        # Reference tables are read once per run, for all the files of a zip
+        from lookups import LookupCache
+        config = {**config, "lookup_cache": LookupCache()}
+    source = config["excel_file"] if config["type"] == "excel" else config["file_path"]
+    if not is_compressed(source):
+        return process_source(config, source, connect=connect)
+
+    results = [process_source(config, source, member, stream, connect=connect)
+               for member, stream in iter_compressed(source, data_suffixes(config["type"]))]
+    if not results:
+        logging.warning(f"No {config['type']} files found in {os.path.basename(source)}")
+    return {"table": config["table_name"], "rows": sum(m["rows"] for m in results),
+            "inserted": sum(m["inserted"] for m in results), "rejected": sum(m.get("rejected", 0) for m in results),
+            "sources": results}
+
+def has_lookups(config):
+    return any(col.get("lookup") for col in config["columns"])
+
+# Row stages between the reader and the cast: lookup columns are resolved, and the rows they
+# reject are written to the reject log. first_record: position of df's index 0 in the source.
+def prepare_rows(df, config, connect, rejects, first_record):
+    if has_lookups(config):
+        from lookups import LookupCache, apply_lookups
+        cache = config.get("lookup_cache") or LookupCache()
+        df = apply_lookups(df, config, cache, connect or (lambda: connect_to_sql(config)), rejects, first_record)
+    return df
+
+# If Excel, read the data. Every commit is written to the checkpoint log; with
+# config["resume"] the rows committed by the last run on the same file are skipped.
+# member/stream: name and open file object of a data file inside a compressed source.
+def process_source(config, source, member=None, stream=None, connect=None):
+    from checkpoint import CHECKPOINT_FILE, CheckpointLog, checkpoint_key, source_fingerprint
+    checkpoints = CheckpointLog(config.get("checkpoint_file") or CHECKPOINT_FILE)
+    key = checkpoint_key(config, member)
+    fingerprint = source_fingerprint(source)
+    if config.get("resume") and config.get("delta"):
+        # A delta is one transaction: nothing to resume, and skipped rows would count as deleted
+        logging.info("Delta imports are not resumed: the whole file is compared again")
+        skip = 0
+    elif config.get("resume"):
+        skip = checkpoints.resume_offset(key, fingerprint)
+    else:
+        skip = 0
+        last = checkpoints.last(key)
+        if last and last["fingerprint"] == fingerprint and last["committed_rows"] < (last["total_rows"] or 0):
+            logging.warning(f"The last run of this config stopped after {last['committed_rows']} rows. Use --resume to continue it")
+    name = os.path.basename(source) + (f"!{member}" if member else "")
+    from rejects import RejectLog
+    rejects = RejectLog(config, name)
+    if config.get("max_memory") or config.get("dedupe") or config["type"] in ("csv", "json"):
+        return process_in_chunks(config, source, name, member, stream, skip, connect, checkpoints, key, fingerprint, rejects)
+
+    if config["type"] == "excel":
+        logging.info(f" Processing Excel file: {name}")
+        # openpyxl needs to seek, so a compressed sheet is decompressed into memory
+        df = read_excel_mapped({**config, "excel_data": stream.read()} if stream else config)
+        # The sheet is read whole; only the committed rows are dropped before the cast
+        total = len(df)
+        df = df.iloc[skip:].reset_index(drop=True)
 
      # Do the same if XML
     elif config["type"] == "xml":
-        logging.info(f"Processing XML file: {os.path.basename(config['file_path'])}")
-        df = parse_xml_to_dataframe(config)
-        df["Data_Hora"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        df = clean_and_cast_dataframe(df, config)
-        import_to_sql(df, config)
+        logging.info(f"Processing XML file: {name}")
+        if config.get("xml_workers", 1) > 1 and stream is None:
+            from xml_parallel import parse_xml_parallel
+            df = parse_xml_parallel(config, config["xml_workers"], skip_records=skip)
+        else:
+            if config.get("xml_workers", 1) > 1:
+                logging.info("Compressed XML is read by a single process (parallel mode needs a plain file)")
+            df = parse_xml_to_dataframe(config, skip_records=skip, source=stream)
+        total = skip + len(df)
+
+    if skip and df.empty:
+        logging.info(f"All {total} rows were already imported into '{config['table_name']}'")
+        return {"table": config["table_name"], "rows": 0, "inserted": 0, "skipped": skip}
+
+    df["Data_Hora"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    df = prepare_rows(df, config, connect, rejects, skip)
+    df = clean_and_cast_dataframe(df, config)
+    rejects.log_summary()
+    if config.get("delta"):
+        return {**import_delta(df, config, member, connect=connect), "rejected": rejects.count}
+    metrics = import_to_sql(df, config, connect=connect,
+                            on_commit=lambda rows: checkpoints.record(key, fingerprint, skip + consumed_rows(df, rows), total))
+    if rejects.count and len(df) and metrics["inserted"] == len(df):
+        # Rejected rows at the end of the file are done too
+        checkpoints.record(key, fingerprint, total, total)
+    metrics["skipped"] = skip
+    metrics["rejected"] = rejects.count
+    log_peak_memory(metrics)
+    return metrics
+
+# CSV and JSON sources, --max-memory and <dedupe>: the source is read, cast and written chunk by chunk. With
+# --max-memory the chunk size is set by a MemoryBudget (see memory_budget.py). Same
+# checkpoints as process_source; the total rows are only known, and recorded, at the end.
+def process_in_chunks(config, source, name, member, stream, skip, connect, checkpoints, key, fingerprint, rejects):
+    from memory_budget import MemoryBudget, frame_row_bytes, parse_size
+    budget = MemoryBudget(parse_size(config["max_memory"])) if config.get("max_memory") else None
+    in_chunks = f" (in chunks, max memory {config['max_memory']})" if budget else ""
+    labels = {"excel": " Processing Excel file", "csv": "Processing CSV file", "json": "Processing JSON file"}
+    logging.info(f"{labels.get(config['type'], 'Processing XML file')}: {name}{in_chunks}")
+    if config["type"] == "excel" and stream is not None:
+        # openpyxl needs to seek, so a compressed sheet is decompressed into memory
+        config = {**config, "excel_data": stream.read()}
+        stream = None
+    elif config["type"] == "xml" and config.get("xml_workers", 1) > 1:
+        logging.info("Read in chunks, the XML file is read by a single process")
+
+    dedupe = None
+    if config.get("dedupe"):
+        from dedupe import Deduplicator
+        dedupe = Deduplicator(config)
+
+    # stream: the open member of a compressed source, or None to read the file itself
+    def read_chunks(skip_records, stream):
+        if config["type"] == "excel":
+            return iter_excel_chunks(config, budget, skip_records)
+        if config["type"] == "csv":
+            return iter_csv_chunks(config, source=stream, skip_records=skip_records, budget=budget)
+        if config["type"] == "json":
+            return iter_json_chunks(config, source=stream, skip_records=skip_records, budget=budget)
+        return iter_xml_chunks(config, source=stream, skip_records=skip_records, budget=budget)
+
+    # First pass of the dedupe: the rows are hashed from the start of the source (lookup
+    # misses are left out here, they are written to the reject log by the import pass). A
+    # compressed member is opened again and decompressed twice, so nothing goes to disk.
+    def planned_chunks():
+        from sources import open_member
+        with open_member(source, member) if stream is not None else contextlib.nullcontext() as first_pass:
+            position = 0
+            for chunk in read_chunks(0, first_pass):
+                rows = len(chunk)
+                chunk = clean_and_cast_dataframe(prepare_rows(chunk, config, connect, None, position), config)
+                yield position, chunk
+                position += rows
+                del chunk
+                if budget:
+                    budget.chunk_done(rows)
+
+    imported_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    source_rows = 0
+
+    # The chunk is measured once the writer is done with it and the generator resumes
+    def cast_chunks():
+        nonlocal source_rows
+        for chunk in read_chunks(skip, stream):
+            rows, frame_bytes = len(chunk), frame_row_bytes(chunk) if budget else 0.0
+            chunk["Data_Hora"] = imported_at
+            chunk = prepare_rows(chunk, config, connect, rejects, skip + source_rows)
+            chunk = clean_and_cast_dataframe(chunk, config)
+            if dedupe:
+                chunk = dedupe.filter(chunk, skip + source_rows, rejects)
+            chunk.attrs["source_rows"] = rows
+            source_rows += rows
+            yield chunk
+            del chunk
+            if budget:
+                budget.chunk_done(rows, frame_bytes)
+
+    with budget or contextlib.nullcontext():
+        if dedupe and dedupe.needs_plan(skip):
+            logging.info(f"Dedupe (keep {dedupe.keep}): reading the source once to hash every row")
+            dedupe.build_plan(planned_chunks())
+        if config.get("delta"):
+            # The diff needs the whole table: only the reading and the cast are chunked
+            df = pd.concat(list(cast_chunks()), ignore_index=True)
+            metrics = import_delta(df, config, member, connect=connect)
+        else:
+            metrics = import_chunks(cast_chunks(), config, connect=connect,
+                                    on_commit=lambda rows: checkpoints.record(key, fingerprint, skip + rows))
+            if source_rows:
+                checkpoints.record(key, fingerprint, skip + source_rows, skip + source_rows)
+            elif skip:
+                logging.info(f"All {skip} rows were already imported into '{config['table_name']}'")
+            metrics["skipped"] = skip
+    metrics["rejected"] = rejects.count
+    if dedupe:
+        metrics["dedupe"] = dedupe.metrics()
+        logging.info(f"Dedupe: {dedupe.duplicates} duplicate rows left out of '{config['table_name']}' (keep {dedupe.keep})")
+    rejects.log_summary()
+    if budget:
+        metrics["memory"] = memory = budget.metrics()
+        logging.info(f"Memory: peak {memory['peak_memory_mb']} MB of {memory['max_memory_mb']} MB, {memory['chunks']} chunks of "
+                     f"{memory['chunk_rows_min']}-{memory['chunk_rows_max']} rows (~{memory['row_bytes']} bytes per row), "
+                     f"{memory['shrinks']} shrinks")
+    log_peak_memory(metrics)
+    return metrics
+
+# Highest RSS of the process so far, added to the metrics of the run
+def log_peak_memory(metrics):
+    from memory_budget import megabytes, peak_rss
+    metrics["peak_memory_mb"] = megabytes(peak_rss())
+    logging.info(f"Peak memory of the process: {metrics['peak_memory_mb']} MB")
+
 # Search for  files
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Importa dados de ficheiros Excel/XML para base de dados SQL.")
+    # The sibling modules (lookups, converter, pain001_export, xml_parallel, ...) `import novo`.
+    # Run as a script this module is __main__, so without this that import would load
+    # novo.py a second time, with its own module state
+    sys.modules.setdefault("novo", sys.modules[__name__])
+    parser = argparse.ArgumentParser(description="Importa dados de ficheiros Excel/XML/CSV/JSON para base de dados SQL.")
     parser.add_argument("config_file", help="Caminho para o ficheiro de configuração XML")
-    parser.add_argument("data_file", nargs="?", help="Caminho para o ficheiro Excel ou XML")
+    parser.add_argument("data_file", nargs="?", help="Caminho para o ficheiro Excel, XML, CSV ou JSON (também .gz, .bz2 ou .zip)")
+    parser.add_argument("--typed", action="store_true", help="Ler o Excel com os tipos nativos (números e datas) em vez de texto")
+    parser.add_argument("--xml-workers", type=int, help="Número de processos para ler um ficheiro XML grande em paralelo")
+    parser.add_argument("--writers", type=int, help="Número de ligações em paralelo para inserir na base de dados")
+    parser.add_argument("--atomic", action="store_true", help="Com várias ligações, anular tudo se uma partição falhar")
+    parser.add_argument("--resume", action="store_true", help="Continuar a importação a partir do último checkpoint")
+    parser.add_argument("--checkpoint-file", help="Ficheiro de checkpoints (por omissão import_checkpoints.jsonl)")
+    parser.add_argument("--delta", action="store_true", help="Escrever só as linhas novas, alteradas ou removidas desde a última importação")
+    parser.add_argument("--max-memory", metavar="TAMANHO",
+                        help="Limite de memória (ex.: 512MB, 2GB): ler, converter e inserir por blocos ajustados a esse limite")
+    parser.add_argument("--snapshot-dir", help="Pasta dos snapshots do modo delta (por omissão snapshots)")
+    parser.add_argument("--reject-file", help="Ficheiro das linhas rejeitadas (por omissão import_rejects.jsonl)")
+    parser.add_argument("--dedupe", choices=("first", "last", "reject"),
+                        help="Linhas repetidas no ficheiro: importar a primeira, a última, ou rejeitar todas (ver <dedupe>)")
+    parser.add_argument("--export-xml", metavar="FICHEIRO", nargs="?", const=True,
+                        help="Em vez de importar, gerar um pain.001 a partir da tabela (ou do Excel indicado); sem FICHEIRO usa <export><file_path>")
+    parser.add_argument("--convert", metavar="FICHEIRO", help="Em vez de importar, converter para .csv, .xml ou .parquet (sem base de dados)")
+    parser.add_argument("--validate", action="store_true", help="Só verificar a configuração (rápido, não lê os dados)")
+    parser.add_argument("--list-columns", action="store_true", help="Só listar as colunas da configuração")
     args = parser.parse_args()
 
     if not os.path.exists(args.config_file):
@@ -352,8 +1638,49 @@ if __name__ == "__main__":
         if args.data_file:
             if config["type"] == "excel":
                 config["excel_file"] = args.data_file
-            elif config["type"] == "xml":
+            else:
                 config["file_path"] = args.data_file
-        process_config(config)
+        if args.typed and config["type"] == "excel":
+            config["typed"] = True
+        if args.xml_workers and config["type"] == "xml":
+            config["xml_workers"] = args.xml_workers
+        if args.writers:
+            config["writers"] = args.writers
+        if args.atomic:
+            config["atomic"] = True
+        config["resume"] = args.resume
+        config["checkpoint_file"] = args.checkpoint_file
+        if args.delta:
+            config["delta"] = True
+        config["snapshot_dir"] = args.snapshot_dir
+        if args.max_memory:
+            config["max_memory"] = args.max_memory
+        if args.reject_file:
+            config["reject_file"] = args.reject_file
+        if args.dedupe:
+            config["dedupe"] = args.dedupe
+        if args.validate:
+            errors, warnings = validate_config(config)
+            for message in warnings:
+                print(f"WARNING: {message}")
+            for message in errors:
+                print(f"ERROR: {message}")
+            print(f"{args.config_file}: {len(config['columns'])} columns, table '{config['table_name']}', "
+                  f"{'invalid' if errors else 'OK'}")
+            exit(1 if errors else 0)
+        elif args.list_columns:
+            print("\n".join(describe_columns(config)))
+        elif args.convert:
+            from converter import convert_config
+            convert_config(config, args.convert)
+        elif args.export_xml:
+            from pain001_export import export_pain001
+            output = args.export_xml if isinstance(args.export_xml, str) else config.get("export_file")
+            if not output:
+                raise ValueError("No output file: use --export-xml FICHEIRO or <export><file_path>")
+            is_excel = args.data_file and os.path.splitext(args.data_file)[1].lower() in (".xlsx", ".xlsm", ".xls")
+            export_pain001(config, output, excel_file=args.data_file if is_excel else None)
+        else:
+            process_config(config)
     except Exception as e:
         logging.error(f"Erro ao processar '{args.config_file}': {e}")
@@ -0,0 +1,379 @@
+import logging
+import re
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+import numpy as np
+import pandas as pd
+
+import novo
+
+# Export mode: writes a pain.001.001.03 credit-transfer file from a table or an Excel sheet,
+# using the <columns> xpath mappings of the import configs in reverse. The XML is written
+# as text, chunk by chunk, so memory does not grow with the number of transactions.
+#
+# NbOfTxs and CtrlSum (in GrpHdr and in every PmtInf) are only known at the end: they are
+# written as fixed-width placeholders and overwritten in place when the file is closed,
+# so the output must be a regular (seekable) file.
+
+PAIN001_NAMESPACE = "urn:iso:std:iso:20022:tech:xsd:pain.001.001.03"
+
+# Rows read from the source (and rendered) at a time
+EXPORT_CHUNK_ROWS = 50000
+
+# Element paths of each section in schema order. A ".//ns:Nm" column maps to the first path
+# ending with Nm, which is also the element the import reads for that xpath.
+SECTION_PATHS = {
+    "GrpHdr": [
+        ("MsgId",), ("CreDtTm",), ("NbOfTxs",), ("CtrlSum",), ("InitgPty", "Nm"),
+        ("InitgPty", "Id", "OrgId", "Othr", "Id"), ("InitgPty", "Id", "PrvtId", "Othr", "Id"),
+    ],
+    "PmtInf": [
+        ("PmtInfId",), ("PmtMtd",), ("BtchBookg",), ("NbOfTxs",), ("CtrlSum",),
+        ("PmtTpInf", "SvcLvl", "Cd"), ("PmtTpInf", "CtgyPurp", "Cd"), ("ReqdExctnDt",),
+        ("Dbtr", "Nm"), ("Dbtr", "PstlAdr", "Ctry"), ("DbtrAcct", "Id", "IBAN"), ("DbtrAcct", "Ccy"),
+        ("DbtrAgt", "FinInstnId", "BIC"), ("ChrgBr",),
+    ],
+    "CdtTrfTxInf": [
+        ("PmtId", "InstrId"), ("PmtId", "EndToEndId"), ("Amt", "InstdAmt"), ("CdtrAgt", "FinInstnId", "BIC"),
+        ("Cdtr", "Nm"), ("Cdtr", "PstlAdr", "Ctry"), ("Cdtr", "PstlAdr", "AdrLine"),
+        ("CdtrAcct", "Id", "IBAN"), ("UltmtCdtr", "Nm"), ("Purp", "Cd"), ("RmtInf", "Ustrd"),
+    ],
+}
+
+# Values used when no column or <export> value provides them
+DEFAULT_VALUES = {
+    "PmtInf/PmtMtd": "TRF",
+    "PmtInf/PmtTpInf/SvcLvl/Cd": "SEPA",
+    "PmtInf/ChrgBr": "SLEV",
+    "CdtTrfTxInf/PmtId/EndToEndId": "NOTPROVIDED",
+    "CdtTrfTxInf/Amt/InstdAmt/@Ccy": "EUR",
+}
+
+# Fields a bank will reject the file without, warned about once
+REQUIRED_PAYMENT_FIELDS = [("Dbtr", "Nm"), ("DbtrAcct", "Id", "IBAN"), ("DbtrAgt", "FinInstnId", "BIC")]
+
+# Reserved width of the NbOfTxs and CtrlSum values
+COUNT_WIDTH = 15
+SUM_WIDTH = 20
+
+AMOUNT_PATH = ("Amt", "InstdAmt")
+
+# "./ns:Cdtr/ns:Nm" -> (False, ("Cdtr", "Nm")); ".//ns:Nm" -> (True, ("Nm",))
+def split_xpath(xpath):
+    descendant = xpath.startswith(".//")
+    steps = tuple(step.split(":")[-1] for step in xpath.lstrip("./").split("/") if step and step != ".")
+    return descendant, steps
+
+# Section and element path written for a column xpath (relative to the record or its scope)
+def resolve_path(col):
+    descendant, steps = split_xpath(col["xpath"])
+    section = col["scope"].split(":")[-1] if col.get("scope") else "CdtTrfTxInf"
+    if section in ("CstmrCdtTrfInitn", "Document") and steps and steps[0] in ("GrpHdr", "PmtInf"):
+        section, steps = steps[0], steps[1:]
+    if section not in SECTION_PATHS or not steps:
+        raise ValueError(f"Column '{col['name']}': '{col['xpath']}' can not be exported to pain.001")
+    if descendant:
+        for path in SECTION_PATHS[section]:
+            if path[-len(steps):] == steps:
+                return section, path
+        raise ValueError(f"Column '{col['name']}': no {section} element matches '{col['xpath']}'")
+    return section, steps
+
+# Sort key of a path in its section; an unknown path goes after the last known path it
+# shares a parent with, so elements with the same parent stay together
+def path_order(section, path):
+    known = SECTION_PATHS[section]
+    if path in known:
+        return (known.index(path), 0)
+    position, longest = len(known), 0
+    for index, other in enumerate(known):
+        shared = next((i for i, (a, b) in enumerate(zip(path, other)) if a != b), min(len(path), len(other)))
+        if shared and shared >= longest:
+            position, longest = index, shared
+    return (position, 1)
+
+# Nested XML for (path, text, attributes) leaves already in section order
+def render(leaves, indent):
+    lines = []
+    opened = []
+    for path, text, attrs in leaves:
+        common = 0
+        while common < len(opened) and common < len(path) - 1 and opened[common] == path[common]:
+            common += 1
+        while len(opened) > common:
+            lines.append(f"{indent}{'  ' * (len(opened) - 1)}</{opened.pop()}>")
+        for name in path[len(opened):-1]:
+            lines.append(f"{indent}{'  ' * len(opened)}<{name}>")
+            opened.append(name)
+        attributes = "".join(f' {name}="{value}"' for name, value in attrs)
+        lines.append(f"{indent}{'  ' * len(opened)}<{path[-1]}{attributes}>{text}</{path[-1]}>")
+    while opened:
+        lines.append(f"{indent}{'  ' * (len(opened) - 1)}</{opened.pop()}>")
+    return "".join(line + "\n" for line in lines)
+
+def escape_attribute(text):
+    return escape(text, {'"': "&quot;"})
+
+# Text of each cell of a column: dates as YYYY-MM-DD, 12.0 as "12", empty cells as None
+def column_texts(series):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        has_time = (series.dropna() != series.dropna().dt.normalize()).any()
+        texts = series.dt.strftime("%Y-%m-%dT%H:%M:%S" if has_time else "%Y-%m-%d")
+        return [None if pd.isna(text) else text for text in texts]
+    texts = []
+    for value in series.tolist():
+        if value is None or (not isinstance(value, str) and pd.isna(value)):
+            texts.append(None)
+        else:
+            text = novo.stringify_value(value).strip()
+            texts.append(text or None)
+    return texts
+
+# Decimal places of a DECIMAL(p,s) column (2 for anything else)
+def amount_scale(col):
+    match = re.search(r"\(\s*\d+\s*,\s*(\d+)\s*\)", col["type"])
+    return int(match.group(1)) if match else 2
+
+class Pain001Writer:
+    def __init__(self, out, config):
+        if not out.seekable():
+            raise ValueError("The pain.001 output must be a regular file: NbOfTxs and CtrlSum are written at the end")
+        self.out = out
+        self.now = datetime.now()
+        self.placeholders = []
+        self.payments = []
+        self.payment_key = None
+        self.started = False
+        self.total_count = 0
+        self.total_units = 0
+
+        # leaves[section][path] = {"text": source, "attrs": {name: source}}, where a source is
+        # ("col", name), ("const", text) or ("amount",)
+        self.leaves = {section: {} for section in SECTION_PATHS}
+        for key, text in {**DEFAULT_VALUES, **config.get("export_values", {})}.items():
+            steps = tuple(key.split("/"))
+            if steps[-1].startswith("@"):
+                self.leaf(steps[0], steps[1:-1])["attrs"][steps[-1][1:]] = ("const", text)
+            else:
+                self.leaf(steps[0], steps[1:])["text"] = ("const", text)
+        amount_cols = []
+        for col in config["columns"]:
+            if not col.get("xpath"):
+                continue
+            section, path = resolve_path(col)
+            if col.get("attribute"):
+                self.leaf(section, path)["attrs"][col["attribute"]] = ("col", col["name"])
+            elif section == "CdtTrfTxInf" and path == AMOUNT_PATH:
+                amount_cols.append(col)
+            else:
+                self.leaf(section, path)["text"] = ("col", col["name"])
+        if not amount_cols:
+            raise ValueError("No column is mapped to the transaction amount (Amt/InstdAmt)")
+        self.amount_col = amount_cols[0]["name"]
+        self.scale = amount_scale(amount_cols[0])
+        self.leaf("CdtTrfTxInf", AMOUNT_PATH)["text"] = ("amount",)
+
+        self.section_cols = {section: [source[1] for leaf in leaves.values() for source in [leaf["text"], *leaf["attrs"].values()]
+                                       if source and source[0] == "col"] for section, leaves in self.leaves.items()}
+        self.payment_cols = self.section_cols["PmtInf"]
+        self.row_template, self.row_sources = self.compile_row()
+
+        missing = [path for path in REQUIRED_PAYMENT_FIELDS if path not in self.leaves["PmtInf"]]
+        for path in missing:
+            logging.warning(f"pain.001 field PmtInf/{'/'.join(path)} has no column or <export> value")
+
+    def leaf(self, section, path):
+        return self.leaves[section].setdefault(path, {"text": None, "attrs": {}})
+
+    # Leaves of a section for one row, in schema order. value(source) gives the text of a
+    # source (None when empty); empty elements are left out.
+    def section_leaves(self, section, value, skip=()):
+        result = []
+        for path in sorted(self.leaves[section], key=lambda path: path_order(section, path)):
+            if path in skip:
+                continue
+            leaf = self.leaves[section][path]
+            text = value(leaf["text"]) if leaf["text"] else None
+            attrs = [(name, escape_attribute(attr)) for name, attr in
+                     ((name, value(source)) for name, source in leaf["attrs"].items()) if attr is not None]
+            if text is None and not attrs:
+                continue
+            result.append((path, escape(text or ""), attrs))
+        return result
+
+    # One format string for a complete transaction, so most rows are a single str.format()
+    def compile_row(self):
+        sources = []
+        def slot(source):
+            if source[0] == "const":
+                return source[1].replace("{", "{{").replace("}", "}}")
+            sources.append(source)
+            return "{%d}" % (len(sources) - 1)
+        leaves = []
+        for path in sorted(self.leaves["CdtTrfTxInf"], key=lambda path: path_order("CdtTrfTxInf", path)):
+            leaf = self.leaves["CdtTrfTxInf"][path]
+            text = slot(leaf["text"]) if leaf["text"] else ""
+            attrs = [(name, slot(source)) for name, source in leaf["attrs"].items()]
+            leaves.append((path, text, attrs))
+        # Constants are escaped here; column values are escaped per chunk
+        leaves = [(path, text if "{" in text else escape(text), attrs) for path, text, attrs in leaves]
+        template = "      <CdtTrfTxInf>\n" + render(leaves, "        ") + "      </CdtTrfTxInf>\n"
+        return template, sources
+
+    def write(self, text):
+        self.out.write(text.encode("utf-8"))
+
+    # "<NbOfTxs>0</NbOfTxs>" followed by spaces, so the real value fits in the same bytes
+    def placeholder(self, tag, width):
+        self.write("      ")
+        self.placeholders.append((self.out.tell(), tag, width))
+        self.write(f"<{tag}>0</{tag}>{' ' * (width - 1)}\n")
+        return len(self.placeholders) - 1
+
+    # Section with NbOfTxs/CtrlSum placeholders between the leaves before and after them
+    def write_section(self, section, leaves):
+        split = path_order(section, ("NbOfTxs",))
+        self.write(render([leaf for leaf in leaves if path_order(section, leaf[0]) < split], "      "))
+        slots = (self.placeholder("NbOfTxs", COUNT_WIDTH), self.placeholder("CtrlSum", SUM_WIDTH))
+        self.write(render([leaf for leaf in leaves if path_order(section, leaf[0]) > split], "      "))
+        return slots
+
+    def start(self, value):
+        self.write('<?xml version="1.0" encoding="utf-8"?>\n')
+        self.write(f'<Document xmlns="{PAIN001_NAMESPACE}">\n  <CstmrCdtTrfInitn>\n    <GrpHdr>\n')
+        leaves = self.section_leaves("GrpHdr", value)
+        paths = {leaf[0] for leaf in leaves}
+        msg_source = self.leaves["GrpHdr"].get(("MsgId",), {}).get("text")
+        self.msg_id = (value(msg_source) if msg_source else None) or self.now.strftime("EXP/%Y%m%d/%H%M%S")
+        if ("MsgId",) not in paths:
+            leaves.append((("MsgId",), escape(self.msg_id), []))
+        if ("CreDtTm",) not in paths:
+            leaves.append((("CreDtTm",), self.now.strftime("%Y-%m-%dT%H:%M:%S"), []))
+        if not any(path[0] == "InitgPty" for path in paths):
+            debtor = self.leaves["PmtInf"].get(("Dbtr", "Nm"), {}).get("text")
+            leaves.append((("InitgPty", "Nm"), escape(value(debtor) or "") if debtor else "", []))
+        leaves.sort(key=lambda leaf: path_order("GrpHdr", leaf[0]))
+        self.totals_slots = self.write_section("GrpHdr", leaves)
+        self.write("    </GrpHdr>\n")
+        self.started = True
+
+    def open_payment(self, value):
+        self.close_payment()
+        leaves = self.section_leaves("PmtInf", value)
+        paths = {leaf[0] for leaf in leaves}
+        if ("PmtInfId",) not in paths:
+            leaves.append((("PmtInfId",), escape(f"{self.msg_id}-{len(self.payments) + 1}"), []))
+        if ("ReqdExctnDt",) not in paths:
+            leaves.append((("ReqdExctnDt",), self.now.strftime("%Y-%m-%d"), []))
+        leaves.sort(key=lambda leaf: path_order("PmtInf", leaf[0]))
+        self.write("    <PmtInf>\n")
+        count_slot, sum_slot = self.write_section("PmtInf", leaves)
+        self.payments.append({"count": 0, "units": 0, "slots": (count_slot, sum_slot), "open": True})
+
+    def close_payment(self):
+        if self.payments and self.payments[-1]["open"]:
+            self.write("    </PmtInf>\n")
+            self.payments[-1]["open"] = False
+
+    def write_chunk(self, df):
+        if df.empty:
+            return
+        texts = {name: column_texts(df[name]) for names in self.section_cols.values() for name in names}
+
+        def row_value(row):
+            return lambda source: None if source is None else source[1] if source[0] == "const" else texts[source[1]][row] if source[0] == "col" else amounts[row]
+
+        # Amounts in integer units of 10^-scale, so CtrlSum is exact
+        values = pd.to_numeric(df[self.amount_col], errors="coerce").fillna(0).to_numpy(dtype="float64")
+        units = np.rint(values * 10 ** self.scale).astype(np.int64)
+        amounts = [f"{unit / 10 ** self.scale:.{self.scale}f}" for unit in units.tolist()]
+        if not self.started:
+            self.start(row_value(0))
+
+        # A new PmtInf starts whenever the values of its columns change
+        keys = list(zip(*(texts[name] for name in self.payment_cols))) if self.payment_cols else [()] * len(df)
+        starts = [0] + [i for i in range(1, len(keys)) if keys[i] != keys[i - 1]] + [len(keys)]
+
+        escaped = [amounts if source[0] == "amount" else
+                   [None if text is None else escape_attribute(text) for text in texts[source[1]]]
+                   for source in self.row_sources]
+        for first, end in zip(starts, starts[1:]):
+            if not self.payments or not self.payments[-1]["open"] or keys[first] != self.payment_key:
+                self.open_payment(row_value(first))
+                self.payment_key = keys[first]
+            parts = []
+            for row in range(first, end):
+                cells = [column[row] for column in escaped]
+                if None in cells:
+                    # Some element is empty: render this row without it
+                    parts.append("      <CdtTrfTxInf>\n" + render(self.section_leaves("CdtTrfTxInf", row_value(row)), "        ") + "      </CdtTrfTxInf>\n")
+                else:
+                    parts.append(self.row_template.format(*cells))
+            self.write("".join(parts))
+            payment = self.payments[-1]
+            payment["count"] += end - first
+            payment["units"] += int(units[first:end].sum())
+        self.total_count += len(df)
+        self.total_units += int(units.sum())
+
+    def format_units(self, units):
+        sign = "-" if units < 0 else ""
+        whole, fraction = divmod(abs(units), 10 ** self.scale)
+        return f"{sign}{whole}.{fraction:0{self.scale}d}" if self.scale else f"{sign}{whole}"
+
+    # Close the document and fill in the placeholders. Returns the number of transactions.
+    def close(self):
+        if not self.started:
+            self.start(lambda source: source[1] if source and source[0] == "const" else None)
+        self.close_payment()
+        self.write("  </CstmrCdtTrfInitn>\n</Document>\n")
+        values = {self.totals_slots[0]: str(self.total_count), self.totals_slots[1]: self.format_units(self.total_units)}
+        for payment in self.payments:
+            values[payment["slots"][0]] = str(payment["count"])
+            values[payment["slots"][1]] = self.format_units(payment["units"])
+        end = self.out.tell()
+        for index, text in values.items():
+            offset, tag, width = self.placeholders[index]
+            if len(text) > width:
+                raise ValueError(f"{tag} value {text} does not fit in {width} characters")
+            self.out.seek(offset)
+            self.out.write(f"<{tag}>{text}</{tag}>{' ' * (width - len(text))}".encode("utf-8"))
+        self.out.seek(end)
+        return self.total_count
+
+# Rows of the config table, EXPORT_CHUNK_ROWS at a time
+def iter_table_chunks(config, connect=None):
+    conn = (connect or (lambda: novo.connect_to_sql(config)))()
+    names = [col["name"] for col in config["columns"] if col.get("xpath")]
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"SELECT {', '.join(names)} FROM {config['table_name']}")
+        while True:
+            rows = cursor.fetchmany(EXPORT_CHUNK_ROWS)
+            if not rows:
+                break
+            yield pd.DataFrame.from_records([tuple(row) for row in rows], columns=names)
+    finally:
+        cursor.close()
+        conn.close()
+
+# Rows of an Excel sheet, streamed EXPORT_CHUNK_ROWS at a time and mapped and cast like the
+# import does. Columns without a source_name are looked up by their own name.
+def iter_excel_chunks(config, excel_file):
+    columns = [{**col, "source_name": col.get("source_name") or col["name"]} for col in config["columns"] if col.get("xpath")]
+    excel_config = {**config, "excel_file": excel_file, "columns": columns,
+                    "sheet_name": config.get("sheet_name"), "skip_rows": config.get("skip_rows")}
+    for df in novo.iter_excel_chunks(excel_config, chunk_size=EXPORT_CHUNK_ROWS):
+        yield novo.clean_and_cast_dataframe(df, excel_config)
+
+# Write a pain.001 file from the config table (or from excel_file). Returns the number of transactions.
+def export_pain001(config, output_path, excel_file=None, connect=None):
+    chunks = iter_excel_chunks(config, excel_file) if excel_file else iter_table_chunks(config, connect)
+    with open(output_path, "wb") as out:
+        writer = Pain001Writer(out, config)
+        for chunk in chunks:
+            writer.write_chunk(chunk)
+        count = writer.close()
+    logging.info(f"{count} transactions written to {output_path} ({len(writer.payments)} PmtInf)")
+    return count
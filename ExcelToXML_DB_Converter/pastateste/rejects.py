@@ -0,0 +1,57 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+
+# Reject log: rows left out of the import because of their data (e.g. a lookup value with
+# no match in the reference table) are appended to a JSON lines file, one line per row,
+# with the config, table, source file, record number, the reason and the row values, so
+# they can be fixed and imported again. The file is only created when a row is rejected.
+#
+# {"time": "2025-03-04T10:12:00", "config": "genericoRH.xml", "table": "Tabela_RH",
+#  "source": "RH.xlsx", "record": 412, "reason": "ID_Colaborador: 'PT999' not in Colaboradores.NIF",
+#  "values": {"ID_Colaborador": "PT999", ...}}
+
+REJECT_FILE = "import_rejects.jsonl"
+
+# Distinct reasons listed in the summary of a run
+SUMMARY_REASONS = 5
+
+class RejectLog:
+    def __init__(self, config, source, path=None):
+        self.path = path or config.get("reject_file") or REJECT_FILE
+        self.config_file = os.path.basename(config.get("config_file") or "")
+        self.table = config["table_name"]
+        self.source = source
+        self.count = 0
+        self.reasons = {}
+        self.lock = threading.Lock()
+
+    # rows: the rejected rows, indexed by their position counted from first_record
+    # reasons: one reason for all of them, or one per row
+    def write(self, rows, reasons, first_record=0):
+        if rows.empty:
+            return
+        if isinstance(reasons, str):
+            reasons = [reasons] * len(rows)
+        now = datetime.now().isoformat(timespec="seconds")
+        values = rows.astype(object).where(rows.notna(), None).to_dict("records")
+        lines = [json.dumps({"time": now, "config": self.config_file, "table": self.table, "source": self.source,
+                             "record": int(first_record + position + 1), "reason": reason, "values": row},
+                            ensure_ascii=False, default=str)
+                 for position, reason, row in zip(rows.index, reasons, values)]
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+            self.count += len(rows)
+            for reason in reasons:
+                self.reasons[reason] = self.reasons.get(reason, 0) + 1
+
+    def log_summary(self):
+        if not self.count:
+            return
+        top = sorted(self.reasons.items(), key=lambda item: -item[1])[:SUMMARY_REASONS]
+        details = "; ".join(f"{reason} ({count})" for reason, count in top)
+        logging.warning(f"{self.count} rows rejected, written to {self.path}: {details}"
+                        + (" ..." if len(self.reasons) > SUMMARY_REASONS else ""))
@@ -0,0 +1,239 @@
+import argparse
+import json
+import logging
+import os
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import novo
+
+# Runs the imports of a manifest (e.g. the month-end load) instead of a shell loop:
+#
+# <manifest workers="4">
+#     <targets>
+#         <target name="Tabela_Licenca" concurrency="2"/>
+#     </targets>
+#     <job name="devices" config="devices.xml">
+#         <source>2025-02 - BringDevices.xlsx</source>
+#     </job>
+#     <job name="licencas" config="genericoLicense.xml" target="Tabela_Licenca" retries="2">
+#         <source>2025-02 - License split.xlsx</source>
+#         <source>2025-3-ReportLicence.xlsx</source>
+#         <depends_on>devices</depends_on>
+#     </job>
+# </manifest>
+#
+# Each job runs load_config + process_config once per source, on a pool of `workers`
+# threads. A job starts when its dependencies have finished and its target (by default the
+# config table) has a free slot; targets without a <target> run one job at a time. A failed
+# job is retried after retry_delay seconds (doubled on each attempt), without the sources it
+# finished and with --resume for the others; when it fails for good, the jobs that depend on
+# it are skipped. At the end the critical path is logged: the chain of jobs, each waiting for
+# the previous one, that ended last.
+
+DEFAULT_WORKERS = 4
+DEFAULT_RETRY_DELAY = 5.0
+
+class Job:
+    def __init__(self, name, config_file, sources, target, depends_on, retries=0, retry_delay=DEFAULT_RETRY_DELAY, delta=False):
+        self.name = name
+        self.config_file = config_file
+        self.sources = sources
+        self.target = target
+        self.depends_on = depends_on
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.delta = delta
+        self.status = "pending"
+        self.attempts = 0
+        self.not_before = 0.0
+        self.ready_at = None
+        self.start = None
+        self.end = None
+        self.rows = 0
+        self.error = None
+        # Rows written by each source already imported, kept across attempts
+        self.finished_sources = {}
+
+    def report(self, origin):
+        seconds = lambda t: None if t is None else round(t - origin, 3)
+        return {"name": self.name, "status": self.status, "target": self.target, "attempts": self.attempts,
+                "rows": self.rows, "ready": seconds(self.ready_at), "start": seconds(self.start),
+                "end": seconds(self.end), "error": self.error}
+
+# Jobs in an order where every job comes after its dependencies
+def topological_order(jobs):
+    order, state = [], {}
+
+    def visit(name, chain):
+        if state.get(name) == "done":
+            return
+        if state.get(name) == "visiting":
+            raise ValueError(f"Dependency cycle in manifest: {' -> '.join(chain + [name])}")
+        state[name] = "visiting"
+        for dependency in jobs[name].depends_on:
+            if dependency not in jobs:
+                raise ValueError(f"Job '{name}' depends on unknown job '{dependency}'")
+            visit(dependency, chain + [name])
+        state[name] = "done"
+        order.append(jobs[name])
+
+    for name in jobs:
+        visit(name, [])
+    return order
+
+# Returns (jobs by name, concurrency per target, workers). Paths are relative to the manifest.
+def load_manifest(path):
+    root = ET.parse(path).getroot()
+    base = os.path.dirname(os.path.abspath(path))
+    resolve = lambda file_path: file_path if os.path.isabs(file_path) else os.path.join(base, file_path)
+    limits = {target.attrib["name"]: int(target.attrib.get("concurrency", 1)) for target in root.findall("./targets/target")}
+
+    jobs = {}
+    for elem in root.findall("./job"):
+        name = elem.attrib["name"]
+        if name in jobs:
+            raise ValueError(f"Duplicate job '{name}' in manifest")
+        config_file = resolve(elem.attrib["config"])
+        target = elem.attrib.get("target") or novo.load_config(config_file)["table_name"].strip()
+        jobs[name] = Job(
+            name, config_file,
+            sources=[resolve(source.text.strip()) for source in elem.findall("./source") if source.text],
+            target=target,
+            depends_on=[dependency.text.strip() for dependency in elem.findall("./depends_on") if dependency.text],
+            retries=int(elem.attrib.get("retries", 0)),
+            retry_delay=float(elem.attrib.get("retry_delay", DEFAULT_RETRY_DELAY)),
+            delta=elem.attrib.get("delta", "").lower() == "yes",
+        )
+    topological_order(jobs)
+    return jobs, limits, int(root.attrib.get("workers", DEFAULT_WORKERS))
+
+# One attempt: every source of the job, in order. Returns the rows written. A retry skips the
+# sources a failed attempt finished and resumes the one it stopped on from its checkpoint.
+def run_job(job):
+    config = novo.load_config(job.config_file)
+    if job.delta:
+        config["delta"] = True
+    for source in job.sources or [None]:
+        if source in job.finished_sources:
+            logging.info(f"Job '{job.name}': {source} was imported by attempt {job.attempts - 1} or before, skipped")
+            continue
+        job_config = dict(config)
+        if source:
+            job_config["excel_file" if config["type"] == "excel" else "file_path"] = source
+        job_config["resume"] = job.attempts > 1
+        metrics = novo.process_config(job_config)
+        job.finished_sources[source] = metrics["rows"]
+    return sum(job.finished_sources.values())
+
+# The job that ended last, then the dependency that ended last before it, and so on
+def critical_path(jobs):
+    finished = [job for job in jobs.values() if job.end is not None]
+    job = max(finished, key=lambda job: job.end, default=None)
+    path = []
+    while job is not None:
+        path.append(job)
+        dependencies = [jobs[name] for name in job.depends_on if jobs[name].end is not None]
+        job = max(dependencies, key=lambda job: job.end, default=None)
+    return path[::-1]
+
+def log_report(jobs, origin, wall):
+    for job in topological_order(jobs):
+        took = f"{job.end - job.start:.1f}s" if job.end is not None and job.start is not None else "-"
+        logging.info(f"Job '{job.name}': {job.status}, {job.rows} rows, {took}, {job.attempts} attempt(s)"
+                     + (f" - {job.error}" if job.error else ""))
+    path = critical_path(jobs)
+    if not path:
+        return
+    logging.info(f"Critical path ({path[-1].end - origin:.1f}s of {wall:.1f}s wall time):")
+    for job in path:
+        waited = job.start - job.ready_at
+        logging.info(f"  {job.name}: {job.end - job.start:.1f}s"
+                     + (f" (waited {waited:.1f}s for a worker or a free '{job.target}' slot)" if waited >= 0.05 else ""))
+
+# Run the manifest jobs; returns the report (one entry per job, times in seconds from the start)
+def run_manifest(jobs, limits, workers=DEFAULT_WORKERS, run=run_job):
+    order = topological_order(jobs)
+    origin = time.perf_counter()
+    running = {}
+    active = {}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            now = time.perf_counter()
+            for job in order:
+                if job.status != "pending":
+                    continue
+                dependencies = [jobs[name] for name in job.depends_on]
+                if any(dependency.status in ("failed", "skipped") for dependency in dependencies):
+                    job.status = "skipped"
+                    logging.warning(f"Job '{job.name}' skipped: a job it depends on did not finish")
+                    continue
+                if any(dependency.status != "done" for dependency in dependencies):
+                    continue
+                if job.ready_at is None:
+                    job.ready_at = max([dependency.end for dependency in dependencies], default=origin)
+                if (job.not_before > now or len(running) >= workers
+                        or active.get(job.target, 0) >= limits.get(job.target, 1)):
+                    continue
+                job.status = "running"
+                job.attempts += 1
+                job.start = job.start or now
+                active[job.target] = active.get(job.target, 0) + 1
+                logging.info(f"Starting job '{job.name}' (attempt {job.attempts})")
+                running[executor.submit(run, job)] = job
+
+            if not running:
+                waiting = [job.not_before for job in order if job.status == "pending"]
+                if not waiting:
+                    break
+                time.sleep(max(0.0, min(waiting) - time.perf_counter()))
+                continue
+
+            retry_at = [job.not_before for job in order if job.status == "pending" and job.not_before > now]
+            timeout = max(0.0, min(retry_at) - time.perf_counter()) if retry_at else None
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = running.pop(future)
+                active[job.target] -= 1
+                try:
+                    job.rows = future.result()
+                    job.status = "done"
+                    job.end = time.perf_counter()
+                    job.error = None
+                except Exception as e:
+                    job.error = str(e)
+                    if job.attempts <= job.retries:
+                        delay = job.retry_delay * 2 ** (job.attempts - 1)
+                        logging.warning(f"Job '{job.name}' failed ({e}), retrying in {delay:.1f}s")
+                        job.status = "pending"
+                        job.not_before = time.perf_counter() + delay
+                    else:
+                        logging.error(f"Job '{job.name}' failed after {job.attempts} attempt(s): {e}")
+                        job.status = "failed"
+                        job.end = time.perf_counter()
+
+    wall = time.perf_counter() - origin
+    log_report(jobs, origin, wall)
+    return {"seconds": round(wall, 3), "critical_path": [job.name for job in critical_path(jobs)],
+            "jobs": [job.report(origin) for job in order]}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Executa as importações de um manifesto, respeitando as dependências.")
+    parser.add_argument("manifest", help="Caminho para o manifesto XML")
+    parser.add_argument("--workers", type=int, help="Número de importações em simultâneo (por omissão o atributo workers do manifesto)")
+    parser.add_argument("--report", metavar="FICHEIRO", help="Guardar o relatório (tempos de cada job e caminho crítico) em JSON")
+    args = parser.parse_args()
+
+    try:
+        jobs, limits, workers = load_manifest(args.manifest)
+        report = run_manifest(jobs, limits, args.workers or workers)
+    except Exception as e:
+        logging.error(f"Erro ao processar o manifesto '{args.manifest}': {e}")
+        exit(1)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if any(job["status"] != "done" for job in report["jobs"]):
+        exit(1)
@@ -0,0 +1,332 @@
+import argparse
+import contextlib
+import copy
+import http.client
+import itertools
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import novo
+from lookups import DEFAULT_TTL_SECONDS, LookupCache
+
+# Resident import service. Every CLI run pays for importing pandas/openpyxl/pyodbc, parsing
+# the config and logging in to the database before it reads a row; for small files that is
+# most of the time. The service pays it once: the modules stay imported, configs are parsed
+# once (again only when the file changes) and connections are kept open between jobs.
+# The reference tables of lookup columns are also shared by the jobs, and read again once
+# they are older than --lookup-ttl seconds.
+#
+# Jobs are sent as JSON over HTTP on 127.0.0.1 (--port) or over a Unix socket (--socket):
+#   POST /jobs        {"config": "devices.xml", "file": "2025-02 - BringDevices.xlsx", "delta": true}
+#                     waits for the result; with "wait": false it returns the job id at once
+#   GET  /jobs/<id>   status, metrics and timings of a job
+#   GET  /jobs        the last jobs
+#   GET  /health      uptime, cached configs and connection counters
+
+DEFAULT_PORT = 8765
+DEFAULT_WORKERS = 2
+KEPT_JOBS = 1000
+
+# Config keys a job may set, like the CLI flags of the same name
+JOB_OPTIONS = ("delta", "writers", "atomic", "resume", "typed", "xml_workers", "snapshot_dir", "reject_file", "dedupe")
+
+# A connection handed to one job; close() gives it back to the idle list
+class PooledConnection:
+    def __init__(self, pool, conn):
+        self.pool = pool
+        self.conn = conn
+        self.closed = False
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.pool.release(self.conn)
+
+# Open connections kept between jobs (at most `keep`). Unlike sql_writer.ConnectionPool,
+# connect() never blocks: when none is idle a new one is opened.
+class IdleConnections:
+    def __init__(self, open_connection, keep):
+        self.open_connection = open_connection
+        self.keep = keep
+        self.idle = []
+        self.lock = threading.Lock()
+        self.opened = 0
+        self.reused = 0
+        self.dropped = 0
+
+    # An idle connection is checked before it is handed out: one the server closed while it
+    # was idle (timeout, restart) is dropped and the next one is tried
+    def connect(self):
+        while True:
+            with self.lock:
+                if not self.idle:
+                    self.opened += 1
+                    break
+                conn = self.idle.pop()
+            if self.alive(conn):
+                with self.lock:
+                    self.reused += 1
+                return PooledConnection(self, conn)
+        return PooledConnection(self, self.open_connection())
+
+    def alive(self, conn):
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT 1")
+            finally:
+                cursor.close()
+            return True
+        except Exception as e:
+            logging.warning(f"Dropping an idle connection that no longer answers: {e}")
+            with contextlib.suppress(Exception):
+                conn.close()
+            with self.lock:
+                self.dropped += 1
+            return False
+
+    # A connection that cannot even roll back is dropped instead of kept
+    def release(self, conn):
+        try:
+            conn.rollback()
+        except Exception as e:
+            logging.warning(f"Dropping a broken connection: {e}")
+            return
+        with self.lock:
+            if len(self.idle) < self.keep:
+                self.idle.append(conn)
+                return
+        conn.close()
+
+    def close_all(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for conn in idle:
+            try:
+                conn.close()
+            except Exception as e:
+                logging.warning(f"Error closing connection: {e}")
+
+class ImportService:
+    def __init__(self, workers=DEFAULT_WORKERS, keep_connections=None, connect_factory=None, lookup_ttl=DEFAULT_TTL_SECONDS):
+        self.started = time.time()
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.configs = {}
+        self.config_lock = threading.Lock()
+        self.connect_factory = connect_factory or novo.connect_to_sql
+        self.keep_connections = keep_connections or workers * 2
+        self.pools = {}
+        self.jobs = {}
+        self.jobs_lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.lookups = LookupCache(ttl=lookup_ttl)
+        # openpyxl is only imported by pandas on the first read_excel
+        import openpyxl  # noqa: F401
+
+    # Parsed config, cached until the file changes; each job gets its own copy
+    def config(self, path):
+        path = os.path.abspath(path)
+        mtime = os.stat(path).st_mtime_ns
+        with self.config_lock:
+            cached = self.configs.get(path)
+            hit = cached is not None and cached[0] == mtime
+            if not hit:
+                cached = (mtime, novo.load_config(path))
+                self.configs[path] = cached
+        return copy.deepcopy(cached[1]), hit
+
+    # Idle connections of the config database (server, port and database name)
+    def pool(self, config):
+        key = (config.get("server"), config.get("port"), config.get("database"))
+        with self.config_lock:
+            if key not in self.pools:
+                self.pools[key] = IdleConnections(lambda: self.connect_factory(config), self.keep_connections)
+            return self.pools[key]
+
+    def submit(self, request):
+        if not request.get("config"):
+            raise ValueError("Missing 'config'")
+        unknown = set(request) - {"config", "file", "wait", *JOB_OPTIONS}
+        if unknown:
+            raise ValueError(f"Unknown job fields: {', '.join(sorted(unknown))}")
+        job = {"id": next(self.ids), "status": "queued", "config": request["config"], "file": request.get("file"),
+               "submitted": time.time(), "timings": {}, "metrics": None, "error": None}
+        with self.jobs_lock:
+            self.jobs[job["id"]] = job
+            for old_id in list(self.jobs)[:-KEPT_JOBS]:
+                del self.jobs[old_id]
+            job["future"] = self.executor.submit(self.run, job, request)
+        return job
+
+    # Workers change jobs and handlers serialize them, so both go through jobs_lock
+    def update(self, job, timings=None, **fields):
+        with self.jobs_lock:
+            job.update(fields)
+            job["timings"].update(timings or {})
+
+    def run(self, job, request):
+        start = time.perf_counter()
+        self.update(job, {"queue_seconds": round(time.time() - job["submitted"], 4)}, status="running")
+        try:
+            config, cached = self.config(request["config"])
+            self.update(job, {"config_seconds": round(time.perf_counter() - start, 4), "config_cached": cached})
+            if request.get("file"):
+                config["excel_file" if config["type"] == "excel" else "file_path"] = request["file"]
+            for option in JOB_OPTIONS:
+                if option in request:
+                    config[option] = request[option]
+            config["lookup_cache"] = self.lookups
+            metrics = novo.process_config(config, connect=self.pool(config).connect)
+            self.update(job, metrics=metrics, status="done")
+        except Exception as e:
+            logging.error(f"Job {job['id']} ({request['config']}) failed: {e}")
+            self.update(job, error=str(e), status="failed")
+        self.update(job, {"run_seconds": round(time.perf_counter() - start, 4)})
+        return job
+
+    def job(self, job_id):
+        return self.jobs.get(job_id)
+
+    # Copy of a job without its future, taken under the lock, for the JSON answers
+    def job_view(self, job):
+        with self.jobs_lock:
+            return copy.deepcopy({key: value for key, value in job.items() if key != "future"})
+
+    def last_jobs(self, count):
+        with self.jobs_lock:
+            jobs = list(self.jobs.values())[-count:]
+        return [self.job_view(job) for job in jobs]
+
+    def health(self):
+        return {"uptime_seconds": round(time.time() - self.started), "jobs": len(self.jobs),
+                "configs_cached": len(self.configs), "lookups": self.lookups.stats(),
+                "connections": {"opened": sum(pool.opened for pool in self.pools.values()),
+                                "reused": sum(pool.reused for pool in self.pools.values()),
+                                "dropped": sum(pool.dropped for pool in self.pools.values()),
+                                "idle": sum(len(pool.idle) for pool in self.pools.values())}}
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        for pool in self.pools.values():
+            pool.close_all()
+
+class JobHandler(BaseHTTPRequestHandler):
+    service = None
+
+    def send_json(self, status, body):
+        data = json.dumps(body, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self.send_json(200, self.service.health())
+        elif self.path == "/jobs":
+            self.send_json(200, self.service.last_jobs(50))
+        elif self.path.startswith("/jobs/") and self.path[6:].isdigit():
+            job = self.service.job(int(self.path[6:]))
+            if job:
+                self.send_json(200, self.service.job_view(job))
+            else:
+                self.send_json(404, {"error": "Unknown job"})
+        else:
+            self.send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        if self.path != "/jobs":
+            self.send_json(404, {"error": "Not found"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            job = self.service.submit(request)
+        except ValueError as e:
+            self.send_json(400, {"error": str(e)})
+            return
+        if request.get("wait", True):
+            job["future"].result()
+            self.send_json(200, self.service.job_view(job))
+        else:
+            self.send_json(202, self.service.job_view(job))
+
+    # Unix socket clients have no address
+    def address_string(self):
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} {format % args}")
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+# Send one request to a running service and return (status, JSON body)
+def call_service(method, path, body=None, port=DEFAULT_PORT, socket_path=None, timeout=None):
+    conn = UnixHTTPConnection(socket_path, timeout) if socket_path else http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    try:
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        conn.request(method, path, body=data, headers={"Content-Type": "application/json"} if data else {})
+        response = conn.getresponse()
+        return response.status, json.loads(response.read() or b"null")
+    finally:
+        conn.close()
+
+def serve(service, port=DEFAULT_PORT, socket_path=None):
+    handler = type("Handler", (JobHandler,), {"service": service})
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = UnixHTTPServer(socket_path, handler)
+        logging.info(f"Import service listening on {socket_path}")
+    else:
+        server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        logging.info(f"Import service listening on http://127.0.0.1:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("Stopping the import service")
+    finally:
+        server.server_close()
+        service.close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serviço de importação residente (HTTP local ou socket Unix).")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Porta HTTP em 127.0.0.1 (por omissão 8765)")
+    parser.add_argument("--socket", metavar="CAMINHO", help="Usar um socket Unix em vez de HTTP")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Número de importações em simultâneo")
+    parser.add_argument("--lookup-ttl", type=float, default=DEFAULT_TTL_SECONDS,
+                        help="Segundos até voltar a ler as tabelas de referência das colunas lookup (por omissão 300)")
+    parser.add_argument("--submit", nargs="+", metavar=("CONFIG", "FICHEIRO"),
+                        help="Enviar uma importação a um serviço já em execução e mostrar o resultado")
+    args = parser.parse_args()
+
+    if args.submit:
+        job = {"config": os.path.abspath(args.submit[0])}
+        if len(args.submit) > 1:
+            job["file"] = os.path.abspath(args.submit[1])
+        status, result = call_service("POST", "/jobs", job, port=args.port, socket_path=args.socket)
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+        exit(0 if status == 200 and result.get("status") == "done" else 1)
+    serve(ImportService(workers=args.workers, lookup_ttl=args.lookup_ttl), port=args.port, socket_path=args.socket)
@@ -0,0 +1,176 @@
+import argparse
+import logging
+import os
+import re
+import unicodedata
+import xml.etree.ElementTree as ET
+from datetime import date, datetime, time as dt_time
+
+# Looks at the top of an Excel sheet and drafts a generico*.xml config for it, instead of
+# printing the first rows with pandas. openpyxl reads the workbook in read-only mode and
+# only the first rows of one sheet are parsed, so big workbooks take well under a second.
+#
+#   python sheet_inspector.py "2025-02 - License split.xlsx" --sheet RH --write-config genericoRH.xml
+#
+# The header is the row (among the first HEADER_SEARCH_ROWS) with the most distinct text
+# cells; the types come from the SAMPLE_ROWS rows below it.
+
+HEADER_SEARCH_ROWS = 30
+SAMPLE_ROWS = 200
+
+# NVARCHAR sizes offered in the draft: the first one with room for 1.5x the longest value
+NVARCHAR_SIZES = (50, 100, 255, 500, 1000, 4000)
+
+# "1.234,56", "€ 12,50", "-12,5": amounts written with a decimal comma
+LOCALIZED_NUMBER = re.compile(r"^\(?-?\s*[€$£]?\s*-?\d{1,3}(\.?\d{3})*(,\d+)?\s*[€$£]?\)?$")
+# Dates stored as text, with the format attribute that reads them
+TEXT_DATE_FORMATS = ((re.compile(r"^\d{2}/\d{2}/\d{4}$"), "%d/%m/%Y"), (re.compile(r"^\d{2}-\d{2}-\d{4}$"), "%d-%m-%Y"),
+                     (re.compile(r"^\d{4}-\d{2}-\d{2}$"), "%Y-%m-%d"),
+                     (re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$"), "%Y-%m-%d %H:%M:%S"))
+
+# "Licenças Pagas" -> "Licencas_Pagas"
+def column_name(header, index):
+    text = unicodedata.normalize("NFKD", str(header)).encode("ascii", "ignore").decode()
+    text = re.sub(r"\W+", "_", text).strip("_")
+    if not text:
+        return f"Coluna_{index + 1}"
+    return f"C_{text}" if text[0].isdigit() else text
+
+def is_blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+# Index of the header row in `rows`: most distinct non-empty text cells, earliest on ties
+def find_header_row(rows):
+    best_index, best_score = 0, 0
+    for index, row in enumerate(rows[:HEADER_SEARCH_ROWS]):
+        texts = {value.strip() for value in row if isinstance(value, str) and value.strip()}
+        if len(texts) > best_score:
+            best_index, best_score = index, len(texts)
+    return best_index
+
+def nvarchar_size(max_length):
+    return next((size for size in NVARCHAR_SIZES if size >= max_length * 1.5), "MAX")
+
+# SQL type (and extra column attributes) for the sample values of one column
+def infer_column(values):
+    values = [value for value in values if not is_blank(value)]
+    texts = [str(value).strip() for value in values]
+    max_length = max((len(text) for text in texts), default=0)
+    info = {"non_empty": len(values), "max_length": max_length, "example": texts[0] if texts else "", "attributes": {}}
+    if not values:
+        info["type"] = "NVARCHAR(50)"
+    elif all(isinstance(value, (datetime, date)) and not isinstance(value, dt_time) for value in values):
+        info["type"] = "DATETIME"
+    elif all(isinstance(value, bool) for value in values):
+        info["type"] = "BIT"
+    elif all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in values):
+        if all(float(value).is_integer() for value in values):
+            info["type"] = "BIGINT" if max(abs(value) for value in values) >= 2 ** 31 else "INT"
+        else:
+            scale = max(len(repr(float(value)).split(".")[1].rstrip("0")) for value in values)
+            info["type"] = f"DECIMAL(18,{min(max(scale, 2), 6)})"
+    elif all(isinstance(value, str) for value in values) and all(LOCALIZED_NUMBER.match(text) for text in texts) \
+            and any("," in text for text in texts):
+        scale = max(len(text.rsplit(",", 1)[1].strip(" €$£)")) if "," in text else 0 for text in texts)
+        info["type"] = f"DECIMAL(18,{min(max(scale, 2), 6)})"
+        info["attributes"] = {"locale": "pt"}
+    else:
+        date_format = next((fmt for pattern, fmt in TEXT_DATE_FORMATS if all(pattern.match(text) for text in texts)), None)
+        if date_format and all(isinstance(value, str) for value in values):
+            info["type"] = "DATETIME"
+            info["attributes"] = {"format": date_format}
+        else:
+            info["type"] = f"NVARCHAR({nvarchar_size(max_length)})"
+    return info
+
+# Sheet names with their size, the detected header row and one entry per column
+def inspect_sheet(path, sheet_name=None, sample_rows=SAMPLE_ROWS):
+    import openpyxl
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheets = [(sheet.title, sheet.max_row, sheet.max_column) for sheet in workbook.worksheets]
+        if sheet_name is not None and sheet_name not in workbook.sheetnames:
+            raise ValueError(f"Worksheet named '{sheet_name}' not found (sheets: {', '.join(workbook.sheetnames)})")
+        sheet = workbook[sheet_name] if sheet_name else workbook.worksheets[0]
+        rows = list(sheet.iter_rows(max_row=HEADER_SEARCH_ROWS + sample_rows, values_only=True))
+    finally:
+        workbook.close()
+
+    header_index = find_header_row(rows)
+    header = rows[header_index] if rows else ()
+    sample = rows[header_index + 1:header_index + 1 + sample_rows]
+    columns, names = [], set()
+    for index, source_name in enumerate(header):
+        if is_blank(source_name):
+            continue
+        name = column_name(source_name, index)
+        while name in names:
+            name += "_"
+        names.add(name)
+        values = [row[index] if index < len(row) else None for row in sample]
+        columns.append({"source_name": str(source_name).strip(), "name": name, "letter": column_letter(index), **infer_column(values)})
+    return {"file": path, "sheets": sheets, "sheet": sheet.title, "header_row": header_index + 1,
+            "sample_rows": len(sample), "columns": columns}
+
+def column_letter(index):
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+# Numeric columns need a number as default, like in the generico*.xml files
+def column_default(sql_type):
+    if sql_type.startswith("DECIMAL"):
+        return "0.00"
+    return "0" if sql_type in ("INT", "BIGINT", "BIT") else ""
+
+# Draft config in the layout of the generico*.xml files
+def draft_config(result, table_name=None):
+    config = ET.Element("config")
+    database = ET.SubElement(config, "database")
+    for tag, text in (("server", "env"), ("port", "env"), ("database_name", "env"), ("trusted_connection", "no")):
+        ET.SubElement(database, tag).text = text
+    table = ET.SubElement(database, "table", name=table_name or f"Tabela_{column_name(result['sheet'], 0)}")
+    columns = ET.SubElement(table, "columns")
+    for col in result["columns"]:
+        ET.SubElement(columns, "column", name=col["name"], type=col["type"], source_name=col["source_name"],
+                      **col["attributes"], default=column_default(col["type"]))
+    excel = ET.SubElement(config, "excel")
+    ET.SubElement(excel, "file_path").text = "ASK"
+    ET.SubElement(excel, "sheet_name").text = result["sheet"]
+    ET.SubElement(excel, "skip_rows").text = str(result["header_row"] - 1)
+    ET.indent(config, space="    ")
+    return ET.tostring(config, encoding="unicode") + "\n"
+
+def print_result(result):
+    print(f"{os.path.basename(result['file'])}")
+    for title, max_row, max_column in result["sheets"]:
+        marker = "*" if title == result["sheet"] else " "
+        print(f" {marker} {title} ({max_row or '?'} rows x {max_column or '?'} columns)")
+    print(f"\nSheet '{result['sheet']}': header on row {result['header_row']}, types from {result['sample_rows']} rows")
+    for col in result["columns"]:
+        attributes = " ".join(f'{key}="{value}"' for key, value in col["attributes"].items())
+        print(f"  {col['letter']:<3} {col['source_name'][:30]:<30} {col['type']:<16} max {col['max_length']:<4} "
+              f"{col['non_empty']:>4} filled  e.g. {col['example'][:25]!r} {attributes}".rstrip())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mostra as folhas, o cabeçalho e os tipos de um Excel e gera um rascunho da configuração.")
+    parser.add_argument("excel_file", help="Caminho para o ficheiro Excel")
+    parser.add_argument("--sheet", help="Folha a analisar (por omissão a primeira)")
+    parser.add_argument("--rows", type=int, default=SAMPLE_ROWS, help="Linhas usadas para deduzir os tipos")
+    parser.add_argument("--write-config", metavar="FICHEIRO", help="Gravar um rascunho da configuração XML")
+    parser.add_argument("--table", help="Nome da tabela no rascunho (por omissão Tabela_<folha>)")
+    args = parser.parse_args()
+
+    try:
+        result = inspect_sheet(args.excel_file, args.sheet, args.rows)
+        print_result(result)
+        if args.write_config:
+            with open(args.write_config, "w", encoding="utf-8") as f:
+                f.write(draft_config(result, args.table))
+            print(f"\nDraft config written to {args.write_config}")
+    except Exception as e:
+        logging.error(f"Erro ao analisar '{args.excel_file}': {e}")
+        exit(1)
@@ -0,0 +1,56 @@
+import bz2
+import contextlib
+import gzip
+import logging
+import os
+import zipfile
+
+# Compressed sources (.gz, .bz2) and zip bundles, read without unpacking them to disk.
+# Each data file is handed over as an open binary file object: XML is streamed from it
+# into the parser, and every member of a zip is its own source, in archive order.
+
+EXCEL_SUFFIXES = (".xlsx", ".xlsm", ".xls")
+XML_SUFFIXES = (".xml",)
+CSV_SUFFIXES = (".csv", ".txt")
+JSON_SUFFIXES = (".json", ".ndjson", ".jsonl")
+
+STREAM_OPENERS = {".gz": gzip.open, ".bz2": bz2.open}
+
+def is_compressed(path):
+    return os.path.splitext(path)[1].lower() in (".zip", *STREAM_OPENERS)
+
+# Data file suffixes accepted for a config type
+def data_suffixes(config_type):
+    return {"excel": EXCEL_SUFFIXES, "csv": CSV_SUFFIXES, "json": JSON_SUFFIXES}.get(config_type, XML_SUFFIXES)
+
+# (name, file object) for each data file inside the source. The file object is only
+# valid until the next item is requested.
+def iter_compressed(path, suffixes):
+    base, extension = os.path.splitext(path)
+    extension = extension.lower()
+    if extension in STREAM_OPENERS:
+        with STREAM_OPENERS[extension](path, "rb") as f:
+            yield os.path.basename(base), f
+        return
+
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            if not info.filename.lower().endswith(suffixes):
+                logging.info(f"Skipping '{info.filename}' in {os.path.basename(path)}: not a {'/'.join(suffixes)} file")
+                continue
+            with archive.open(info) as f:
+                yield info.filename, f
+
+# A new file object for a data file given by iter_compressed, to read it again from the start
+# (e.g. the first pass of a dedupe) without copying it anywhere
+@contextlib.contextmanager
+def open_member(path, member):
+    extension = os.path.splitext(path)[1].lower()
+    if extension in STREAM_OPENERS:
+        with STREAM_OPENERS[extension](path, "rb") as f:
+            yield f
+        return
+    with zipfile.ZipFile(path) as archive, archive.open(member) as f:
+        yield f
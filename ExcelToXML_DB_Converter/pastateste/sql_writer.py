@@ -0,0 +1,255 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Writers for import_to_sql. Rows are sent with executemany() in batches whose size a
+# BatchController adapts to the measured latency.
+#
+# Single connection: the transaction is committed every controller.commit_rows rows.
+#
+# Parallel (big single-table loads): the prepared DataFrame is split into N contiguous
+# partitions and each one is inserted over its own pooled connection, in its own
+# transaction. The commits are only issued after every partition has been inserted, so
+# with atomic=True one failed partition rolls back all the others. Without atomic, a failed
+# partition is retried row by row like a failed batch of the single connection, so both
+# writers skip the same rows.
+# Limits: the final commits are not a real two-phase commit. If the server drops between
+# two of the N commits, the partitions committed before that stay in the table (each
+# commit is reported to on_commit as it happens, so the checkpoint covers them).
+
+# Bounds and targets of the adaptive batch size and commit interval (<batching> in the config)
+DEFAULT_BATCHING = {
+    "start_rows": 1000,       # first executemany() size
+    "min_rows": 100,
+    "max_rows": 50000,
+    "target_ms": 500,         # wanted duration of one executemany()
+    "commit_seconds": 5.0,    # wanted duration of one transaction, at the measured throughput
+    "max_commit_rows": 100000,
+}
+
+# Adjusts the batch size toward the target latency and the commit interval toward the
+# rows inserted in commit_seconds, within the configured bounds
+class BatchController:
+    def __init__(self, **batching):
+        self.settings = {**DEFAULT_BATCHING, **batching}
+        self.batch_rows = self.clamp(self.settings["start_rows"])
+        self.commit_rows = min(self.batch_rows * 10, self.settings["max_commit_rows"])
+        self.rows_per_second = None
+        self.batch_sizes = []
+        self.batch_seconds = 0.0
+        self.commits = 0
+        self.commit_seconds = 0.0
+
+    def clamp(self, rows):
+        return int(max(self.settings["min_rows"], min(self.settings["max_rows"], rows)))
+
+    def record_batch(self, rows, seconds):
+        self.batch_sizes.append(rows)
+        self.batch_seconds += seconds
+        seconds = max(seconds, 1e-6)
+        throughput = rows / seconds
+        self.rows_per_second = throughput if self.rows_per_second is None else 0.7 * self.rows_per_second + 0.3 * throughput
+        # Move toward the target latency, at most doubling or halving per batch
+        ratio = min(2.0, max(0.5, self.settings["target_ms"] / 1000 / seconds))
+        self.batch_rows = self.clamp(rows * ratio)
+        self.commit_rows = int(max(self.batch_rows, min(self.settings["max_commit_rows"], self.rows_per_second * self.settings["commit_seconds"])))
+
+    def record_commit(self, seconds):
+        self.commits += 1
+        self.commit_seconds += seconds
+
+    def metrics(self):
+        sizes = self.batch_sizes or [0]
+        return {
+            "batches": len(self.batch_sizes),
+            "batch_rows_first": sizes[0],
+            "batch_rows_last": self.batch_rows,
+            "batch_rows_min": min(sizes),
+            "batch_rows_max": max(sizes),
+            "commit_rows": self.commit_rows,
+            "commits": self.commits,
+            "insert_seconds": round(self.batch_seconds, 3),
+            "commit_seconds": round(self.commit_seconds, 3),
+            "rows_per_second": round(self.rows_per_second or 0),
+        }
+
+# Fixed number of connections, opened on first use and shared by the worker threads
+class ConnectionPool:
+    def __init__(self, connect, size):
+        self.connect = connect
+        self.size = size
+        self.idle = queue.Queue()
+        self.opened = []
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            if len(self.opened) < self.size:
+                conn = self.connect()
+                self.opened.append(conn)
+                return conn
+        return self.idle.get()
+
+    def release(self, conn):
+        self.idle.put(conn)
+
+    def close_all(self):
+        for conn in self.opened:
+            try:
+                conn.close()
+            except Exception as e:
+                logging.warning(f"Error closing connection: {e}")
+        self.opened = []
+        self.idle = queue.Queue()
+
+# Rows as plain Python tuples, with NaN/NaT sent as None
+def dataframe_rows(df):
+    return list(df.astype(object).where(df.notna(), None).itertuples(index=False, name=None))
+
+def insert_sql(df, table_name):
+    placeholders = ", ".join(["?"] * len(df.columns))
+    return f"INSERT INTO {table_name} ({', '.join(df.columns)}) VALUES ({placeholders})"
+
+# Contiguous [start, end) row ranges of (almost) equal size
+def split_partitions(row_count, partitions):
+    partitions = max(1, min(partitions, row_count))
+    size = -(-row_count // partitions)
+    return [(start, min(start + size, row_count)) for start in range(0, row_count, size)]
+
+def enable_fast_executemany(cursor):
+    if hasattr(cursor, "fast_executemany"):
+        cursor.fast_executemany = True
+
+# Insert rows with executemany() in adaptive batches, without committing
+def insert_batches(cursor, sql, rows, controller):
+    enable_fast_executemany(cursor)
+    position = 0
+    while position < len(rows):
+        batch = rows[position:position + controller.batch_rows]
+        start = time.perf_counter()
+        cursor.executemany(sql, batch)
+        controller.record_batch(len(batch), time.perf_counter() - start)
+        position += len(batch)
+
+# Insert the rows one by one, skipping (and logging) the ones the database rejects
+def insert_one_by_one(cursor, sql, rows, first):
+    failed = 0
+    for offset, row in enumerate(rows):
+        try:
+            cursor.execute(sql, row)
+        except Exception as e:
+            logging.warning(f"Error on row {first + offset + 1}: {e}")
+            failed += 1
+    return failed
+
+# Single connection: adaptive batches, committed every controller.commit_rows rows. When a
+# batch fails, the open transaction is rolled back and its rows are retried one by one.
+def sequential_insert(conn, df, table_name, controller, on_commit=None):
+    sql = insert_sql(df, table_name)
+    rows = dataframe_rows(df)
+    cursor = conn.cursor()
+    enable_fast_executemany(cursor)
+    committed = 0
+    position = 0
+    failed = 0
+
+    def commit():
+        start = time.perf_counter()
+        conn.commit()
+        controller.record_commit(time.perf_counter() - start)
+
+    try:
+        while position < len(rows):
+            batch = rows[position:position + controller.batch_rows]
+            start = time.perf_counter()
+            retried = False
+            try:
+                cursor.executemany(sql, batch)
+                controller.record_batch(len(batch), time.perf_counter() - start)
+            except Exception as e:
+                logging.warning(f"Error in rows {position + 1}-{position + len(batch)}: {e}. Retrying them one by one")
+                conn.rollback()
+                failed += insert_one_by_one(cursor, sql, rows[committed:position + len(batch)], committed)
+                retried = True
+            position += len(batch)
+            # Commit right after a retry, so a later rollback cannot undo the retried rows
+            if retried or position - committed >= controller.commit_rows or position == len(rows):
+                commit()
+                committed = position
+                if on_commit:
+                    on_commit(committed)
+    finally:
+        cursor.close()
+    return committed - failed
+
+# Insert the DataFrame over `writers` connections. Returns the number of rows committed
+# and the batch metrics of every partition.
+# on_commit(rows) is called after each partition commit with the committed rows counted from
+# the start, up to the first failed partition.
+def parallel_insert(df, table_name, connect, writers, atomic=False, batching=None, on_commit=None):
+    sql = insert_sql(df, table_name)
+    rows = dataframe_rows(df)
+    partitions = split_partitions(len(rows), writers)
+    if not partitions:
+        return 0, []
+    controllers = [BatchController(**(batching or {})) for _ in partitions]
+    pool = ConnectionPool(connect, len(partitions))
+
+    # Each partition holds its connection (and open transaction) until the final commit.
+    # Returns (connection, error, rows skipped by the row by row retry).
+    def insert_partition(bounds, controller):
+        start, end = bounds
+        conn = pool.acquire()
+        cursor = conn.cursor()
+        try:
+            insert_batches(cursor, sql, rows[start:end], controller)
+            return conn, None, 0
+        except Exception as e:
+            if atomic:
+                return conn, e, 0
+            logging.warning(f"Error in rows {start + 1}-{end}: {e}. Retrying them one by one")
+            conn.rollback()
+            return conn, None, insert_one_by_one(cursor, sql, rows[start:end], start)
+        finally:
+            cursor.close()
+
+    begin = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=len(partitions)) as executor:
+            results = list(executor.map(insert_partition, partitions, controllers))
+
+        failed = [(bounds, error) for bounds, (_, error, _) in zip(partitions, results) if error is not None]
+        for (start, end), error in failed:
+            logging.warning(f"Error inserting rows {start + 1}-{end}: {error}")
+        skipped = sum(result[2] for result in results)
+        if skipped:
+            logging.warning(f"{skipped} rows rejected by the database were skipped")
+
+        # on_commit follows each commit, so a commit that fails later (e.g. the server drops)
+        # leaves a checkpoint of the partitions already committed before it
+        committed = 0
+        prefix_committed = True
+        for (start, end), (conn, error, partition_skipped), controller in zip(partitions, results, controllers):
+            if error is None and not (atomic and failed):
+                commit_start = time.perf_counter()
+                conn.commit()
+                controller.record_commit(time.perf_counter() - commit_start)
+                committed += end - start - partition_skipped
+                if on_commit and prefix_committed:
+                    on_commit(end)
+            else:
+                conn.rollback()
+                prefix_committed = False
+        if atomic and failed:
+            logging.error(f"{len(failed)}/{len(partitions)} partitions failed, all {len(partitions)} rolled back")
+        logging.info(f"{committed}/{len(rows)} rows inserted into '{table_name}' with {len(partitions)} connections "
+                     f"in {time.perf_counter() - begin:.1f}s")
+        return committed, [controller.metrics() for controller in controllers]
+    finally:
+        pool.close_all()
@@ -0,0 +1,71 @@
+import logging
+
+import pytest
+
+import novo
+from tests.memory_database import MemoryDatabase
+
+# Columns of the test table: NIF, Projeto and Valor in the source, plus the import time
+COLUMNS = """
+<column name="NIF" type="NVARCHAR(20)" source_name="NIF" path="nif" xpath="./ns:NIF"/>
+<column name="Projeto" type="NVARCHAR(5)" source_name="Projeto" path="projeto" xpath="./ns:Projeto"/>
+<column name="Valor" type="INT" source_name="Valor" path="valor" xpath="./ns:Valor"/>
+<column name="Data_Hora" type="DATETIME" source_name="Data_Hora" default=""/>
+"""
+
+SOURCES = {
+    "xml": '<xml><namespace uri="urn:test"/><root_path>.//ns:Linha</root_path><file_path>{path}</file_path></xml>',
+    "csv": "<csv><file_path>{path}</file_path></csv>",
+    "json": "<json><file_path>{path}</file_path></json>",
+    "excel": "<excel><file_path>{path}</file_path></excel>",
+}
+
+@pytest.fixture(autouse=True)
+def quiet_logs():
+    logging.getLogger().setLevel(logging.WARNING)
+
+# In-memory database behind novo.connect_to_sql
+@pytest.fixture
+def db(monkeypatch):
+    database = MemoryDatabase()
+    monkeypatch.setattr(novo, "connect_to_sql", lambda config: database.connect())
+    return database
+
+# Rows of the test table without Data_Hora, its last column
+@pytest.fixture
+def table_rows(db):
+    return lambda: [row[:3] for row in db.rows("T")]
+
+# load_config of a config written to tmp_path, with the checkpoint and reject logs in tmp_path.
+# database: extra elements of <database>
+@pytest.fixture
+def make_config(tmp_path):
+    def make(source, kind, database=""):
+        path = tmp_path / f"{kind}_config.xml"
+        path.write_text(f"<config><database><server>test</server><port>1</port><database_name>test</database_name>{database}"
+                        f'<table name="T"><columns>{COLUMNS}</columns></table></database>'
+                        f"{SOURCES[kind].format(path=source)}</config>", encoding="utf-8")
+        config = novo.load_config(str(path))
+        config["checkpoint_file"] = str(tmp_path / "checkpoints.jsonl")
+        config["reject_file"] = str(tmp_path / "rejects.jsonl")
+        return config
+    return make
+
+# XML source with the given (NIF, Projeto, Valor) rows, one <Linha> each
+@pytest.fixture
+def write_xml(tmp_path):
+    def write(rows, name="dados.xml"):
+        path = tmp_path / name
+        lines = "".join(f"<Linha><NIF>{nif}</NIF><Projeto>{projeto}</Projeto><Valor>{valor}</Valor></Linha>" for nif, projeto, valor in rows)
+        path.write_text(f'<?xml version="1.0" encoding="UTF-8"?><Documento xmlns="urn:test">{lines}</Documento>', encoding="utf-8")
+        return str(path)
+    return write
+
+# CSV source with the given (NIF, Projeto, Valor) rows
+@pytest.fixture
+def write_csv(tmp_path):
+    def write(rows, name="dados.csv"):
+        path = tmp_path / name
+        path.write_text("NIF,Projeto,Valor\n" + "".join(f"{nif},{projeto},{valor}\n" for nif, projeto, valor in rows), encoding="utf-8")
+        return str(path)
+    return write
@@ -0,0 +1,137 @@
+import re
+import threading
+import time
+
+# Thread-safe stand-in for a database, to test and benchmark the writer without a server.
+# Each connection stages its statements until commit(); `latency` simulates the round trip
+# of one execute/executemany call and `row_latency` the cost of each row it sends.
+# Understands the statements the writers send: INSERT INTO t (a, b) VALUES (?, ?),
+# DELETE FROM t WHERE a = ? AND b IS NULL, UPDATE t SET a = ? WHERE b = ?.
+class MemoryDatabase:
+    def __init__(self, latency=0.0, fail_on=None, row_latency=0.0):
+        self.latency = latency
+        self.row_latency = row_latency
+        self.fail_on = fail_on
+        self.tables = {}
+        self.columns = {}
+        self.lock = threading.Lock()
+        self.connections = 0
+
+    def connect(self):
+        with self.lock:
+            self.connections += 1
+        return MemoryConnection(self)
+
+    def rows(self, table_name):
+        return list(self.tables.get(table_name, []))
+
+    # Apply staged statements (called with the lock held). Consecutive rows of the same
+    # DELETE/UPDATE statement are applied in one pass over the table.
+    def apply(self, statements):
+        position = 0
+        while position < len(statements):
+            verb, table_name, columns, conditions, params = statements[position]
+            rows = self.tables.setdefault(table_name, [])
+            if verb == "INSERT":
+                self.columns.setdefault(table_name, columns)
+                rows.append(tuple(params))
+                position += 1
+                continue
+            end = position
+            while end < len(statements) and statements[end][:4] == statements[position][:4]:
+                end += 1
+            names = self.columns.get(table_name, [])
+            assigned = [names.index(name) for name in columns]
+            compared = [names.index(name) for name, is_null in conditions if not is_null]
+            null = [names.index(name) for name, is_null in conditions if is_null]
+            targets = {tuple(statement[4][len(columns):]): statement[4][:len(columns)] for statement in statements[position:end]}
+            kept = []
+            for row in rows:
+                key = tuple(row[i] for i in compared)
+                if key not in targets or any(row[i] is not None for i in null):
+                    kept.append(row)
+                elif verb == "UPDATE":
+                    updated = list(row)
+                    for i, value in zip(assigned, targets[key]):
+                        updated[i] = value
+                    kept.append(tuple(updated))
+            self.tables[table_name] = kept
+            position = end
+
+class MemoryConnection:
+    def __init__(self, database):
+        self.database = database
+        self.pending = []
+
+    def cursor(self):
+        return MemoryCursor(self)
+
+    def commit(self):
+        with self.database.lock:
+            self.database.apply(self.pending)
+        self.pending = []
+
+    def rollback(self):
+        self.pending = []
+
+    def close(self):
+        self.pending = []
+
+# "a = ? AND b IS NULL" -> [("a", False), ("b", True)]
+def parse_conditions(where):
+    conditions = []
+    for condition in re.split(r"\s+AND\s+", where.strip(), flags=re.IGNORECASE):
+        name, _, rest = condition.strip().partition(" ")
+        conditions.append((name, rest.strip().upper() == "IS NULL"))
+    return conditions
+
+class MemoryCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.results = []
+
+    # SELECT col, ... FROM table (committed rows only) or a write statement
+    def execute(self, sql, params=()):
+        select = re.match(r"SELECT (.*?) FROM (\S+)$", " ".join(sql.split()), re.IGNORECASE)
+        if not select:
+            self.executemany(sql, [params])
+            return
+        database = self.connection.database
+        time.sleep(database.latency)
+        with database.lock:
+            columns = database.columns.get(select.group(2), [])
+            positions = [columns.index(name.strip()) for name in select.group(1).split(",")]
+            self.results = [tuple(row[i] for i in positions) for row in database.tables.get(select.group(2), [])]
+
+    def fetchmany(self, size=1):
+        rows, self.results = self.results[:size], self.results[size:]
+        return rows
+
+    def fetchall(self):
+        rows, self.results = self.results, []
+        return rows
+
+    def executemany(self, sql, seq_of_params):
+        database = self.connection.database
+        time.sleep(database.latency + database.row_latency * len(seq_of_params))
+        sql = " ".join(sql.split())
+        insert = re.match(r"INSERT INTO (\S+) \((.*?)\) VALUES", sql, re.IGNORECASE)
+        delete = re.match(r"DELETE FROM (\S+) WHERE (.*)", sql, re.IGNORECASE)
+        update = re.match(r"UPDATE (\S+) SET (.*?) WHERE (.*)", sql, re.IGNORECASE)
+        if insert:
+            statement = ("INSERT", insert.group(1), [name.strip() for name in insert.group(2).split(",")], [])
+        elif delete:
+            statement = ("DELETE", delete.group(1), [], parse_conditions(delete.group(2)))
+        elif update:
+            assignments = [assignment.split("=")[0].strip() for assignment in update.group(2).split(",")]
+            statement = ("UPDATE", update.group(1), assignments, parse_conditions(update.group(3)))
+        else:
+            return
+        for params in seq_of_params:
+            fail_on = self.connection.database.fail_on
+            if fail_on is not None and fail_on(params):
+                raise ValueError(f"Rejected row {params}")
+            self.connection.pending.append((*statement, tuple(params)))
+
+    def close(self):
+        pass
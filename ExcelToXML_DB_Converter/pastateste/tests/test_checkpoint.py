@@ -0,0 +1,113 @@
+import functools
+
+import pytest
+
+import novo
+from checkpoint import CheckpointLog, checkpoint_key
+from tests.memory_database import MemoryConnection
+
+ROWS = [(f"N{i}", f"P{i % 7}", i) for i in range(3000)]
+BATCHING = {"start_rows": 100, "min_rows": 100, "max_rows": 100, "max_commit_rows": 100}
+
+def test_resume_offset(tmp_path):
+    log = CheckpointLog(str(tmp_path / "checkpoints.jsonl"))
+    assert log.resume_offset("k", "f1") == 0
+    log.record("k", "f1", 100, 300)
+    log.record("other", "f1", 5)
+    log.record("k", "f1", 200, 300)
+    assert log.resume_offset("k", "f1") == 200
+    # A different file starts again from the first row
+    assert log.resume_offset("k", "f2") == 0
+
+# A line cut by a crash is ignored
+def test_last_skips_cut_line(tmp_path):
+    path = tmp_path / "checkpoints.jsonl"
+    log = CheckpointLog(str(path))
+    log.record("k", "f", 100)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"key": "k", "finger')
+    assert log.last("k")["committed_rows"] == 100
+
+# Stop the import (like a crash) after the given number of checkpoints
+def crash_after(monkeypatch, records):
+    original = CheckpointLog.record
+    calls = []
+
+    def record(self, *args, **kwargs):
+        original(self, *args, **kwargs)
+        calls.append(args)
+        if len(calls) == records:
+            raise KeyboardInterrupt
+    monkeypatch.setattr(CheckpointLog, "record", record)
+
+def test_resume_after_crash(monkeypatch, make_config, write_xml, db, table_rows):
+    config = make_config(write_xml(ROWS), "xml")
+    config["batching"] = BATCHING
+    with monkeypatch.context() as patch:
+        crash_after(patch, 3)
+        with pytest.raises(KeyboardInterrupt):
+            novo.process_config(config)
+    assert len(db.rows("T")) == 300
+
+    metrics = novo.process_config({**config, "resume": True})
+    assert metrics["skipped"] == 300
+    assert table_rows() == ROWS
+    entry = CheckpointLog(config["checkpoint_file"]).last(checkpoint_key(config))
+    assert entry["committed_rows"] == entry["total_rows"] == len(ROWS)
+
+    # Nothing left to import
+    metrics = novo.process_config({**config, "resume": True})
+    assert metrics["inserted"] == 0
+    assert len(db.rows("T")) == len(ROWS)
+
+def test_changed_file_is_not_resumed(make_config, write_xml, db, table_rows):
+    config = make_config(write_xml(ROWS[:100]), "xml")
+    CheckpointLog(config["checkpoint_file"]).record(checkpoint_key(config), "another file", 50, 100)
+    metrics = novo.process_config({**config, "resume": True})
+    assert metrics["skipped"] == 0
+    assert table_rows() == ROWS[:100]
+
+# The reader skips the committed records before building the rows
+def test_xml_skip_records(make_config, write_xml):
+    config = make_config(write_xml(ROWS), "xml")
+    df = novo.parse_xml_to_dataframe(config, skip_records=2990)
+    assert df["NIF"].tolist() == [f"N{i}" for i in range(2990, 3000)]
+
+# With several writers a failed commit leaves a checkpoint of the partitions before it
+@pytest.mark.parametrize("failed_commit", [2, 3])
+def test_parallel_resume_after_failed_commit(monkeypatch, make_config, write_xml, db, table_rows, failed_commit):
+    config = make_config(write_xml(ROWS), "xml")
+    config["writers"] = 3
+    original = MemoryConnection.commit
+    calls = []
+
+    # The first commit creates the table
+    def commit(self):
+        calls.append(self)
+        if len(calls) == failed_commit + 1:
+            raise ConnectionError("server gone")
+        original(self)
+    with monkeypatch.context() as patch:
+        patch.setattr(MemoryConnection, "commit", commit)
+        with pytest.raises(ConnectionError):
+            novo.process_config(config)
+    assert len(db.rows("T")) == (failed_commit - 1) * 1000
+
+    novo.process_config({**config, "resume": True})
+    assert sorted(table_rows()) == sorted(ROWS)
+
+# CSV sources are committed chunk by chunk
+@pytest.mark.parametrize("chunk_size", [500, 100000])
+def test_csv_resume_after_crash(monkeypatch, make_config, write_csv, db, table_rows, chunk_size):
+    monkeypatch.setattr(novo, "iter_csv_chunks", functools.partial(novo.iter_csv_chunks, chunk_size=chunk_size))
+    config = make_config(write_csv(ROWS), "csv")
+    config["batching"] = BATCHING
+    with monkeypatch.context() as patch:
+        crash_after(patch, 3)
+        with pytest.raises(KeyboardInterrupt):
+            novo.process_config(config)
+    assert len(db.rows("T")) == 300
+
+    metrics = novo.process_config({**config, "resume": True})
+    assert metrics["skipped"] == 300
+    assert table_rows() == ROWS
@@ -0,0 +1,78 @@
+import gzip
+import xml.etree.ElementTree as ET
+import zipfile
+
+import openpyxl
+import pandas as pd
+import pytest
+
+import converter
+import novo
+
+ROWS = [(f"N{i}", f"P{i % 3}", i) for i in range(11)]
+
+def csv_rows(path):
+    df = pd.read_csv(path, dtype=str)
+    return [(nif, projeto, int(valor)) for nif, projeto, valor in df[["NIF", "Projeto", "Valor"]].itertuples(index=False)]
+
+@pytest.mark.parametrize("name, element", [
+    ("Valor", "Valor"),
+    ("[Valor Total]", "Valor_Total"),
+    ("[2024-01]", "_2024-01"),
+    ("Nº Conta", "No_Conta"),
+    ("Total (€)", "Total____"),
+    ("Região", "Região"),
+    ("Preço ș", "Preço_s"),
+    ("金額", "__"),
+    ("a:b", "a_b"),
+])
+def test_xml_name(name, element):
+    assert converter.xml_name(name) == element
+    assert ET.fromstring(f"<{element}/>").tag == element
+
+# Every name the converter writes can be read back by ElementTree (expat)
+def test_xml_names_parse():
+    for code in range(0x20, 0x3000):
+        element = converter.xml_name(f"a{chr(code)}")
+        assert ET.fromstring(f"<{element}/>").tag == element
+
+def test_xml_output(tmp_path, make_config, write_csv):
+    config = make_config(write_csv(ROWS), "csv")
+    config["table_name"] = "[Tabela 1]"
+    config["columns"][0]["name"] = "Nº NIF"
+    output = tmp_path / "saida.xml"
+    assert converter.convert_config(config, str(output)) == len(ROWS)
+    root = ET.parse(output).getroot()
+    assert root.tag == "Tabela_1"
+    assert [[child.tag for child in row][:3] for row in root][0] == ["No_NIF", "Projeto", "Valor"]
+    assert [(row[0].text, row[1].text, int(row[2].text)) for row in root] == ROWS
+
+# The converter takes the same compressed sources as the import; zip members go one after the other
+def test_compressed_sources(tmp_path, make_config, write_csv, write_xml):
+    path = write_csv(ROWS)
+    with zipfile.ZipFile(tmp_path / "dados.zip", "w") as archive:
+        archive.write(path, "a.csv")
+        archive.write(path, "b.csv")
+        archive.writestr("leia-me.md", "x")
+    output = tmp_path / "saida.csv"
+    assert converter.convert_config(make_config(str(tmp_path / "dados.zip"), "csv"), str(output)) == 2 * len(ROWS)
+    assert csv_rows(output) == ROWS + ROWS
+
+    xml_path = write_xml(ROWS)
+    with open(xml_path, "rb") as f, gzip.open(xml_path + ".gz", "wb") as compressed:
+        compressed.write(f.read())
+    assert converter.convert_config(make_config(xml_path + ".gz", "xml"), str(output)) == len(ROWS)
+    assert csv_rows(output) == ROWS
+
+# The sheet is streamed, not read whole
+def test_excel(monkeypatch, tmp_path, make_config):
+    monkeypatch.setattr(converter, "CONVERT_CHUNK_ROWS", 4)
+    monkeypatch.setattr(novo, "read_excel_mapped", None)
+    workbook = openpyxl.Workbook()
+    workbook.active.append(["NIF", "Projeto", "Valor"])
+    for row in ROWS:
+        workbook.active.append(row)
+    workbook.save(tmp_path / "dados.xlsx")
+    output = tmp_path / "saida.csv"
+    assert converter.convert_config(make_config(str(tmp_path / "dados.xlsx"), "excel"), str(output)) == len(ROWS)
+    assert csv_rows(output) == ROWS
@@ -0,0 +1,21 @@
+from datetime import datetime
+
+import pandas as pd
+
+import novo
+
+def cast(values, **col):
+    config = {"columns": [{"name": "Data", "type": "DATE", **col}]}
+    df = novo.clean_and_cast_dataframe(pd.DataFrame({"Data": pd.Series(values, dtype=object)}), config)
+    return df["Data"].tolist()
+
+def test_format():
+    got = cast(["01/03/2024", " 02/03/2024 ", "01/03/2024", "2024-03-01", None], format="%d/%m/%Y")
+    assert got[:3] == [pd.Timestamp(2024, 3, 1), pd.Timestamp(2024, 3, 2), pd.Timestamp(2024, 3, 1)]
+    assert pd.isna(got[3]) and pd.isna(got[4])
+
+# Typed Excel cells give dates and text in the same column; the dates are kept as they are
+def test_native_dates_with_format():
+    values = [datetime(2024, 3, 1), pd.Timestamp(2024, 3, 5, 10, 30), "07/03/2024", None]
+    got = cast(values, format="%d/%m/%Y", default="01/01/2000")
+    assert got == [pd.Timestamp(2024, 3, 1), pd.Timestamp(2024, 3, 5, 10, 30), pd.Timestamp(2024, 3, 7), pd.Timestamp(2000, 1, 1)]
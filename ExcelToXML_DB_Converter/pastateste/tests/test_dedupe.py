@@ -0,0 +1,67 @@
+import functools
+import json
+import random
+
+import pandas as pd
+import pytest
+
+import novo
+from checkpoint import CheckpointLog
+
+random.seed(1)
+ROWS = [(f"N{random.randint(0, 60)}", random.choice(["A", "B"]), i) for i in range(500)]
+KEY = ["NIF", "Projeto"]
+
+def expected(keep):
+    df = pd.DataFrame(ROWS, columns=["NIF", "Projeto", "Valor"])
+    duplicated = df.duplicated(KEY, keep=keep if keep != "reject" else False)
+    return [tuple(row) for row in df[~duplicated].itertuples(index=False)]
+
+def dedupe_config(make_config, write_csv, keep):
+    config = make_config(write_csv(ROWS), "csv", database=f'<dedupe keep="{keep}" columns="NIF,Projeto"/>')
+    assert (config["dedupe"], config["dedupe_columns"]) == (keep, KEY)
+    return config
+
+def reject_lines(config):
+    with open(config["reject_file"], encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+@pytest.mark.parametrize("chunk_size", [37, 100000])
+@pytest.mark.parametrize("keep", ["first", "last", "reject"])
+def test_dedupe(monkeypatch, make_config, write_csv, db, table_rows, keep, chunk_size):
+    monkeypatch.setattr(novo, "iter_csv_chunks", functools.partial(novo.iter_csv_chunks, chunk_size=chunk_size))
+    config = dedupe_config(make_config, write_csv, keep)
+    metrics = novo.process_config(config)
+    assert table_rows() == expected(keep)
+    if keep == "reject":
+        lines = reject_lines(config)
+        assert len(lines) == metrics["rejected"] == len(ROWS) - len(expected(keep))
+        assert {line["reason"] for line in lines} == {"duplicate key (NIF, Projeto)"}
+        # record: position of the row in the source, from 1
+        assert all(ROWS[line["record"] - 1][0] == line["values"]["NIF"] for line in lines)
+
+@pytest.mark.parametrize("keep", ["first", "last", "reject"])
+def test_dedupe_resume(monkeypatch, make_config, write_csv, db, table_rows, keep):
+    monkeypatch.setattr(novo, "iter_csv_chunks", functools.partial(novo.iter_csv_chunks, chunk_size=37))
+    config = dedupe_config(make_config, write_csv, keep)
+    original = CheckpointLog.record
+    calls = []
+
+    def record(self, *args, **kwargs):
+        original(self, *args, **kwargs)
+        calls.append(args)
+        if len(calls) == 2:
+            raise KeyboardInterrupt
+    with monkeypatch.context() as patch:
+        patch.setattr(CheckpointLog, "record", record)
+        with pytest.raises(KeyboardInterrupt):
+            novo.process_config(config)
+    novo.process_config({**config, "resume": True})
+    assert table_rows() == expected(keep)
+
+# Without dedupe columns or key columns the whole row is compared
+def test_dedupe_whole_rows(make_config, write_csv, db, table_rows):
+    rows = [("A", "P1", 1), ("A", "P1", 1), ("A", "P1", 2)]
+    config = make_config(write_csv(rows), "csv", database='<dedupe keep="first"/>')
+    novo.process_config(config)
+    assert table_rows() == [("A", "P1", 1), ("A", "P1", 2)]
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import novo
+from delta import Snapshot, diff_snapshots, hash_frame
+
+def snapshot(rows):
+    return Snapshot.from_frame(pd.DataFrame(rows, columns=["NIF", "Projeto", "Valor"]), ["NIF"])
+
+def test_diff_counts():
+    old = snapshot([("A", "P1", 1), ("B", "P1", 2), ("C", "P1", 3)])
+    new = snapshot([("A", "P1", 1), ("B", "P2", 2), ("D", "P1", 4)])
+    changes = diff_snapshots(old, new)
+    assert {key: changes[key] for key in ("inserted", "updated", "deleted", "unchanged")} == \
+        {"inserted": 1, "updated": 1, "deleted": 1, "unchanged": 1}
+    assert changes["insert_rows"].tolist() == [2]
+    assert changes["update_rows"].tolist() == [1]
+    assert changes["delete_rows"].tolist() == [2]
+
+def test_diff_ignores_row_order():
+    rows = [("A", "P1", 1), ("B", "P1", 2), ("C", "P1", 3)]
+    changes = diff_snapshots(snapshot(rows), snapshot(rows[::-1]))
+    assert changes["unchanged"] == 3
+    assert len(changes["insert_rows"]) == len(changes["update_rows"]) == len(changes["delete_rows"]) == 0
+
+# A key with several rows is deleted and inserted again as a group
+def test_diff_replaces_changed_group():
+    old = snapshot([("A", "P1", 1), ("A", "P2", 2), ("B", "P1", 3)])
+    new = snapshot([("A", "P2", 2), ("A", "P1", 5), ("B", "P1", 3)])
+    changes = diff_snapshots(old, new)
+    assert changes["insert_rows"].tolist() == [0, 1]
+    assert changes["delete_rows"].tolist() == [0]
+    assert (changes["updated"], changes["unchanged"]) == (2, 1)
+
+def test_hash_ignores_numeric_dtype():
+    ints = pd.DataFrame({"Valor": pd.Series([1, 2], dtype="int64")})
+    floats = pd.DataFrame({"Valor": pd.Series([1.0, 2.0], dtype="float64")})
+    assert np.array_equal(hash_frame(ints), hash_frame(floats))
+
+def test_snapshot_roundtrip(tmp_path):
+    original = Snapshot.from_frame(pd.DataFrame({"NIF": ["A", None], "Valor": [1, 2]}), ["NIF"])
+    path = str(tmp_path / "snapshot.npz")
+    original.save(path)
+    loaded = Snapshot.load(path, ["NIF"])
+    assert np.array_equal(loaded.key_hash, original.key_hash)
+    assert np.array_equal(loaded.row_hash, original.row_hash)
+    assert loaded.keys["NIF"].tolist() == ["A", None]
+    with pytest.raises(ValueError):
+        Snapshot.load(path, ["Valor"])
+
+# Imports of successive files leave the table equal to the last one
+def test_delta_import(make_config, write_xml, db, table_rows, tmp_path):
+    def run(rows):
+        config = make_config(write_xml(rows), "xml")
+        config["columns"][0]["key"] = True
+        config["delta"] = True
+        config["snapshot_dir"] = str(tmp_path / "snapshots")
+        return novo.process_config(config)
+
+    first = [(f"N{i}", "P1", i) for i in range(100)]
+    metrics = run(first)
+    assert (metrics["inserted"], metrics["updated"], metrics["deleted"]) == (100, 0, 0)
+    assert sorted(table_rows()) == sorted(first)
+
+    second = [(nif, "P2" if valor % 10 == 0 else projeto, valor) for nif, projeto, valor in first[5:]] + [("N100", "P1", 100)]
+    metrics = run(second)
+    assert (metrics["inserted"], metrics["updated"], metrics["deleted"], metrics["unchanged"]) == (1, 9, 5, 86)
+    assert sorted(table_rows()) == sorted(second)
+
+    metrics = run(second)
+    assert (metrics["inserted"], metrics["updated"], metrics["deleted"], metrics["unchanged"]) == (0, 0, 0, 96)
+    assert sorted(table_rows()) == sorted(second)
+
+def test_delta_needs_key_columns(make_config, write_xml, db):
+    config = make_config(write_xml([("A", "P1", 1)]), "xml")
+    config["delta"] = True
+    with pytest.raises(ValueError, match="key columns"):
+        novo.process_config(config)
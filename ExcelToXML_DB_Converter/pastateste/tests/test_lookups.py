@@ -0,0 +1,80 @@
+import json
+import threading
+
+import pandas as pd
+
+import lookups
+import novo
+
+ROWS = [(f"N{i}", f"P{i % 3}", i) for i in range(10)]
+
+def lookup_config(make_config, write_csv, kind="csv"):
+    config = make_config(write_csv(ROWS), kind)
+    config["columns"][0].update(lookup="Colaboradores", lookup_key="NIF", lookup_value="ID")
+    return config
+
+def test_resolve():
+    index = lookups.LookupIndex("T.K", [" a ", "B", 12.0, "a", None], [1, 2, 3, 4, 5])
+    values, unmatched = index.resolve(pd.Series(["A", "b ", "12", "x", None, ""], dtype=object))
+    assert values.tolist()[:3] == [1, 2, 3]
+    assert unmatched.tolist() == [False, False, False, True, False, False]
+
+# Values missing from the reference table are written to the reject log, the rest imported
+def test_lookup_miss_is_rejected(make_config, write_csv, db, table_rows):
+    db.tables["Colaboradores"] = [(f"n{i}", f"ID{i}") for i in range(0, 10, 2)]
+    db.columns["Colaboradores"] = ["NIF", "ID"]
+    config = lookup_config(make_config, write_csv)
+    metrics = novo.process_config(config)
+    assert table_rows() == [(f"ID{i}", projeto, valor) for i, (_, projeto, valor) in enumerate(ROWS) if i % 2 == 0]
+    with open(config["reject_file"], encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f]
+    assert metrics["rejected"] == len(lines) == 5
+    assert [line["record"] for line in lines] == [2, 4, 6, 8, 10]
+    assert lines[0]["reason"] == "NIF: 'N1' not in Colaboradores.NIF"
+    assert lines[0]["values"]["NIF"] == "N1"
+
+# Tables read by the connections of a test; loading A waits until B starts loading
+class Loads(list):
+    def __init__(self):
+        super().__init__()
+        self.b_started = threading.Event()
+        self.b_while_a = False
+
+class SlowConnection:
+    def __init__(self, loads):
+        self.loads = loads
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql):
+        self.table = sql.split()[-1]
+        self.rows = [("k", self.table)]
+        self.loads.append(self.table)
+        if self.table == "A":
+            self.loads.b_while_a = self.loads.b_started.wait(timeout=5)
+        else:
+            self.loads.b_started.set()
+
+    def fetchmany(self, size):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def close(self):
+        pass
+
+# Different tables load at the same time; the same table is loaded once
+def test_tables_load_in_parallel():
+    cache = lookups.LookupCache()
+    loads = Loads()
+    columns = {name: {"lookup": name, "lookup_key": "K", "lookup_value": "V"} for name in "AB"}
+    results = []
+    threads = [threading.Thread(target=lambda name=name: results.append(cache.get({}, columns[name], lambda: SlowConnection(loads))))
+               for name in "AAB"]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert loads.b_while_a
+    assert sorted(loads) == ["A", "B"]
+    assert cache.stats() == {"tables": 2, "loads": 2, "hits": 1}
@@ -0,0 +1,82 @@
+import math
+
+import pandas as pd
+import pytest
+
+import novo
+
+PT = novo.number_separators({"locale": "pt"})
+EN = novo.number_separators({"locale": "en_US"})
+FR = novo.number_separators({"locale": "fr"})
+
+def parse(values, separators):
+    return novo.parse_localized_numbers(values, separators["decimal_sep"], separators["thousands_sep"]).tolist()
+
+def same(got, expected):
+    return all((math.isnan(a) and b is None) or a == b for a, b in zip(got, expected)) and len(got) == len(expected)
+
+def test_number_separators():
+    assert PT == {"decimal_sep": ",", "thousands_sep": "."}
+    assert EN == {"decimal_sep": ".", "thousands_sep": ","}
+    assert novo.number_separators({"locale": "pt-BR"}) == PT
+    assert novo.number_separators({"decimal_sep": ","}) == PT
+    assert novo.number_separators({}) == {"decimal_sep": None, "thousands_sep": None}
+    with pytest.raises(ValueError):
+        novo.number_separators({"locale": "xx"})
+
+@pytest.mark.parametrize("text, expected", [
+    ("1.234,56", 1234.56),
+    ("1234,56", 1234.56),
+    ("12", 12.0),
+    ("-12,5", -12.5),
+    ("12,50-", -12.5),
+    ("(1.234,56)", -1234.56),
+    ("€ 12,50", 12.5),
+    ("12,50 €", 12.5),
+    ("(€ 5)", -5.0),
+    ("  7,25  ", 7.25),
+    ("1.234.567", 1234567.0),
+    ("0,1", 0.1),
+    (",5", 0.5),
+])
+def test_pt_amounts(text, expected):
+    assert parse([text], PT) == [expected]
+
+# Text that is not an amount is NaN, so the column default applies
+@pytest.mark.parametrize("text", ["abc", "", "€", "12,3,4"])
+def test_pt_not_numbers(text):
+    assert math.isnan(parse([text], PT)[0])
+
+def test_other_locales():
+    assert parse(["1,234.56", "(12.5)"], EN) == [1234.56, -12.5]
+    assert parse(["1 234,56", "1\u00a0234,56", "1\u202f234"], FR) == [1234.56, 1234.56, 1234.0]
+
+# Mantissas beyond 15 digits are parsed with string ops
+def test_long_numbers():
+    assert parse(["1.234.567.890.123.456,78", "-12345678901234567"], PT) == [1234567890123456.78, -12345678901234567.0]
+
+# More rows than one block of the character matrix
+def test_blocks(monkeypatch):
+    monkeypatch.setattr(novo, "NUMBER_BLOCK_ROWS", 3)
+    values = [f"{i},5" for i in range(10)] + ["x"]
+    assert same(parse(values, PT), [i + 0.5 for i in range(10)] + [None])
+
+# Numbers that are already numbers are kept, text goes through the locale parse
+def test_to_numbers_mixed():
+    col = {"decimal_sep": ",", "thousands_sep": "."}
+    numbers = novo.to_numbers(pd.Series([1.5, 2, "3,5", "x", None], dtype=object), col)
+    assert same(numbers.tolist(), [1.5, 2.0, 3.5, None, None])
+
+# Dates, codes and text around a number are not amounts, nor are misplaced separators
+@pytest.mark.parametrize("text", [
+    "N/A 2024", "12/03/2024", "1e5", "12-3", "TOTAL: 100,00 (2 itens)", "12.5", "1.2345", "1..234",
+    "--5", "(5", "1.23,4",
+])
+def test_pt_rejects(text):
+    assert math.isnan(parse([text], PT)[0])
+
+# Thousands separators must be in groups of three
+def test_thousands_grouping():
+    assert parse(["1.234.567"], PT) == [1234567.0]
+    assert all(math.isnan(value) for value in parse(["1.23.456", "12.34"], PT))
+    assert math.isnan(parse(["1,23.4"], EN)[0])
@@ -0,0 +1,52 @@
+import io
+import xml.etree.ElementTree as ET
+
+import openpyxl
+import pytest
+
+import novo
+import pain001_export
+
+NS = {"ns": pain001_export.PAIN001_NAMESPACE}
+ROWS = [(f"Pessoa {i}", round(10 + i * 1.25, 2)) for i in range(7)]
+
+def export_config():
+    return {
+        "columns": [
+            {"name": "Nome", "type": "NVARCHAR(70)", "xpath": "./ns:Cdtr/ns:Nm", "default": ""},
+            {"name": "Valor", "type": "DECIMAL(18,2)", "xpath": "./ns:Amt/ns:InstdAmt", "default": "0"},
+        ],
+        "export_values": {"PmtInf/Dbtr/Nm": "Empresa", "PmtInf/DbtrAcct/Id/IBAN": "PT50000000000000000000001",
+                          "PmtInf/DbtrAgt/FinInstnId/BIC": "BCOMPTPL"},
+    }
+
+def write_sheet(path):
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(["Relatório"])
+    sheet.append(["Nome", "Valor"])
+    for row in ROWS:
+        sheet.append(row)
+    workbook.save(path)
+    return str(path)
+
+# The sheet is streamed in chunks and the totals are filled in at the end
+def test_export_from_excel(monkeypatch, tmp_path):
+    monkeypatch.setattr(pain001_export, "EXPORT_CHUNK_ROWS", 3)
+    monkeypatch.setattr(novo, "read_excel_mapped", None)
+    output = tmp_path / "pain.xml"
+    assert pain001_export.export_pain001(export_config(), str(output), excel_file=write_sheet(tmp_path / "dados.xlsx")) == len(ROWS)
+    root = ET.parse(output).getroot()
+    names = [elem.text for elem in root.findall(".//ns:CdtTrfTxInf/ns:Cdtr/ns:Nm", NS)]
+    amounts = [float(elem.text) for elem in root.findall(".//ns:CdtTrfTxInf/ns:Amt/ns:InstdAmt", NS)]
+    assert list(zip(names, amounts)) == ROWS
+    assert root.find(".//ns:GrpHdr/ns:NbOfTxs", NS).text == str(len(ROWS))
+    assert root.find(".//ns:GrpHdr/ns:CtrlSum", NS).text == f"{sum(amount for _, amount in ROWS):.2f}"
+
+class Pipe(io.BytesIO):
+    def seekable(self):
+        return False
+
+def test_output_must_be_seekable():
+    with pytest.raises(ValueError):
+        pain001_export.Pain001Writer(Pipe(), export_config())
@@ -0,0 +1,96 @@
+import threading
+import time
+
+import pytest
+
+import novo
+import scheduler
+
+def make_jobs(**depends_on):
+    return {name: scheduler.Job(name, f"{name}.xml", [], target=name, depends_on=list(dependencies), retry_delay=0.01)
+            for name, dependencies in depends_on.items()}
+
+# Records the start and end of every job, and how many run at the same time
+class Recorder:
+    def __init__(self, seconds=0.02, failures=None):
+        self.seconds = seconds
+        self.failures = dict(failures or {})
+        self.events = []
+        self.running = 0
+        self.most_running = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, job):
+        with self.lock:
+            self.events.append(("start", job.name))
+            self.running += 1
+            self.most_running = max(self.most_running, self.running)
+        time.sleep(self.seconds)
+        with self.lock:
+            self.running -= 1
+            self.events.append(("end", job.name))
+            if self.failures.get(job.name):
+                self.failures[job.name] -= 1
+                raise RuntimeError(f"{job.name} failed")
+        return 1
+
+    def position(self, event, name):
+        return self.events.index((event, name))
+
+def test_dependency_order():
+    jobs = make_jobs(a=[], b=["a"], c=["a"], d=["b", "c"], e=[])
+    run = Recorder()
+    report = scheduler.run_manifest(jobs, {}, workers=4, run=run)
+    assert all(job["status"] == "done" for job in report["jobs"])
+    for job in jobs.values():
+        for dependency in job.depends_on:
+            assert run.position("end", dependency) < run.position("start", job.name)
+    # b and c only need a, so they run together
+    assert run.most_running >= 2
+    assert report["critical_path"][0] == "a" and report["critical_path"][-1] == "d"
+
+@pytest.mark.parametrize("limit", [1, 2])
+def test_target_concurrency(limit):
+    jobs = {name: scheduler.Job(name, "t.xml", [], target="T", depends_on=[]) for name in "abcd"}
+    run = Recorder()
+    scheduler.run_manifest(jobs, {"T": limit}, workers=4, run=run)
+    assert run.most_running == limit
+
+def test_retries_and_skipped_dependents():
+    jobs = make_jobs(a=[], b=["a"], c=[], d=["c"])
+    jobs["a"].retries = 1
+    run = Recorder(failures={"a": 1, "c": 1})
+    report = {job["name"]: job for job in scheduler.run_manifest(jobs, {}, workers=2, run=run)["jobs"]}
+    assert (report["a"]["status"], report["a"]["attempts"]) == ("done", 2)
+    assert report["b"]["status"] == "done"
+    assert (report["c"]["status"], report["d"]["status"]) == ("failed", "skipped")
+    assert ("start", "d") not in run.events
+
+def test_manifest_cycle(tmp_path):
+    path = tmp_path / "manifesto.xml"
+    path.write_text('<manifest><job name="a" config="a.xml" target="A"><depends_on>b</depends_on></job>'
+                    '<job name="b" config="b.xml" target="B"><depends_on>a</depends_on></job></manifest>', encoding="utf-8")
+    with pytest.raises(ValueError, match="cycle"):
+        scheduler.load_manifest(str(path))
+
+# A retry skips the sources that were imported and resumes the one that failed
+def test_retry_resumes_sources(monkeypatch, tmp_path, make_config, write_csv, db, table_rows):
+    monkeypatch.chdir(tmp_path)
+    first = [(f"A{i}", "P1", i) for i in range(5)]
+    second = [(f"B{i}", "P2", i) for i in range(5)]
+    sources = [write_csv(first, "a.csv"), write_csv(second, "b.csv")]
+    make_config(sources[0], "csv")
+    calls = []
+    process_config = novo.process_config
+
+    def failing_once(config):
+        calls.append((config["file_path"], config["resume"]))
+        if len(calls) == 2:
+            raise RuntimeError("connection lost")
+        return process_config(config)
+    monkeypatch.setattr(novo, "process_config", failing_once)
+    job = scheduler.Job("csv", str(tmp_path / "csv_config.xml"), sources, target="T", depends_on=[], retries=1, retry_delay=0.01)
+    report = scheduler.run_manifest({"csv": job}, {}, workers=1)
+    assert report["jobs"][0]["status"] == "done"
+    assert calls == [(sources[0], False), (sources[1], False), (sources[1], True)]
+    assert table_rows() == first + second
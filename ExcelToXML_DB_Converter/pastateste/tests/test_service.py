@@ -0,0 +1,75 @@
+import json
+import threading
+
+import service
+from tests.memory_database import MemoryDatabase
+
+ROWS = [(f"N{i}", f"P{i % 3}", i) for i in range(40)]
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql):
+        if self.conn.broken:
+            raise ConnectionError("Communication link failure")
+
+    def close(self):
+        pass
+
+class FakeConnection:
+    def __init__(self):
+        self.broken = False
+        self.closed = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+# An idle connection the server dropped is closed on checkout and another one is handed out
+def test_idle_connection_is_checked():
+    opened = []
+    pool = service.IdleConnections(lambda: opened.append(FakeConnection()) or opened[-1], keep=2)
+    first = pool.connect()
+    first.close()
+    assert pool.connect().conn is opened[0]
+    pool.release(opened[0])
+    opened[0].broken = True
+    conn = pool.connect()
+    assert conn.conn is opened[1] and opened[0].closed
+    assert (pool.opened, pool.reused, pool.dropped) == (2, 1, 1)
+
+# Jobs read by the handlers while workers update them are consistent copies
+def test_jobs_read_while_running(monkeypatch, tmp_path, make_config, write_csv):
+    monkeypatch.chdir(tmp_path)
+    db = MemoryDatabase()
+    import_service = service.ImportService(workers=3, connect_factory=lambda config: db.connect())
+    make_config(write_csv(ROWS), "csv")
+    jobs = [import_service.submit({"config": str(tmp_path / "csv_config.xml"), "reject_file": str(tmp_path / "rejects.jsonl")})
+            for _ in range(6)]
+    errors = []
+
+    def poll():
+        try:
+            while not all(job["future"].done() for job in jobs):
+                json.dumps(import_service.last_jobs(50), default=str)
+        except Exception as e:
+            errors.append(e)
+    reader = threading.Thread(target=poll)
+    reader.start()
+    for job in jobs:
+        job["future"].result()
+    reader.join()
+    import_service.close()
+    assert not errors
+    view = import_service.job_view(jobs[0])
+    assert view["status"] == "done" and view["metrics"]["inserted"] == len(ROWS)
+    assert "future" not in view and "run_seconds" in view["timings"]
+    view["timings"].clear()
+    assert jobs[0]["timings"]
+    assert len(db.rows("T")) == 6 * len(ROWS)
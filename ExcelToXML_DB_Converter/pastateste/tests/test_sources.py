@@ -0,0 +1,132 @@
+import bz2
+import gzip
+import json
+import zipfile
+
+import pandas as pd
+import pytest
+
+import novo
+from sources import data_suffixes, iter_compressed
+
+ROWS = [(f"N{i}", f"P{i % 3}", i) for i in range(25)]
+
+def chunk_sizes(chunks):
+    return [len(chunk) for chunk in chunks]
+
+# The chunks hold the records of the file in order
+def test_xml_chunks(make_config, write_xml):
+    config = make_config(write_xml(ROWS), "xml")
+    chunks = list(novo.iter_xml_chunks(config, chunk_size=10))
+    assert chunk_sizes(chunks) == [10, 10, 5]
+    assert chunks[1]["NIF"].tolist() == [f"N{i}" for i in range(10, 20)]
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), novo.parse_xml_to_dataframe(config))
+
+@pytest.mark.parametrize("backend", ["etree", "lxml"])
+def test_xml_backends(make_config, write_xml, backend):
+    if backend == "lxml":
+        pytest.importorskip("lxml")
+    config = make_config(write_xml(ROWS), "xml")
+    config["xml_backend"] = backend
+    df = novo.parse_xml_to_dataframe(config)
+    assert df["NIF"].tolist() == [row[0] for row in ROWS]
+    assert df["Valor"].astype(int).tolist() == [row[2] for row in ROWS]
+
+def compress(path, opener, suffix):
+    with open(path, "rb") as f, opener(path + suffix, "wb") as compressed:
+        compressed.write(f.read())
+    return path + suffix
+
+# Data files of a compressed source, read from the archive
+def read_members(config, path):
+    return [(member, novo.parse_xml_to_dataframe(config, source=stream)) for member, stream in iter_compressed(path, data_suffixes(config["type"]))]
+
+@pytest.mark.parametrize("opener, suffix", [(gzip.open, ".gz"), (bz2.open, ".bz2")])
+def test_xml_compressed(make_config, write_xml, opener, suffix):
+    path = write_xml(ROWS)
+    config = make_config(path, "xml")
+    members = read_members(config, compress(path, opener, suffix))
+    assert len(members) == 1
+    pd.testing.assert_frame_equal(members[0][1], novo.parse_xml_to_dataframe(config))
+
+# Each data file of a zip is read; other files are left out
+def test_xml_zip(tmp_path, make_config, write_xml, db, table_rows):
+    path = write_xml(ROWS)
+    with zipfile.ZipFile(tmp_path / "dados.zip", "w") as archive:
+        archive.write(path, "a.xml")
+        archive.write(path, "b.xml")
+        archive.writestr("leia-me.md", "x")
+    config = make_config(str(tmp_path / "dados.zip"), "xml")
+    assert [member for member, _ in read_members(config, config["file_path"])] == ["a.xml", "b.xml"]
+    metrics = novo.process_config(config)
+    assert len(metrics["sources"]) == 2
+    assert table_rows() == ROWS + ROWS
+
+@pytest.mark.parametrize("engine", ["pyarrow", "pandas"])
+def test_csv(make_config, write_csv, db, table_rows, engine):
+    if engine == "pyarrow":
+        pytest.importorskip("pyarrow")
+    config = make_config(write_csv(ROWS), "csv")
+    config["csv_engine"] = engine
+    novo.process_config(config)
+    assert table_rows() == ROWS
+    assert chunk_sizes(novo.iter_csv_chunks(config, chunk_size=10)) == [10, 10, 5]
+    chunks = list(novo.iter_csv_chunks(config, chunk_size=10, skip_records=12))
+    assert chunk_sizes(chunks) == [10, 3]
+    assert chunks[0]["NIF"].iloc[0] == "N12"
+
+# Lines before the header, another delimiter, and cells read as text
+def test_csv_options(tmp_path, make_config, db, table_rows):
+    path = tmp_path / "dados.csv"
+    path.write_text("Relatório\n\nNIF;Projeto;Valor;Outra\n007;P1;1;x\nNA;P2;2;y\n", encoding="utf-8-sig")
+    config = make_config(str(path), "csv")
+    config.update({"delimiter": ";", "skip_rows": 2})
+    chunk = next(novo.iter_csv_chunks(config))
+    assert chunk["NIF"].iloc[0] == "007"
+    assert pd.isna(chunk["NIF"].iloc[1])
+    assert "Outra" not in chunk.columns
+    novo.process_config(config)
+    assert table_rows() == [("007", "P1", 1), ("N/A", "P2", 2)]
+
+def test_csv_compressed(tmp_path, make_config, write_csv, db, table_rows):
+    path = write_csv(ROWS)
+    novo.process_config(make_config(compress(path, gzip.open, ".gz"), "csv"))
+    assert table_rows() == ROWS
+
+    with zipfile.ZipFile(tmp_path / "dados.zip", "w") as archive:
+        archive.write(path, "a.csv")
+        archive.write(path, "b.csv")
+    metrics = novo.process_config(make_config(str(tmp_path / "dados.zip"), "csv"))
+    assert len(metrics["sources"]) == 2
+    assert table_rows() == ROWS * 3
+
+def write_json(path, rows, ndjson):
+    records = [{"nif": nif, "projeto": projeto, "valor": valor} for nif, projeto, valor in rows]
+    text = "\n".join(json.dumps(record) for record in records) if ndjson else json.dumps({"dados": records})
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+@pytest.mark.parametrize("ndjson", [True, False])
+def test_json(tmp_path, make_config, db, table_rows, ndjson):
+    path = write_json(tmp_path / ("dados.ndjson" if ndjson else "dados.json"), ROWS, ndjson)
+    config = make_config(path, "json")
+    if not ndjson:
+        config["records_path"] = "dados"
+    novo.process_config(config)
+    assert table_rows() == ROWS
+    assert chunk_sizes(novo.iter_json_chunks(config, chunk_size=10)) == [10, 10, 5]
+    assert chunk_sizes(novo.iter_json_chunks(config, chunk_size=10, skip_records=20)) == [5]
+
+# Records split across reads of the file give the same rows
+def test_json_small_reads(monkeypatch, tmp_path, make_config):
+    config = make_config(write_json(tmp_path / "dados.json", ROWS, False), "json")
+    config["records_path"] = "dados"
+    expected = pd.concat(novo.iter_json_chunks(config), ignore_index=True)
+    monkeypatch.setattr(novo, "JSON_READ_CHARS", 7)
+    got = pd.concat(novo.iter_json_chunks(config, chunk_size=4), ignore_index=True)
+    pd.testing.assert_frame_equal(got, expected)
+
+def test_json_compressed(tmp_path, make_config, db, table_rows):
+    path = write_json(tmp_path / "dados.ndjson", ROWS, True)
+    novo.process_config(make_config(compress(path, gzip.open, ".gz"), "json"))
+    assert table_rows() == ROWS
@@ -0,0 +1,92 @@
+import pandas as pd
+import pytest
+
+from sql_writer import BatchController, parallel_insert, sequential_insert
+from tests.memory_database import MemoryConnection, MemoryDatabase
+
+def frame(rows=2000):
+    return pd.DataFrame({"Id": range(rows), "Nome": [f"N{i}" for i in range(rows)]})
+
+def frame_rows(df):
+    return sorted(df.itertuples(index=False, name=None))
+
+# Row 1234 is rejected by the database
+def reject_row(params):
+    return params[0] == 1234
+
+@pytest.mark.parametrize("writers", [1, 2, 3, 8])
+def test_parallel_inserts_every_row(writers):
+    df = frame()
+    db = MemoryDatabase()
+    parallel_insert(df, "T", db.connect, writers)
+    assert sorted(db.rows("T")) == frame_rows(df)
+    assert db.connections == min(writers, len(df))
+
+def test_atomic_failure_rolls_back_every_partition():
+    db = MemoryDatabase(fail_on=reject_row)
+    parallel_insert(frame(), "T", db.connect, 3, atomic=True)
+    assert db.rows("T") == []
+
+BATCHING = {"start_rows": 100, "min_rows": 10, "max_commit_rows": 500}
+
+def sequential_rows(df, fail_on=None):
+    db = MemoryDatabase(fail_on=fail_on)
+    inserted = sequential_insert(db.connect(), df, "T", BatchController(**BATCHING))
+    return inserted, sorted(db.rows("T"))
+
+@pytest.mark.parametrize("writers", [2, 3, 8])
+def test_parallel_matches_sequential(writers):
+    df = frame()
+    expected_inserted, expected = sequential_rows(df)
+    db = MemoryDatabase()
+    inserted, metrics = parallel_insert(df, "T", db.connect, writers, batching=BATCHING)
+    assert (inserted, sorted(db.rows("T"))) == (expected_inserted, expected)
+    assert inserted == len(df)
+    assert len(metrics) == writers
+
+# A batch with a rejected row is retried row by row; only that row is left out
+def test_sequential_skips_rejected_row():
+    inserted, rows = sequential_rows(frame(), reject_row)
+    assert inserted == 1999
+    assert rows == [row for row in frame_rows(frame()) if row[0] != 1234]
+
+def test_sequential_on_commit_counts_rows():
+    commits = []
+    db = MemoryDatabase()
+    sequential_insert(db.connect(), frame(), "T", BatchController(**BATCHING), on_commit=commits.append)
+    assert commits and commits[-1] == 2000
+    assert commits == sorted(commits)
+
+# on_commit gets the rows committed from the start, after each partition commit
+def test_on_commit_after_each_partition():
+    commits = []
+    db = MemoryDatabase()
+    parallel_insert(frame(3000), "T", db.connect, 3, batching=BATCHING, on_commit=commits.append)
+    assert commits == [1000, 2000, 3000]
+
+# A commit that fails (e.g. the server drops) leaves the partitions committed before it
+def test_on_commit_stops_at_failed_commit(monkeypatch):
+    commits = []
+    db = MemoryDatabase()
+    original = MemoryConnection.commit
+    calls = []
+
+    def commit(self):
+        calls.append(self)
+        if len(calls) == 2:
+            raise ConnectionError("server gone")
+        original(self)
+    monkeypatch.setattr(MemoryConnection, "commit", commit)
+    with pytest.raises(ConnectionError):
+        parallel_insert(frame(3000), "T", db.connect, 3, batching=BATCHING, on_commit=commits.append)
+    assert commits == [1000]
+    assert sorted(db.rows("T")) == frame_rows(frame(1000))
+
+# Outside atomic mode the failed partition is retried row by row, like the sequential writer
+def test_parallel_skips_rejected_rows_like_sequential():
+    df = frame()
+    expected_inserted, expected = sequential_rows(df, reject_row)
+    db = MemoryDatabase(fail_on=reject_row)
+    inserted, _ = parallel_insert(df, "T", db.connect, 3, batching=BATCHING)
+    assert inserted == expected_inserted == len(df) - 1
+    assert sorted(db.rows("T")) == expected
@@ -0,0 +1,58 @@
+import os
+
+import watcher
+
+class GoneEntry:
+    def __init__(self, folder):
+        self.name = "apagado.csv"
+        self.path = os.path.join(folder, self.name)
+
+    def is_file(self):
+        return True
+
+    def stat(self):
+        raise FileNotFoundError(self.path)
+
+def drop_folder(tmp_path):
+    folder = tmp_path / "entrada"
+    folder.mkdir()
+    return watcher.DropFolder(str(folder), str(tmp_path / "feitos"), str(tmp_path / "erros"),
+                              [watcher.Route("*.csv", "config.xml")])
+
+# A file removed between the listing and its stat, or while it was imported, is skipped and
+# the other files are still imported and moved
+def test_vanished_files(monkeypatch, tmp_path):
+    folder = drop_folder(tmp_path)
+    for name in ("a.csv", "b.csv", "c.csv.part"):
+        (tmp_path / "entrada" / name).write_text("x")
+    scandir = os.scandir
+    monkeypatch.setattr(watcher.os, "scandir", lambda path: list(scandir(path)) + [GoneEntry(path)])
+    imported = []
+
+    def process(route, path):
+        imported.append(os.path.basename(path))
+        if path.endswith("a.csv"):
+            os.remove(path)
+        return {"inserted": 1}
+    results = watcher.Watcher([folder], workers=1, poll_seconds=0.01, settle_seconds=0, process=process).run(once=True)
+    assert sorted(imported) == ["a.csv", "b.csv"]
+    assert [result["status"] for result in results] == ["done", "done"]
+    assert os.listdir(tmp_path / "feitos") == ["b.csv"]
+    assert os.listdir(tmp_path / "entrada") == ["c.csv.part"]
+
+# A file that cannot be moved is left in the folder and not imported again
+def test_unmoved_file_is_not_imported_again(monkeypatch, tmp_path):
+    folder = drop_folder(tmp_path)
+    (tmp_path / "entrada" / "a.csv").write_text("x")
+
+    def locked(path, target):
+        raise PermissionError(path)
+    monkeypatch.setattr(watcher.os, "replace", locked)
+    imported = []
+    w = watcher.Watcher([folder], workers=1, poll_seconds=0.01, settle_seconds=0,
+                        process=lambda route, path: imported.append(path) or {"inserted": 1})
+    assert [result["status"] for result in w.run(once=True)] == ["done"]
+    w.scan()
+    w.scan()
+    assert not w.pending()
+    assert len(imported) == 1
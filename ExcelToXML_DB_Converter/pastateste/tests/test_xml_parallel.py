@@ -0,0 +1,56 @@
+import pandas as pd
+import pytest
+
+import novo
+import xml_parallel
+
+# Payments of 5, 13, 1 and 9 records; each <Pagamento> has its own <Devedor>, like the
+# PmtInf blocks of a pain.001 file
+PAYMENTS = [5, 13, 1, 9]
+
+def write_payments(path):
+    parts = []
+    number = 0
+    for payment, count in enumerate(PAYMENTS):
+        parts.append(f"<Pagamento><Devedor>D{payment}</Devedor>")
+        for _ in range(count):
+            parts.append(f"<Linha><NIF>N{number}</NIF><Projeto>P{number % 3}</Projeto><Valor>{number}</Valor></Linha>")
+            number += 1
+        parts.append("</Pagamento>")
+    path.write_text(f'<?xml version="1.0" encoding="UTF-8"?><Documento xmlns="urn:test">{"".join(parts)}</Documento>', encoding="utf-8")
+    return str(path)
+
+@pytest.fixture
+def config(tmp_path, make_config):
+    config = make_config(write_payments(tmp_path / "pagamentos.xml"), "xml")
+    config["columns"].insert(0, {**config["columns"][0], "name": "Devedor", "xpath": "./ns:Devedor", "scope": "ns:Pagamento"})
+    return config
+
+@pytest.mark.parametrize("workers", [1, 3])
+@pytest.mark.parametrize("skip", [0, 4, 19])
+def test_same_as_sequential(config, workers, skip):
+    expected = novo.parse_xml_to_dataframe(config, skip_records=skip)
+    got = xml_parallel.parse_xml_parallel(config, workers, skip_records=skip)
+    pd.testing.assert_frame_equal(got, expected)
+    assert len(got) == sum(PAYMENTS) - skip
+    assert got["Devedor"].iloc[-1] == "D3"
+
+# Every record already imported: an empty frame, without parsing the file again
+def test_all_records_skipped(monkeypatch, config):
+    monkeypatch.setattr(novo, "parse_xml_to_dataframe", None)
+    got = xml_parallel.parse_xml_parallel(config, 2, skip_records=sum(PAYMENTS))
+    assert got.empty
+    assert list(got.columns) == ["Devedor", "NIF", "Projeto", "Valor"]
+
+# The XPaths are compiled once for all the scope captures, not once per scope element
+def test_scopes_compiled_once(monkeypatch, config):
+    calls = []
+    compile_columns = novo.compile_xml_columns
+    monkeypatch.setattr(novo, "compile_xml_columns", lambda *args: calls.append(1) or compile_columns(*args))
+    with open(config["file_path"], "rb") as f:
+        data = f.read()
+    root_open, _ = xml_parallel.find_root_tag(data)
+    bounds = xml_parallel.find_record_bounds(data, "Linha")
+    contexts = xml_parallel.record_contexts(config, data, root_open, bounds)
+    assert [context["Devedor"] for context in contexts] == [f"D{p}" for p, count in enumerate(PAYMENTS) for _ in range(count)]
+    assert len(calls) == 1
@@ -0,0 +1,247 @@
+import argparse
+import fnmatch
+import logging
+import os
+import time
+import xml.etree.ElementTree as ET
+import zipfile
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+import novo
+
+# Watch-folder mode: instead of asking for the file path (<file_path>ASK</file_path>), files
+# dropped into a folder are routed to a config by name and imported as soon as they are
+# complete.
+#
+# <watch workers="2" poll_seconds="1" settle_seconds="2">
+#     <folder path="entrada" done="entrada/processados" failed="entrada/erros">
+#         <route pattern="*BringDevices*.xlsx" config="devices.xml"/>
+#         <route pattern="*Licen*.xlsx" config="genericoLicense.xml"/>
+#     </folder>
+# </watch>
+#
+# A file is picked up when two scans in a row saw the same size and modification time, that
+# time is at least settle_seconds old and, for .xlsx/.zip, the zip directory at its end is
+# readable. A file moved into the folder in one go is taken on the next scan.
+# Up to `workers` files are imported at once, but the files of one config are imported one
+# at a time, in the order they arrived. Imports run with --resume, so a file that was being
+# imported when the watcher stopped continues from its last commit. Afterwards the file is
+# moved to `done` or, if the import failed, to `failed`.
+
+DEFAULT_WORKERS = 2
+DEFAULT_POLL_SECONDS = 1.0
+DEFAULT_SETTLE_SECONDS = 2.0
+
+# Left alone: Office lock files, partial downloads and hidden files
+IGNORED_PATTERNS = ("~$*", ".*", "*.tmp", "*.part", "*.crdownload")
+
+ZIP_SUFFIXES = (".xlsx", ".xlsm", ".zip")
+
+class Route:
+    def __init__(self, pattern, config_file):
+        self.pattern = pattern
+        self.config_file = config_file
+
+class DropFolder:
+    def __init__(self, path, done, failed, routes):
+        self.path = path
+        self.done = done
+        self.failed = failed
+        self.routes = routes
+
+    # First route whose pattern matches the file name (case-insensitive)
+    def route(self, name):
+        return next((route for route in self.routes if fnmatch.fnmatch(name.lower(), route.pattern.lower())), None)
+
+# Returns (folders, settings). Paths are relative to the watch config file.
+def load_watch_config(path):
+    root = ET.parse(path).getroot()
+    base = os.path.dirname(os.path.abspath(path))
+    resolve = lambda file_path: file_path if os.path.isabs(file_path) else os.path.join(base, file_path)
+    folders = []
+    for elem in root.findall("./folder"):
+        folder = resolve(elem.attrib["path"])
+        routes = [Route(route.attrib["pattern"], resolve(route.attrib["config"])) for route in elem.findall("./route")]
+        if not routes:
+            raise ValueError(f"Folder '{folder}' has no <route>")
+        folders.append(DropFolder(folder, resolve(elem.attrib.get("done", os.path.join(folder, "processados"))),
+                                  resolve(elem.attrib.get("failed", os.path.join(folder, "erros"))), routes))
+    if not folders:
+        raise ValueError("No <folder> in watch config")
+    settings = {
+        "workers": int(root.attrib.get("workers", DEFAULT_WORKERS)),
+        "poll_seconds": float(root.attrib.get("poll_seconds", DEFAULT_POLL_SECONDS)),
+        "settle_seconds": float(root.attrib.get("settle_seconds", DEFAULT_SETTLE_SECONDS)),
+    }
+    return folders, settings
+
+# xlsx/zip files end with the zip directory, so a copy still in progress cannot be opened
+def looks_complete(path):
+    if not path.lower().endswith(ZIP_SUFFIXES):
+        return True
+    try:
+        return zipfile.is_zipfile(path)
+    except OSError:
+        return False
+
+# Import one dropped file with the config of its route
+def import_file(route, path):
+    config = novo.load_config(route.config_file)
+    config["excel_file" if config["type"] == "excel" else "file_path"] = path
+    config["resume"] = True
+    return novo.process_config(config)
+
+# Move into `folder`, adding the time to the name if a file with that name is already there
+def move_to(path, folder):
+    os.makedirs(folder, exist_ok=True)
+    target = os.path.join(folder, os.path.basename(path))
+    if os.path.exists(target):
+        stem, extension = os.path.splitext(os.path.basename(path))
+        target = os.path.join(folder, f"{stem}.{datetime.now().strftime('%Y%m%d-%H%M%S')}{extension}")
+    os.replace(path, target)
+    return target
+
+class Watcher:
+    def __init__(self, folders, workers=DEFAULT_WORKERS, poll_seconds=DEFAULT_POLL_SECONDS,
+                 settle_seconds=DEFAULT_SETTLE_SECONDS, process=import_file):
+        self.folders = folders
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self.settle_seconds = settle_seconds
+        self.process = process
+        self.seen = {}           # path -> (size, mtime_ns, first seen)
+        self.unrouted = set()
+        self.unmoved = set()     # imported files that could not be moved out of the folder
+        self.queued = set()
+        self.queues = {}         # config file -> deque of (folder, route, path, first seen)
+        self.busy = set()        # config files with an import running
+        self.running = {}
+        self.results = []
+
+    # Queue the files whose size and time have settled
+    def scan(self):
+        now = time.monotonic()
+        present = set()
+        for folder in self.folders:
+            try:
+                entries = []
+                for entry in os.scandir(folder.path):
+                    if any(fnmatch.fnmatch(entry.name, pattern) for pattern in IGNORED_PATTERNS):
+                        continue
+                    # A file removed or renamed since the listing is skipped
+                    try:
+                        if entry.is_file():
+                            entries.append((entry, entry.stat()))
+                    except FileNotFoundError:
+                        continue
+            except FileNotFoundError:
+                continue
+            # Oldest first, so files of the same config are imported in the order they arrived
+            entries.sort(key=lambda item: item[1].st_mtime_ns)
+            for entry, stat in entries:
+                path = entry.path
+                present.add(path)
+                if path in self.queued or path in self.unmoved:
+                    continue
+                route = folder.route(entry.name)
+                if route is None:
+                    if path not in self.unrouted:
+                        logging.warning(f"No route for '{entry.name}' in {folder.path}, leaving it there")
+                        self.unrouted.add(path)
+                    continue
+                size, mtime, first_seen = self.seen.get(path, (None, None, now))
+                if (stat.st_size, stat.st_mtime_ns) != (size, mtime):
+                    self.seen[path] = (stat.st_size, stat.st_mtime_ns, first_seen)
+                    continue
+                if time.time() - stat.st_mtime >= self.settle_seconds and looks_complete(path):
+                    self.queued.add(path)
+                    self.queues.setdefault(route.config_file, deque()).append((folder, route, path, first_seen))
+                    logging.info(f"Queued '{entry.name}' for {os.path.basename(route.config_file)}")
+        # Forget files that were removed before they settled
+        self.seen = {path: state for path, state in self.seen.items() if path in present}
+        self.unrouted &= present
+        self.unmoved &= present
+
+    # Start queued files, at most one per config and `workers` in total
+    def dispatch(self, executor):
+        for config_file, queue in self.queues.items():
+            if len(self.running) >= self.workers:
+                return
+            if queue and config_file not in self.busy:
+                folder, route, path, first_seen = queue.popleft()
+                self.busy.add(config_file)
+                self.running[executor.submit(self.process, route, path)] = (folder, route, path, first_seen)
+
+    def finish(self, future):
+        folder, route, path, first_seen = self.running.pop(future)
+        self.busy.discard(route.config_file)
+        self.queued.discard(path)
+        self.seen.pop(path, None)
+        latency = time.monotonic() - first_seen
+        try:
+            metrics = future.result()
+        except Exception as e:
+            moved = self.move(path, folder.failed)
+            logging.error(f"Import of '{os.path.basename(path)}' failed: {e}; {moved}")
+            self.results.append({"file": path, "status": "failed", "seconds": round(latency, 3), "error": str(e)})
+            return
+        moved = self.move(path, folder.done)
+        logging.info(f"Imported '{os.path.basename(path)}' ({metrics.get('inserted', 0)} rows) "
+                     f"{latency:.1f}s after it was seen; {moved}")
+        self.results.append({"file": path, "status": "done", "seconds": round(latency, 3), "metrics": metrics})
+
+    # A file that cannot be moved (removed meanwhile, or locked by another program) is left
+    # where it is and not imported again while it stays there
+    def move(self, path, folder):
+        try:
+            return f"moved to {move_to(path, folder)}"
+        except OSError as e:
+            logging.error(f"Could not move '{os.path.basename(path)}' to {folder}: {e}")
+            self.unmoved.add(path)
+            return "left in place"
+
+    def pending(self):
+        return bool(self.running) or any(self.queues.values()) or bool(self.seen)
+
+    # Watch until interrupted. once=True: stop when the files already in the folders are done.
+    def run(self, once=False):
+        for folder in self.folders:
+            os.makedirs(folder.path, exist_ok=True)
+        logging.info(f"Watching {', '.join(folder.path for folder in self.folders)}")
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            try:
+                while True:
+                    self.scan()
+                    self.dispatch(executor)
+                    if once and not self.pending():
+                        break
+                    if self.running:
+                        done, _ = wait(self.running, timeout=self.poll_seconds, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            self.finish(future)
+                    else:
+                        time.sleep(self.poll_seconds)
+            except KeyboardInterrupt:
+                logging.info("Stopping: waiting for the imports in progress")
+                for future in list(self.running):
+                    future.exception()
+                    self.finish(future)
+        return self.results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vigia pastas e importa cada ficheiro que lá é colocado.")
+    parser.add_argument("watch_config", help="Caminho para o ficheiro XML com as pastas e as regras")
+    parser.add_argument("--workers", type=int, help="Número máximo de importações em simultâneo")
+    parser.add_argument("--once", action="store_true", help="Importar os ficheiros que já estão nas pastas e terminar")
+    args = parser.parse_args()
+
+    try:
+        folders, settings = load_watch_config(args.watch_config)
+        if args.workers:
+            settings["workers"] = args.workers
+        Watcher(folders, **settings).run(once=args.once)
+    except Exception as e:
+        logging.error(f"Erro ao processar '{args.watch_config}': {e}")
+        exit(1)
@@ -0,0 +1,163 @@
+import io
+import logging
+import mmap
+import os
+import re
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import novo
+
+# Parallel mode for one big XML file: the bytes are scanned (through mmap) for record
+# boundaries, groups of records go to a process pool, and each worker parses only its
+# byte ranges with the same column extraction as novo.iter_xml_chunks.
+#
+# Limits: records must not nest, and namespace prefixes used inside records must be
+# declared on the document root (true for pain.001 exports).
+
+# Batches per worker, so a slow batch does not leave the other cores idle
+BATCHES_PER_WORKER = 4
+
+def local_name(tag):
+    return tag.strip().split(":")[-1]
+
+# Start offsets of every "<Tag ...>" (with or without prefix) in the file
+def find_tag_starts(mm, tag):
+    pattern = re.compile(rb"<(?:[\w.-]+:)?" + re.escape(tag.encode()) + rb"[\s>/]")
+    return [m.start() for m in pattern.finditer(mm)]
+
+# (start, end) byte range of every record, in document order
+def find_record_bounds(mm, record_tag):
+    name = re.escape(record_tag.encode())
+    pattern = re.compile(rb"<(/?)(?:[\w.-]+:)?" + name + rb"[\s>]")
+    bounds = []
+    start = None
+    for m in pattern.finditer(mm):
+        if not m.group(1):
+            start = m.start()
+        elif start is not None:
+            end = mm.find(b">", m.end() - 1) + 1
+            bounds.append((start, end))
+            start = None
+    return bounds
+
+# Start tag of the document root (it carries the namespace declarations)
+def find_root_tag(mm):
+    m = re.compile(rb"<([A-Za-z_][\w.:-]*)[^>]*>").search(mm)
+    if m is None:
+        raise ValueError("No root element found in XML file")
+    return m.group(0), b"</" + m.group(1) + b">"
+
+# Backend and compiled XPaths of the config: (backend, {column name: finder})
+def compile_config(config):
+    backend = novo.get_xml_backend(config.get("xml_backend"))
+    return backend, novo.compile_xml_columns(config, backend)
+
+# Scope values of one ancestor occurrence: parse only from its start tag to its first record
+def capture_scope(config, compiled, mm, root_open, scope_tag, scope_start, first_record_start):
+    backend, finders = compiled
+    qualified = novo.qualify_tag(scope_tag, config["namespace"])
+    parser = backend.pull_parser(("start",))
+    parser.feed(root_open)
+    parser.feed(mm[scope_start:first_record_start])
+    for _, elem in parser.read_events():
+        if elem.tag == qualified:
+            return {col["name"]: novo.extract_value(elem, col, finders[col["name"]])
+                    for col in config["columns"] if col.get("xpath") and col.get("scope") == scope_tag}
+    return {}
+
+# Context for every record: values of the nearest preceding occurrence of each scope
+def record_contexts(config, mm, root_open, bounds):
+    scope_tags = sorted({col["scope"] for col in config["columns"] if col.get("xpath") and col.get("scope")})
+    if not scope_tags:
+        return [None] * len(bounds)
+
+    compiled = compile_config(config)
+    record_starts = [start for start, _ in bounds]
+    keys = [() for _ in bounds]
+    captured = {}
+    for scope_tag in scope_tags:
+        scope_starts = find_tag_starts(mm, local_name(scope_tag))
+        for i, record_start in enumerate(record_starts):
+            occurrence = bisect_right(scope_starts, record_start) - 1
+            keys[i] += (occurrence,)
+            if occurrence >= 0 and (scope_tag, occurrence) not in captured:
+                captured[(scope_tag, occurrence)] = capture_scope(config, compiled, mm, root_open, scope_tag, scope_starts[occurrence], record_start)
+
+    contexts = {}
+    result = []
+    for key in keys:
+        if key not in contexts:
+            context = {}
+            for scope_tag, occurrence in zip(scope_tags, key):
+                context.update(captured.get((scope_tag, occurrence), {}))
+            contexts[key] = context
+        result.append(contexts[key])
+    return result
+
+# Split records into contiguous batches that share the same scope context
+def make_batches(bounds, contexts, batch_count):
+    batch_size = max(1, -(-len(bounds) // batch_count))
+    batches = []
+    current = []
+    for bound, context in zip(bounds, contexts):
+        if current and (len(current) >= batch_size or context is not current_context):
+            batches.append((current, current_context))
+            current = []
+        if not current:
+            current_context = context
+        current.append(bound)
+    if current:
+        batches.append((current, current_context))
+    return batches
+
+# Backend and XPaths of a worker process, compiled once by the pool initializer
+worker_compiled = None
+
+def init_worker(config):
+    global worker_compiled
+    worker_compiled = compile_config(config)
+
+# Worker: parse a batch of record ranges wrapped in the document root tag
+def parse_ranges(config, file_path, ranges, root_open, root_close, context):
+    with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        parts = [root_open]
+        parts.extend(mm[start:end] for start, end in ranges)
+        parts.append(root_close)
+    return next(novo.iter_xml_chunks(config, chunk_size=None, source=io.BytesIO(b"".join(parts)), context=context,
+                                     compiled=worker_compiled))
+
+# Read the XML file with several processes; same result as novo.parse_xml_to_dataframe
+def parse_xml_parallel(config, workers=None, skip_records=0):
+    workers = workers or os.cpu_count() or 1
+    file_path = config["file_path"]
+    record_tag = local_name(config["root_path"].split("/")[-1])
+
+    with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        root_open, root_close = find_root_tag(mm)
+        bounds = find_record_bounds(mm, record_tag)
+        contexts = record_contexts(config, mm, root_open, bounds)
+    # --resume: the records already committed are not parsed at all
+    bounds = bounds[skip_records:]
+    contexts = contexts[skip_records:]
+
+    # No records left (or none at all): the empty frame of the config columns
+    if not bounds:
+        return next(novo.iter_xml_chunks(config, chunk_size=None, source=io.BytesIO(root_open + root_close)))
+
+    batches = make_batches(bounds, contexts, workers * BATCHES_PER_WORKER)
+    logging.info(f"Parsing {len(bounds)} records in {len(batches)} batches with {workers} workers")
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(config,)) as pool:
+        # map() returns results in submission order, i.e. document order
+        frames = list(pool.map(
+            parse_ranges,
+            [config] * len(batches),
+            [file_path] * len(batches),
+            [ranges for ranges, _ in batches],
+            [root_open] * len(batches),
+            [root_close] * len(batches),
+            [context for _, context in batches],
+        ))
+    return pd.concat(frames, ignore_index=True)